@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 import os
+import tempfile
 
 
 def get_default_base_url() -> str:
@@ -30,6 +31,8 @@ class Settings(BaseSettings):
 
     # Tesseract Configuration - loaded from TESSERACT_CMD env var, with a default for Linux
     tesseract_cmd: str = "/usr/bin/tesseract"
+    ocr_backend: str = "auto"  # "auto" (tesserocr when installed), "tesserocr" or "pytesseract"
+    tessdata_path: str = ""  # tessdata directory for tesserocr (empty = library default)
 
     # Port setting - optional
     port: int = 10000
@@ -43,12 +46,82 @@ class Settings(BaseSettings):
     gemini_tts_model: str = (
         "gemini-2.5-flash-preview-tts"  # Specialized model for text-to-speech
     )
+    gemini_max_concurrency: int = 32  # Gemini requests in flight across the whole process
+    gemini_rpm: int = 1000  # Requests per minute allowed for gemini_model (0 disables)
+    gemini_tts_rpm: int = 100  # Requests per minute allowed for gemini_tts_model (0 disables)
+    gemini_deadline_seconds: float = 60.0  # Deadline of a Gemini call, retries included (per-call defaults in gemini_client)
+    gemini_call_deadlines: dict = {}  # Per-call deadline overrides, e.g. {"analyze_page_image": 30}
+    gemini_max_retries: int = 2  # Retries on quota (429), 5xx and timeout errors, with jittered exponential backoff
+    gemini_retry_base_seconds: float = 0.5  # Backoff before the first retry (doubles per retry, randomized)
+    gemini_retry_max_seconds: float = 8.0  # Longest backoff between retries
+    gemini_hedge_enabled: bool = False  # Send a duplicate request when a call outlasts the recent p95 latency
+    gemini_hedge_min_seconds: float = 2.0  # Never hedge before this many seconds
+    gemini_breaker_failures: int = 5  # Consecutive failures that open the circuit (calls then fail fast)
+    gemini_breaker_reset_seconds: float = 30.0  # Time the circuit stays open before a trial call
+    gemini_token_prices: dict = {}  # USD per million tokens for cost estimates, e.g. {"gemini-2.5-flash": [0.3, 2.5]}
+    gemini_cache_enabled: bool = True  # Reuse Gemini results for identical requests
+    gemini_cache_ttl_seconds: int = 86400  # Lifetime of a cached Gemini result
+    gemini_cache_max_entries: int = 512  # In-memory cache entries
+    gemini_cache_max_bytes: int = 32 * 1024 * 1024  # In-memory cache size limit
+    gemini_cache_path: str = ""  # SQLite file for the on-disk cache tier (empty disables it)
+    gemini_cache_disk_max_bytes: int = 512 * 1024 * 1024  # On-disk cache size limit
+    gemini_batch_pages: int = 8  # Page images per bulk analysis request (1 = one request per page)
+    gemini_batch_max_bytes: int = 12 * 1024 * 1024  # Image and text payload of one bulk analysis request
+    gemini_batch_concurrency: int = 4  # Bulk analysis requests in flight for one document
 
     # Image processing settings
     image_quality: int = 2  # Scale factor for PDF rendering
     max_image_size: int = (
         4096  # Maximum width/height for images (increased from 1920 for better form analysis quality)
     )
+    pdf_page_cache_size: int = 4  # Rendered PDF pages kept in memory per form session
+    pdf_orientation_max_side: int = 1600  # Longest side of the page render used for orientation detection
+    gemini_upload_max_side: int = 2048  # Longest side of images uploaded to Gemini
+    orientation_structure_margin: float = 1.5  # Projection score ratio that settles portrait vs landscape without OCR
+    orientation_osd_min_confidence: float = 2.0  # Tesseract OSD confidence accepted without the OCR fallback
+    orientation_check_flipped: bool = False  # Also OCR-score 180° when OSD is unsure (180° is always checked by OSD)
+    image_png_compress_level: int = 1  # zlib level for lossless PNGs (1 = fast; 9 = smallest but slow)
+    image_slide_format: str = "webp"  # Photographic slide/document pages: "webp", "jpeg" or "png" (lossless)
+    image_lossy_quality: int = 85  # WebP/JPEG quality for photographic pages
+    image_codec_cache_bytes: int = 64 * 1024 * 1024  # Encoded images kept per worker process for repeat requests
+
+    # Executor settings (blocking work run off the event loop)
+    vision_executor_workers: int = max(1, (os.cpu_count() or 2) - 1)  # YOLO/Tesseract/rendering workers
+    vision_executor_queue_size: int = 16  # Vision jobs allowed to wait for a free worker
+    executor_queue_timeout: float = 30.0  # Seconds to wait for a queue slot before answering 503
+
+    # Multi-page PDF analysis (/form/analyze-pdf)
+    page_pipeline_workers: int = max(1, (os.cpu_count() or 2) // 2)  # Worker processes (each loads its own YOLO models)
+    page_pipeline_parallelism: int = 6  # Pages in flight at once (CPU stage + Gemini labeling)
+
+    # Document reader PDF extraction (/document/upload)
+    document_pdf_workers: int = max(1, (os.cpu_count() or 2) // 2)  # Worker processes for page ranges (0 = in-process)
+    document_pdf_chunk_pages: int = 16  # Pages handled by one worker task; smaller PDFs stay in-process
+    document_page_wait_seconds: float = 60.0  # Streaming uploads: how long a page request waits for its page
+
+    # Document reader page prefetch (image analysis of the pages after the one being read)
+    document_prefetch_pages: int = 2  # Pages ahead, in reading direction, analyzed in the background (0 disables)
+    document_prefetch_concurrency: int = 4  # Prefetch Gemini calls in flight per process (a share of gemini_max_concurrency)
+
+    # PowerPoint conversion (Spire.Presentation runs in separate worker processes)
+    ppt_workers: int = 2  # Worker processes (0 = convert in the API process)
+    ppt_slides_per_task: int = 4  # Slides rendered by one worker task; a deck's tasks run in parallel
+    ppt_job_timeout_seconds: float = 120.0  # A task running longer is killed together with its worker
+    ppt_max_jobs_per_worker: int = 20  # Tasks after which a worker process is replaced
+    ppt_worker_max_rss_mb: int = 1024  # Workers reporting more resident memory are replaced (0 disables)
+
+    # Session storage (must be shared when running several workers or replicas)
+    session_backend: str = "memory"  # "memory" (one process), "sqlite" (workers on one host) or "redis"
+    session_sqlite_path: str = "sessions.db"  # SQLite file for the sqlite backend
+    redis_url: str = "redis://localhost:6379/0"  # Any Redis-protocol server, for the redis backends
+    session_ttl_seconds: int = 3600  # Idle time after which a session and its blobs expire
+    blob_backend: str = ""  # "memory", "disk" or "redis" for images/files (empty = follow session_backend)
+    blob_dir: str = "session_blobs"  # Directory for the disk blob backend
+    blob_memory_budget_bytes: int = 512 * 1024 * 1024  # Memory blob backend: RAM for blobs plus decoded-image/open-PDF caches before cold sessions spill to disk
+    blob_spill_dir: str = os.path.join(tempfile.gettempdir(), "new_reader_spill")  # Directory for sessions spilled by the memory blob backend (one subdirectory per process)
+    session_sweep_interval_seconds: int = 60  # How often expired sessions and their blobs are removed (0 disables)
+    pdf_open_documents: int = 16  # Session PDFs kept open for rendering in each worker process
+    image_blob_cache_bytes: int = 256 * 1024 * 1024  # Decoded session images kept per worker process
 
     class Config:
         # Pydantic will automatically look for environment variables
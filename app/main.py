@@ -1,9 +1,17 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import routers for different services
-from app.routers import form_analyzer, document_reader
+from app.routers import form_analyzer, document_reader, metrics
 from app.config import get_settings
+from app.services.executor import executor_service
+from app.services.page_pipeline import page_pipeline_service
+from app.services.session import SessionService
+from app.services.document_processor import shutdown_pdf_pool
+from app.services.ppt_pool import ppt_pool
+from app.services.page_prefetch import page_prefetcher
 
 settings = get_settings()
 
@@ -25,6 +33,29 @@ app.add_middleware(
 # Include routers
 app.include_router(form_analyzer.router)
 app.include_router(document_reader.router, prefix="/document", tags=["Document Reader"])
+app.include_router(metrics.router)
+
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    """Remove expired sessions (and their blobs) periodically instead of on request"""
+    app.state.session_sweeper = None
+    if settings.session_sweep_interval_seconds > 0:
+        app.state.session_sweeper = asyncio.create_task(
+            SessionService().sweep_forever(settings.session_sweep_interval_seconds)
+        )
+
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    """Stop the worker pools used for blocking vision work and PDF page analysis"""
+    if app.state.session_sweeper is not None:
+        app.state.session_sweeper.cancel()
+    page_prefetcher.cancel_all()
+    executor_service.shutdown()
+    page_pipeline_service.shutdown()
+    shutdown_pdf_pool()
+    ppt_pool.shutdown()
 
 
 @app.get("/")
@@ -43,5 +74,10 @@ async def root():
                 "description": "Read and analyze PowerPoint and PDF files",
                 "prefix": "/document",
             },
+            {
+                "name": "Metrics",
+                "description": "Session memory usage and service statistics",
+                "prefix": "/metrics",
+            },
         ],
     }
@@ -195,7 +195,8 @@ class PDFPageResponse(BaseModel):
     page_number: int
     total_pages: int
     fields: List[UIField]
-    image_base64: str
+    image_base64: Optional[str] = None  # Only with ?include_image=true
+    image_url: Optional[str] = None  # Binary PNG of the page
     language_direction: str
     has_fields: bool
     session_id: str
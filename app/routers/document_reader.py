@@ -1,12 +1,24 @@
 from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pathlib import Path
+import asyncio
 import base64
+import io
+import json
 import logging
+import time
+import uuid
 
+from PIL import Image
+
+from app.config import get_settings
 from app.services.gemini import GeminiService
 from app.services.document_processor import DocumentProcessor
 from app.services.speech import SpeechService
+from app.services.session import SessionService
+from app.services.image_blob import ImageBlob
+from app.services.executor import executor_service, ExecutorSaturatedError
+from app.services.page_prefetch import page_prefetcher
 from app.models.schemas import (
     AnalyzeDocumentResponse,
     SlideAnalysisResponse,
@@ -15,20 +27,238 @@ from app.models.schemas import (
     NavigationResponse,
     TextToSpeechRequest,
 )
+from app.utils.sse import sse_event, sse_response
 from app.utils.text import clean_and_format_text, process_transcript
 
 router = APIRouter()
+settings = get_settings()
 
 # Initialize services
 gemini_service = GeminiService()
 document_processor = DocumentProcessor()
 speech_service = SpeechService()
+session_service = SessionService()
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Store document sessions in memory (in production, use a database)
-document_sessions = {}
+# Document sessions live in the shared session store ("document" namespace);
+# page images are kept in the blob store as ImageBlob handles under "image"
+
+
+async def _run_vision(func, *args, **kwargs):
+    """Run blocking document rendering off the event loop; 503 when the pool is saturated"""
+    try:
+        return await executor_service.run_vision(func, *args, **kwargs)
+    except ExecutorSaturatedError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly")
+
+
+async def _load_document_session(session_id: str) -> dict:
+    session = await session_service.load("document", session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="جلسة المستند غير موجودة")
+    return session
+
+
+async def _run_vision_background(func, *args):
+    """Background work waits for a free vision worker instead of failing with 503"""
+    while True:
+        try:
+            return await executor_service.run_vision(func, *args)
+        except ExecutorSaturatedError:
+            await asyncio.sleep(1)
+
+
+# Streaming uploads: pages are processed by background tasks (kept referenced
+# here until done) and page endpoints poll the shared session for readiness
+_processing_tasks = set()
+PAGE_POLL_INTERVAL = 0.25
+
+
+async def _load_document_page(session_id: str, page_number: int) -> dict:
+    """Session once page_number is processed; waits while a streaming upload is still on it"""
+    deadline = time.monotonic() + settings.document_page_wait_seconds
+    while True:
+        session = await _load_document_session(session_id)
+        if page_number < 1 or page_number > session["total_pages"]:
+            raise HTTPException(status_code=400, detail="رقم الصفحة غير صحيح")
+        # Sessions from regular uploads have every page ready
+        if page_number <= session.get("pages_ready", session["total_pages"]):
+            return session
+        if session.get("processing_status") == "failed":
+            raise HTTPException(
+                status_code=500,
+                detail=f"خطأ في معالجة المستند: {session.get('processing_error', '')}",
+            )
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=503,
+                detail="الصفحة قيد المعالجة، حاول مرة أخرى بعد قليل",
+                headers={"Retry-After": "2"},
+            )
+        await asyncio.sleep(PAGE_POLL_INTERVAL)
+
+
+def _slide_entry(page: dict, index: int) -> dict:
+    """Simple text-only analysis entry of a page (Gemini text analysis is disabled)"""
+    return {
+        "title": page.get("title", f"Page {index + 1}"),
+        "original_text": page.get("text", ""),
+        "explanation": "",
+        "key_points": [],
+        "slide_type": "content",
+        "importance_level": "medium",
+    }
+
+
+async def _store_page_images(session_id: str, pages: list, run=_run_vision):
+    """Move the pages' base64 images to the blob store, keeping ImageBlob handles"""
+    page_images = await run(_pop_page_images, {"pages": pages})
+    for page, page_image in zip(pages, page_images):
+        if page_image:
+            image_bytes, fmt, width, height = page_image
+            blob = await ImageBlob.create(session_id, image_bytes, fmt, width, height)
+            page["image"] = blob.to_dict()
+
+
+async def _process_document_in_background(session_id: str, batches):
+    """Process a streaming upload's pages in order, publishing each batch as it completes"""
+    status, error = "complete", None
+    try:
+        while True:
+            batch = await _run_vision_background(next, batches, None)
+            if batch is None:
+                break
+            await _store_page_images(session_id, batch, run=_run_vision_background)
+            entries = [_slide_entry(page, page["page_number"] - 1) for page in batch]
+
+            def _append_pages(data: dict):
+                data["document_data"]["pages"].extend(batch)
+                data["analysis"]["slides_analysis"].extend(entries)
+                data["pages_ready"] = len(data["document_data"]["pages"])
+
+            if await session_service.modify("document", session_id, _append_pages) is None:
+                # Session deleted (or expired) while processing
+                if not await session_service.store.exists(session_id):
+                    await session_service.blobs.delete_session(session_id)
+                return
+    except Exception as e:
+        logger.error(f"Background processing of document {session_id} failed: {e}")
+        status, error = "failed", str(e)
+    finally:
+        await _run_vision_background(batches.close)
+
+    def _finish(data: dict):
+        data["processing_status"] = status
+        if error:
+            data["processing_error"] = error
+
+    await session_service.modify("document", session_id, _finish)
+
+
+async def _render_page_image(session_id: str, session: dict, page_number: int):
+    """Render a slide of a text-only session on first request; returns its ImageBlob dict"""
+    file_content = await session_service.blobs.get(session["file_blob"])
+    if not file_content:
+        return None
+    image_base64 = await _run_vision(
+        document_processor.render_slide_image, file_content, page_number
+    )
+    if not image_base64:
+        return None
+    rendered = [{"image_base64": image_base64}]
+    await _store_page_images(session_id, rendered)
+    image = rendered[0].get("image")
+    existing = []
+
+    def _set_image(data: dict):
+        page = data["document_data"]["pages"][page_number - 1]
+        if page.get("image"):
+            # A concurrent request rendered it first
+            existing[:] = [page["image"]]
+        else:
+            page["image"] = image
+
+    await session_service.modify("document", session_id, _set_image)
+    if existing and image:
+        await ImageBlob.from_dict(image).delete()
+        return existing[0]
+    return image
+
+
+async def _page_image_input(session: dict, page_number: int):
+    """(image bytes or None, ImageBlob, cleaned page text, language) for analyzing a page image"""
+    page_index = page_number - 1
+    page_data = session["document_data"]["pages"][page_index]
+    cleaned_text = clean_and_format_text(
+        session["analysis"]["slides_analysis"][page_index].get("original_text", "")
+    )
+    blob = ImageBlob.from_dict(page_data["image"]) if page_data.get("image") else None
+    image_bytes = await blob.read() if blob else None
+    return image_bytes, blob, cleaned_text, session.get("language", "arabic")
+
+
+async def _cache_image_analysis(session_id: str, page_number: int, image_analysis: str):
+    await session_service.modify(
+        "document",
+        session_id,
+        lambda data: data.setdefault("image_analysis_cache", {}).__setitem__(
+            str(page_number), image_analysis
+        ),
+    )
+
+
+async def _analyze_page_image(session_id: str, session: dict, page_number: int) -> str:
+    """Gemini analysis of a page image, stored in the session's image_analysis_cache"""
+    image_bytes, blob, cleaned_text, language = await _page_image_input(session, page_number)
+
+    image_analysis = ""
+    if image_bytes:
+        try:
+            image_analysis = await gemini_service.analyze_page_image(
+                image_bytes, language, cleaned_text, mime_type=blob.mime_type
+            )
+        except Exception:
+            image_analysis = (
+                "لم نتمكن من تحليل صورة الصفحة"
+                if language == "arabic"
+                else "Unable to analyze page image"
+            )
+
+    await _cache_image_analysis(session_id, page_number, image_analysis)
+    return image_analysis
+
+
+async def _prefetch_page_analysis(session_id: str, page_number: int):
+    """Prefetch work: analyze page_number unless it is cached or not processed yet"""
+    session = await session_service.load("document", session_id)
+    if session is None or not session.get("analyze_images", False):
+        return None
+    if page_number > session.get("pages_ready", session["total_pages"]):
+        return None
+    cached = (session.get("image_analysis_cache") or {}).get(str(page_number))
+    if cached is not None:
+        return cached
+    return await _analyze_page_image(session_id, session, page_number)
+
+
+def _pop_page_images(document_data: dict) -> list:
+    """
+    Remove the base64 page images from document_data and return them decoded
+    as (bytes, format, width, height); only the image header is parsed
+    """
+    images = []
+    for page in document_data.get("pages", []):
+        image_base64 = page.pop("image_base64", "")
+        if not image_base64:
+            images.append(None)
+            continue
+        image_bytes = base64.b64decode(image_base64)
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            fmt = {"JPEG": "jpeg", "WEBP": "webp"}.get(image.format, "png")
+            images.append((image_bytes, fmt, image.width, image.height))
+    return images
 
 
 @router.post("/upload", response_model=AnalyzeDocumentResponse)
@@ -36,9 +266,13 @@ async def upload_document(
     file: UploadFile = File(...),
     language: str = Form("arabic"),  # "arabic" or "english"
     analyze_images: bool = Form(False),  # Disabled by default; images analyzed on demand
+    stream: bool = Form(False),  # Return at once and process pages in the background
 ):
     """
     رفع وتحليل مستند PowerPoint أو PDF مع تحليل شامل للصور
+
+    مع stream=true تُنشأ الجلسة فوراً وتُعالج الصفحات بالترتيب في الخلفية؛
+    endpoints الصفحات تنتظر صفحتها فقط، والتقدم متاح عبر /{session_id}/progress
     """
     try:
         # التأكد من وجود اسم الملف
@@ -58,22 +292,64 @@ async def upload_document(
         # قراءة الملف
         file_content = await file.read()
 
+        # بدون تحليل الصور يكفي نص الشرائح: قراءة XML الملف مباشرة دون Spire،
+        # وصور الشرائح تُرسم عند طلبها فقط
+        document_data = None
+        if file_extension == ".pptx" and not analyze_images:
+            try:
+                document_data = await _run_vision(document_processor.extract_pptx_text, file_content)
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.warning(f"Text-only PPTX extraction failed, using full conversion: {e}")
+
+        if document_data is None and stream:
+            total_pages, batches = await _run_vision(
+                document_processor.open_document_pages, file_content, file_extension
+            )
+            session_id = f"doc_{uuid.uuid4().hex}"
+            await session_service.save("document", session_id, {
+                "filename": file.filename,
+                "file_type": file_extension,
+                "document_data": {"file_type": file_extension, "total_pages": total_pages, "pages": []},
+                "analysis": {"slides_analysis": []},
+                "language": language,
+                "total_pages": total_pages,
+                "image_analysis_cache": {},
+                "analyze_images": bool(analyze_images),
+                # تقدم المعالجة في الخلفية
+                "pages_ready": 0,
+                "processing_status": "processing",
+            })
+            task = asyncio.create_task(_process_document_in_background(session_id, batches))
+            _processing_tasks.add(task)
+            task.add_done_callback(_processing_tasks.discard)
+
+            return AnalyzeDocumentResponse(
+                session_id=session_id,
+                filename=file.filename,
+                file_type=file_extension,
+                total_pages=total_pages,
+                language=language,
+                status="processing",
+                message=(
+                    "جاري معالجة المستند؛ الصفحات متاحة فور جاهزيتها"
+                    if language == "arabic"
+                    else "Document is being processed; pages become available as they are ready"
+                ),
+            )
+
         # معالجة المستند
-        document_data = document_processor.process_document(
-            file_content, file_extension
-        )
+        lazy_images = document_data is not None
+        if document_data is None:
+            document_data = await _run_vision(
+                document_processor.process_document, file_content, file_extension
+            )
 
         # تعطيل تحليل النص عبر Gemini وإرجاع تحليل مبسط بسرعة
         text_analysis_result = {
             "slides_analysis": [
-                {
-                    "title": page.get("title", f"Page {i+1}"),
-                    "original_text": page.get("text", ""),
-                    "explanation": "",
-                    "key_points": [],
-                    "slide_type": "content",
-                    "importance_level": "medium",
-                }
+                _slide_entry(page, i)
                 for i, page in enumerate(document_data.get("pages", []))
             ],
         }
@@ -122,11 +398,14 @@ async def upload_document(
                     }
                 )
 
-        # إنشاء session ID للمستند
-        session_id = f"doc_{len(document_sessions) + 1}"
+        # إنشاء session ID للمستند (فريد عبر جميع العمليات)
+        session_id = f"doc_{uuid.uuid4().hex}"
+
+        # صور الصفحات تُخزَّن في مخزن الـ blobs والجلسة تحتفظ بالمراجع فقط
+        await _store_page_images(session_id, document_data["pages"])
 
         # حفظ بيانات المستند في الجلسة
-        document_sessions[session_id] = {
+        await session_service.save("document", session_id, {
             "filename": file.filename,
             "file_type": file_extension,
             "document_data": document_data,
@@ -134,11 +413,15 @@ async def upload_document(
             "language": language,
             "total_pages": len(document_data["pages"]),
             # كاش بسيط لنتائج تحليل الصور لكل صفحة خلال نفس الجلسة
-            "image_analysis_cache": {},  # { page_number: str }
+            "image_analysis_cache": {},  # { str(page_number): str }
             # احترم خيار المستخدم فيما إذا كان يريد تحليل الصور أم لا
             "analyze_images": bool(analyze_images),
             # الصور تُحلَّل عند الطلب من endpoint الصفحة
-        }
+            # الملف الأصلي لرسم صور الشرائح عند الطلب (مسار النص فقط)
+            "file_blob": (
+                await session_service.blobs.put(session_id, file_content) if lazy_images else None
+            ),
+        })
 
         # فقط تحليل نصي بسيط وتم إنشاء الجلسة؛ الصور تُحلَّل لاحقًا عند استدعاء صفحة محددة
         return AnalyzeDocumentResponse(
@@ -155,6 +438,8 @@ async def upload_document(
             ),
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"خطأ في معالجة المستند: {str(e)}")
 
@@ -165,18 +450,12 @@ async def get_page_analysis(session_id: str, page_number: int):
     الحصول على تحليل صفحة/شريحة محددة من الملف المحفوظ أو التحليل المباشر
     """
     try:
-        if session_id not in document_sessions:
-            raise HTTPException(status_code=404, detail="جلسة المستند غير موجودة")
-
-        session = document_sessions[session_id]
-
-        if page_number < 1 or page_number > session["total_pages"]:
-            raise HTTPException(status_code=400, detail="رقم الصفحة غير صحيح")
+        # ينتظر الصفحة فقط إن كانت ما تزال قيد المعالجة
+        session = await _load_document_page(session_id, page_number)
 
         # استخدم بيانات الجلسة ونفّذ تحليل الصورة بحسب إعداد الجلسة فقط
         page_index = page_number - 1
         page_analysis = session["analysis"]["slides_analysis"][page_index]
-        page_data = session["document_data"]["pages"][page_index]
 
         # Get original text and clean it
         original_text = page_analysis.get("original_text", "")
@@ -197,34 +476,21 @@ async def get_page_analysis(session_id: str, page_number: int):
                 image_analysis="",
             )
 
-        # إن كان التحليل مفعلاً: استخدم الكاش أولاً
-        if page_number in cache:
-            return SlideAnalysisResponse(
-                page_number=page_number,
-                title=page_analysis.get("title", f"Page {page_number}"),
-                original_text=cleaned_text,
-                image_analysis=cache.get(page_number, ""),
-            )
-
-        image_analysis = ""
-        image_base64 = page_data.get("image_base64", "")
-        language = session.get("language", "arabic")
+        # ابدأ تحليل الصفحات التالية (باتجاه القراءة) في الخلفية
+        page_prefetcher.page_served(
+            session_id,
+            page_number,
+            session["total_pages"],
+            lambda next_page: _prefetch_page_analysis(session_id, next_page),
+        )
 
-        if image_base64:
-            try:
-                image_analysis = gemini_service.analyze_page_image(
-                    image_base64, language, cleaned_text
-                )
-            except Exception:
-                image_analysis = (
-                    "لم نتمكن من تحليل صورة الصفحة"
-                    if language == "arabic"
-                    else "Unable to analyze page image"
-                )
+        # إن كان التحليل مفعلاً: استخدم الكاش أولاً، ثم أي تحليل مسبق جارٍ لهذه الصفحة
+        image_analysis = cache.get(str(page_number))
+        if image_analysis is None:
+            image_analysis = await page_prefetcher.join(session_id, page_number)
+        if image_analysis is None:
+            image_analysis = await _analyze_page_image(session_id, session, page_number)
 
-        # خزّن النتيجة في الكاش وأعد الاستجابة
-        cache[page_number] = image_analysis
-        session["image_analysis_cache"] = cache
         return SlideAnalysisResponse(
             page_number=page_number,
             title=page_analysis.get("title", f"Page {page_number}"),
@@ -232,6 +498,8 @@ async def get_page_analysis(session_id: str, page_number: int):
             image_analysis=image_analysis,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"خطأ في الحصول على تحليل الصفحة: {str(e)}"
@@ -241,32 +509,84 @@ async def get_page_analysis(session_id: str, page_number: int):
  
 
 
+@router.get("/{session_id}/page/{page_number}/stream")
+async def stream_page_analysis(session_id: str, page_number: int):
+    """
+    تحليل الصفحة كأحداث SSE: حدث "page" بنص الصفحة، ثم أحداث "chunk" بجمل
+    تحليل الصورة فور توليدها، ثم "done" بالتحليل الكامل (يُحفظ في كاش الجلسة)
+    """
+    # ينتظر الصفحة فقط إن كانت ما تزال قيد المعالجة
+    session = await _load_document_page(session_id, page_number)
+    page_analysis = session["analysis"]["slides_analysis"][page_number - 1]
+    analyze = bool(session.get("analyze_images", False))
+    if analyze:
+        page_prefetcher.page_served(
+            session_id,
+            page_number,
+            session["total_pages"],
+            lambda next_page: _prefetch_page_analysis(session_id, next_page),
+        )
+
+    async def events():
+        yield sse_event("page", {
+            "page_number": page_number,
+            "title": page_analysis.get("title", f"Page {page_number}"),
+            "original_text": clean_and_format_text(page_analysis.get("original_text", "")),
+        })
+        if not analyze:
+            yield sse_event("done", {"image_analysis": ""})
+            return
+
+        # الكاش أولاً، ثم أي تحليل مسبق جارٍ لهذه الصفحة
+        image_analysis = (session.get("image_analysis_cache") or {}).get(str(page_number))
+        if image_analysis is None:
+            image_analysis = await page_prefetcher.join(session_id, page_number)
+        if image_analysis is None:
+            image_bytes, blob, cleaned_text, language = await _page_image_input(session, page_number)
+            image_analysis = ""
+            if image_bytes:
+                async for text, final in gemini_service.stream_page_image_analysis(
+                    image_bytes, language, cleaned_text, mime_type=blob.mime_type
+                ):
+                    if final:
+                        image_analysis = text
+                    else:
+                        yield sse_event("chunk", {"text": text})
+            await _cache_image_analysis(session_id, page_number, image_analysis)
+        elif image_analysis:
+            yield sse_event("chunk", {"text": image_analysis})
+
+        yield sse_event("done", {"image_analysis": image_analysis})
+
+    return sse_response(events())
+
+
 @router.get("/{session_id}/page/{page_number}/image")
 async def get_page_image(session_id: str, page_number: int):
     """
     الحصول على صورة الصفحة/الشريحة
     """
     try:
-        if session_id not in document_sessions:
-            raise HTTPException(status_code=404, detail="جلسة المستند غير موجودة")
-
-        session = document_sessions[session_id]
-
-        if page_number < 1 or page_number > session["total_pages"]:
-            raise HTTPException(status_code=400, detail="رقم الصفحة غير صحيح")
+        # ينتظر الصفحة فقط إن كانت ما تزال قيد المعالجة
+        session = await _load_document_page(session_id, page_number)
 
         # Get page image
         page_index = page_number - 1
         page_data = session["document_data"]["pages"][page_index]
 
-        if "image_base64" not in page_data:
+        image = page_data.get("image")
+        if not image and session.get("file_blob"):
+            # جلسة نصية: ارسم صورة الشريحة الآن واحفظها للطلبات التالية
+            image = await _render_page_image(session_id, session, page_number)
+        blob = ImageBlob.from_dict(image) if image else None
+        image_data = await blob.read() if blob else None
+        if not image_data:
             raise HTTPException(status_code=404, detail="صورة الصفحة غير متوفرة")
 
-        # Decode base64 image
-        image_data = base64.b64decode(page_data["image_base64"])
-
-        return Response(content=image_data, media_type="image/png")
+        return Response(content=image_data, media_type=blob.http_mime_type)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"خطأ في الحصول على صورة الصفحة: {str(e)}"
@@ -279,10 +599,7 @@ async def get_document_summary(session_id: str):
     الحصول على ملخص شامل للمستند مع تحليل الصور
     """
     try:
-        if session_id not in document_sessions:
-            raise HTTPException(status_code=404, detail="جلسة المستند غير موجودة")
-
-        session = document_sessions[session_id]
+        session = await _load_document_session(session_id)
         analysis = session["analysis"]
 
         # Get text analysis
@@ -301,22 +618,63 @@ async def get_document_summary(session_id: str):
             language=session["language"],
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"خطأ في الحصول على ملخص المستند: {str(e)}"
         )
 
 
+@router.get("/{session_id}/progress")
+async def get_processing_progress(session_id: str):
+    """
+    تقدم معالجة المستند كسطور NDJSON: حدث "page" لكل صفحة جاهزة بالترتيب،
+    ثم حدث "complete" أو "failed" عند الانتهاء
+    """
+    session = await _load_document_session(session_id)
+
+    async def events():
+        sent = 0
+        current = session
+        while True:
+            pages = current["document_data"]["pages"]
+            total_pages = current["total_pages"]
+            ready = current.get("pages_ready", len(pages))
+            for page in pages[sent:ready]:
+                sent += 1
+                yield json.dumps({
+                    "event": "page",
+                    "page_number": page["page_number"],
+                    "title": page.get("title", ""),
+                    "pages_ready": sent,
+                    "total_pages": total_pages,
+                }, ensure_ascii=False) + "\n"
+
+            status = current.get("processing_status", "complete")
+            if status != "processing":
+                event = {"event": status, "pages_ready": sent, "total_pages": total_pages}
+                if current.get("processing_error"):
+                    event["error"] = current["processing_error"]
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+                return
+
+            await asyncio.sleep(PAGE_POLL_INTERVAL)
+            current = await session_service.load("document", session_id)
+            if current is None:
+                yield json.dumps({"event": "deleted", "pages_ready": sent}) + "\n"
+                return
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @router.post("/{session_id}/navigate", response_model=NavigationResponse)
 async def navigate_document(session_id: str, request: NavigationRequest):
     """
     التنقل في المستند باستخدام الأوامر الصوتية أو النصية
     """
     try:
-        if session_id not in document_sessions:
-            raise HTTPException(status_code=404, detail="جلسة المستند غير موجودة")
-
-        session = document_sessions[session_id]
+        session = await _load_document_session(session_id)
         total_pages = session["total_pages"]
 
         # استخراج رقم الصفحة من الأمر
@@ -325,6 +683,15 @@ async def navigate_document(session_id: str, request: NavigationRequest):
         )
 
         if new_page is not None:
+            # حلّل الصفحة المطلوبة وما بعدها (باتجاه التنقل) مسبقاً في الخلفية
+            if session.get("analyze_images", False):
+                page_prefetcher.navigated(
+                    session_id,
+                    request.current_page,
+                    new_page,
+                    total_pages,
+                    lambda next_page: _prefetch_page_analysis(session_id, next_page),
+                )
             return NavigationResponse(
                 success=True,
                 new_page=new_page,
@@ -336,6 +703,8 @@ async def navigate_document(session_id: str, request: NavigationRequest):
                 message="لم أتمكن من فهم الأمر. حاول مرة أخرى.",
             )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"خطأ في التنقل: {str(e)}")
 
@@ -343,12 +712,11 @@ async def navigate_document(session_id: str, request: NavigationRequest):
 @router.delete("/{session_id}")
 async def delete_document_session(session_id: str):
     """
-    حذف جلسة المستند من الذاكرة فقط (لم يعد هناك تخزين JSON)
+    حذف جلسة المستند وصورها من مخزن الجلسات
     """
     try:
-        # Delete from memory
-        if session_id in document_sessions:
-            del document_sessions[session_id]
+        page_prefetcher.cancel(session_id)
+        if await session_service.remove("document", session_id):
             return {
                 "message": "تم حذف جلسة المستند بنجاح",
                 "session_deleted": True,
@@ -356,17 +724,19 @@ async def delete_document_session(session_id: str):
         else:
             raise HTTPException(status_code=404, detail="جلسة المستند غير موجودة")
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"خطأ في حذف الجلسة: {str(e)}")
 
 
 @router.get("/ping")
-def ping():
+async def ping():
     """فحص صحة خدمة قراءة المستندات"""
     return {
         "service": "Document Reader",
         "status": "healthy",
-        "active_sessions": len(document_sessions),
+        "active_sessions": await session_service.store.count("document"),
     }
 # ==================== خدمات الصوت ====================
  
@@ -381,7 +751,7 @@ async def convert_text_to_speech(request: TextToSpeechRequest):
     Convert text to speech using the selected provider (Gemini).
     تحويل النص إلى صوت باستخدام موفر الخدمة المحدد (Gemini).
     """
-    audio_bytes, mime_type = speech_service.text_to_speech(
+    audio_bytes, mime_type = await speech_service.text_to_speech(
         request.text, request.provider
     )
 
@@ -410,7 +780,7 @@ async def convert_speech_to_text(
         if len(audio_bytes) < 100:  # Very simple check for test data
             return {"text": "Test audio transcription result"}
 
-        raw_transcript = speech_service.speech_to_text(
+        raw_transcript = await speech_service.speech_to_text(
             audio_bytes, language_code=language_code
         )
 
@@ -427,6 +797,8 @@ async def convert_speech_to_text(
         processed_transcript = process_transcript(raw_transcript, lang=language_code)
 
         return {"text": processed_transcript}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An internal error occurred: {str(e)}"
@@ -13,8 +13,13 @@ from app.services.gemini import GeminiService
 from app.services.speech import SpeechService
 from app.services.image import ImageService
 from app.services.session import SessionService
-from app.services.pdf_processor import PDFProcessor
+from app.services.blob_store import blob_store
+from app.services.image_blob import ImageBlob
+from app.services.image_codec import image_codec
+from app.services.pdf_processor import PDFProcessor, PDFSourceCache
 from app.services.pdf_merger import PDFMergerService
+from app.services.executor import executor_service, ExecutorSaturatedError
+from app.services.page_pipeline import page_pipeline_service
 from app.models.schemas import (
     FormAnalysisResponse, 
     TextToSpeechRequest, 
@@ -26,7 +31,11 @@ from app.models.schemas import (
     PDFPageResponse,
     PDFInfo
 )
+from app.utils.sse import sse_event, sse_response
 from app.utils.text import process_transcript
+from app.config import get_settings
+
+settings = get_settings()
 
 router = APIRouter(prefix="/form", tags=["Form Analysis"])
 
@@ -39,8 +48,10 @@ session_service = SessionService()
 pdf_processor = PDFProcessor()
 pdf_merger = PDFMergerService()
 
-# Store PDF session data
-pdf_sessions = {}
+# PDF sessions live in the shared session store ("pdf" namespace) and only
+# reference the uploaded file; each worker keeps recently used PDFs open here
+page_sources = PDFSourceCache(settings.pdf_open_documents)
+blob_store.register_cache("open_pdfs", page_sources.memory_bytes)
 
 # Internal helper: save images for debugging/logging
 def _save_image_log(image: Image.Image, session_id: str, stage: str):
@@ -56,6 +67,120 @@ def _save_image_log(image: Image.Image, session_id: str, stage: str):
         # logging is best-effort only
         pass
 
+# Internal helper: run blocking work (YOLO, Tesseract, rendering, encoding) off the
+# event loop. A saturated pool answers 503 instead of queueing without bound.
+async def _run_vision(func, *args, **kwargs):
+    try:
+        return await executor_service.run_vision(func, *args, **kwargs)
+    except ExecutorSaturatedError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly")
+
+# Internal helper: decode uploaded/stored image bytes
+def _open_image(image_bytes: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+# Internal helper: PNG-encode an image for responses ("form" or "fill" codec policy;
+# both are lossless)
+def _image_to_png_bytes(image: Image.Image, purpose: str = "form", cache_key: str = None) -> bytes:
+    return image_codec.encode(image, purpose, cache_key=cache_key).data
+
+# Internal helpers: session images are ImageBlob handles, stored once as encoded
+# bytes and decoded lazily (in the vision pool) only when a step needs pixels
+async def _store_image(session_id: str, image: Image.Image, data: bytes = None) -> ImageBlob:
+    fmt = "png"
+    if data is None:
+        encoded = await _run_vision(image_codec.encode, image, "form")
+        data, fmt = encoded.data, encoded.format
+    return await ImageBlob.create(
+        session_id, data, fmt, image.width, image.height, image.mode, image=image
+    )
+
+async def _load_image(blob_data: dict):
+    blob = ImageBlob.from_dict(blob_data)
+    image = blob.cached_image()
+    if image is None:
+        data = await blob.read()
+        if data is None:
+            return None
+        image = await _run_vision(blob.decode, data)
+    return image
+
+# Internal helper: render the first page of a PDF
+def _render_first_pdf_page(file_content: bytes):
+    pdf_pages = pdf_processor.open_pdf(file_content)
+    try:
+        return pdf_pages.get_page(1)
+    finally:
+        pdf_pages.close()
+
+# Internal helper: load a PDF session or answer 404
+async def _load_pdf_session(session_id: str, detail: str = "جلسة PDF غير موجودة أو منتهية الصلاحية") -> dict:
+    pdf_session = await session_service.load("pdf", session_id)
+    if pdf_session is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return pdf_session
+
+# Internal helper: the session's PDF opened for rendering in this worker,
+# reopened from the blob store when another worker created the session
+async def _get_pages_data(session_id: str, pdf_session: dict):
+    pages = page_sources.get(session_id)
+    if pages is None:
+        file_content = await blob_store.get(pdf_session["file_blob"])
+        if file_content is None:
+            raise HTTPException(status_code=404, detail="ملف PDF للجلسة غير موجود أو منتهي الصلاحية")
+        pages = await _run_vision(pdf_processor.open_pdf, file_content)
+        pages = page_sources.put(session_id, pages)
+    return pages
+
+# Internal helper: upright renders of a PDF page at the requested resolution tiers.
+# Orientation is decided once per page on the low-resolution render; angles maps
+# str(page_number) -> angle and is updated in place.
+def _upright_page_images(pages, angles: dict, page_number: int, *tiers: str) -> list:
+    angle = angles.get(str(page_number))
+    if angle is None:
+        thumbnail = pages.get_page(page_number, "orientation")["image"]
+        angle = image_service.detect_upright_angle(thumbnail)
+        angles[str(page_number)] = angle
+    return [
+        image_service.rotate_upright(pages.get_page(page_number, tier)["image"], angle)
+        for tier in tiers
+    ]
+
+# Internal helper: _upright_page_images for a session page, saving a newly
+# detected angle so other requests and workers reuse it
+async def _upright_session_page(session_id: str, pdf_session: dict, page_number: int, *tiers: str) -> list:
+    pages = await _get_pages_data(session_id, pdf_session)
+    angles = pdf_session.setdefault("page_angles", {})
+    known = str(page_number) in angles
+    images = await _run_vision(_upright_page_images, pages, angles, page_number, *tiers)
+    if not known:
+        angle = angles[str(page_number)]
+        await session_service.modify(
+            "pdf", session_id,
+            lambda data: data.setdefault("page_angles", {}).__setitem__(str(page_number), angle),
+        )
+    return images
+
+# Internal helper: numbered image sent to Gemini, downscaled to the upload tier
+def _annotated_upload_image(image: Image.Image, fields_data: list) -> Image.Image:
+    return image_service.fit_for_upload(
+        image_service.create_annotated_image_for_gpt(image, fields_data, with_numbers=True)
+    )
+
+# Internal helper: size of the upright detection-tier render without rendering it
+def _upright_page_size(pages, angles: dict, page_number: int) -> tuple:
+    width, height = pages.get_page_size(page_number, "detection")
+    if angles.get(str(page_number)) in (90, 270):
+        return height, width
+    return width, height
+
+# Internal helper: find the analysis of a page in a PDF session
+def _find_page_analysis(pdf_session: dict, page_number: int):
+    return next(
+        (p for p in pdf_session.get("analyzed_pages", []) if p["page_number"] == page_number),
+        None,
+    )
+
 @router.post("/check-file", response_model=ImageQualityResponse)
 async def check_file_quality(file: UploadFile = File(...)):
     """
@@ -77,34 +202,37 @@ async def check_file_quality(file: UploadFile = File(...)):
                 )
 
             # Validate PDF
-            is_valid, validation_message = pdf_processor.validate_pdf_for_forms(file_content)
+            is_valid, validation_message = await _run_vision(
+                pdf_processor.validate_pdf_for_forms, file_content
+            )
             if not is_valid:
                 raise HTTPException(status_code=400, detail=validation_message)
 
             # Convert first page to image
             try:
-                pages_data = pdf_processor.convert_pdf_to_images(file_content)
-                if not pages_data:
+                first_page = await _run_vision(_render_first_pdf_page, file_content)
+                if not first_page:
                     raise HTTPException(status_code=400, detail="Could not convert PDF to image")
 
                 # Get first page as image
-                first_page = pages_data[0]
                 image = first_page["image"]
 
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Failed to process PDF: {str(e)}")
         else:
             # Handle regular image files
-            image = Image.open(io.BytesIO(await file.read())).convert("RGB")
+            image = await _run_vision(_open_image, await file.read())
 
         # Correct orientation and fit to max (so quality checks are on the improved image)
-        corrected_image = image_service.correct_image_orientation(image)
+        corrected_image = await _run_vision(image_service.correct_image_orientation, image)
 
         # Create new session
-        session_id = session_service.create_session()
+        session_id = await session_service.create_session()
 
         # Check image quality and detect language automatically
-        language_direction, quality_good, quality_message = gemini_service.detect_language_and_quality(corrected_image)
+        language_direction, quality_good, quality_message = await gemini_service.detect_language_and_quality(corrected_image)
 
         # Simple form explanation based on basic image analysis (no YOLO or heavy processing)
         form_explanation = ""
@@ -112,7 +240,7 @@ async def check_file_quality(file: UploadFile = File(...)):
             try:
                 # Get quick form explanation only (no field details)
                 form_explanation = (
-                    gemini_service.get_quick_form_explanation(corrected_image, language_direction) or ""
+                    await gemini_service.get_quick_form_explanation(corrected_image, language_direction) or ""
                 )
             except Exception:
                 # If form explanation fails, continue without it
@@ -138,17 +266,15 @@ async def check_file_quality(file: UploadFile = File(...)):
 
         # Store detected language in session
         try:
-            session_service.update_session(session_id, "pdf_mode", file.filename.lower().endswith(".pdf"))
-            session_service.update_session(session_id, "language_direction", language_direction)
-            session_service.update_session(session_id, "image_width", corrected_image.width)
-            session_service.update_session(session_id, "image_height", corrected_image.height)
-            # Store corrected image for reuse in analyze step
-            img_buffer = io.BytesIO()
-            corrected_image.save(img_buffer, format="PNG")
-            corrected_image_b64 = base64.b64encode(img_buffer.getvalue()).decode("utf-8")
-            session_service.update_session(session_id, "converted_image_b64", corrected_image_b64)
+            await session_service.update_session(session_id, "pdf_mode", file.filename.lower().endswith(".pdf"))
+            await session_service.update_session(session_id, "language_direction", language_direction)
+            await session_service.update_session(session_id, "image_width", corrected_image.width)
+            await session_service.update_session(session_id, "image_height", corrected_image.height)
+            # Store corrected image (once, as a blob handle) for reuse in analyze step
+            converted_image = await _store_image(session_id, corrected_image)
+            await session_service.update_session(session_id, "converted_image", converted_image.to_dict())
             if form_explanation:
-                session_service.update_session(session_id, "form_explanation", form_explanation)
+                await session_service.update_session(session_id, "form_explanation", form_explanation)
             # Save corrected image to logs folder
             _save_image_log(corrected_image, session_id, "corrected")
         except Exception:
@@ -181,18 +307,21 @@ async def analyze_form(session_id: str = Form(...), language_direction: str = Fo
     try:
         # 1) Load corrected image from session
         try:
-            session_data = session_service.get_session(session_id)
+            session_data = await session_service.get_session(session_id)
         except Exception:
             session_data = None
-        if not session_data or not session_data.get("converted_image_b64"):
+        if not session_data or not session_data.get("converted_image"):
             raise HTTPException(
                 status_code=400,
                 detail="No image found in session. Please call /form/check-file first.",
             )
 
         try:
-            img_bytes = base64.b64decode(session_data["converted_image_b64"])
-            corrected_image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+            corrected_image = await _load_image(session_data["converted_image"])
+            if corrected_image is None:
+                raise ValueError("session image expired")
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to load session image: {str(e)}")
 
@@ -203,17 +332,20 @@ async def analyze_form(session_id: str = Form(...), language_direction: str = Fo
         _save_image_log(corrected_image, session_id, "analysis_input")
 
         # 3) Detect fields using YOLO
-        fields_data = yolo_service.detect_fields_with_language(corrected_image, final_language)
+        fields_data = await _run_vision(
+            yolo_service.detect_fields_with_language, corrected_image, final_language
+        )
         if not fields_data:
             raise HTTPException(status_code=400, detail="No fillable fields detected.")
 
         # 4) Create annotated image for Gemini
-        gpt_image = image_service.create_annotated_image_for_gpt(
+        gpt_image = await _run_vision(
+            image_service.create_annotated_image_for_gpt,
             corrected_image, fields_data, with_numbers=True
         )
 
         # 5) Get form fields from Gemini
-        gpt_fields_raw = gemini_service.get_form_fields_only(gpt_image, final_language)
+        gpt_fields_raw = await gemini_service.get_form_fields_only(gpt_image, final_language)
         if not gpt_fields_raw:
             raise HTTPException(status_code=500, detail="AI model failed to extract form details.")
 
@@ -221,18 +353,9 @@ async def analyze_form(session_id: str = Form(...), language_direction: str = Fo
         gpt_fields = [field for field in gpt_fields_raw if field.get("valid", False)]
         final_fields = image_service.combine_yolo_and_gpt_results(fields_data, gpt_fields)
 
-        # 7) Update session
-        session_service.update_session(session_id, "language_direction", final_language)
-        session_service.update_session(session_id, "analysis_completed", True)
-
-        # 8) Ensure image is stored
-        try:
-            img_buffer = io.BytesIO()
-            corrected_image.save(img_buffer, format="PNG")
-            corrected_image_b64 = base64.b64encode(img_buffer.getvalue()).decode("utf-8")
-            session_service.update_session(session_id, "converted_image_b64", corrected_image_b64)
-        except Exception:
-            pass
+        # 7) Update session (the corrected image is already stored)
+        await session_service.update_session(session_id, "language_direction", final_language)
+        await session_service.update_session(session_id, "analysis_completed", True)
 
         return FormAnalysisResponse(
             fields=final_fields,
@@ -254,11 +377,13 @@ async def delete_session(session_id: str):
     Delete a specific session when user is done.
     """
     try:
-        success = session_service.delete_session(session_id)
+        success = await session_service.delete_session(session_id)
         if success:
             return {"message": f"Session {session_id} deleted successfully"}
         else:
             raise HTTPException(status_code=404, detail="Session not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting session: {e}")
 
@@ -269,10 +394,10 @@ async def get_session_info():
     """
     try:
         # Clean up expired sessions first
-        session_service.cleanup_expired_sessions()
+        await session_service.cleanup_expired_sessions()
         
         return {
-            "active_sessions": session_service.get_session_count(),
+            "active_sessions": await session_service.get_session_count(),
             "session_timeout": session_service.session_timeout
         }
     except Exception as e:
@@ -283,7 +408,7 @@ async def convert_text_to_speech(request: TextToSpeechRequest):
     """
     Convert text to speech using the selected provider (Gemini).
     """
-    audio_bytes, mime_type = speech_service.text_to_speech(request.text, request.provider)
+    audio_bytes, mime_type = await speech_service.text_to_speech(request.text, request.provider)
     
     if audio_bytes == "QUOTA_EXCEEDED":
         raise HTTPException(
@@ -303,7 +428,7 @@ async def convert_speech_to_text(file: UploadFile = File(...), language_code: st
     """
     try:
         audio_bytes = await file.read()
-        raw_transcript = speech_service.speech_to_text(audio_bytes, language_code=language_code)
+        raw_transcript = await speech_service.speech_to_text(audio_bytes, language_code=language_code)
         
         if raw_transcript == "QUOTA_EXCEEDED":
             raise HTTPException(
@@ -317,6 +442,8 @@ async def convert_speech_to_text(file: UploadFile = File(...), language_code: st
         processed_transcript = process_transcript(raw_transcript, lang=language_code)
         
         return {"text": processed_transcript}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {str(e)}")
 
@@ -334,7 +461,9 @@ async def annotate_image_endpoint(request: AnnotateImageRequest):
         
         # Try to open as image first
         try:
-            original_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            original_image = await _run_vision(_open_image, image_bytes)
+        except HTTPException:
+            raise
         except Exception as img_error:
             # If it fails, maybe it's PDF bytes - try to convert
             try:
@@ -343,21 +472,28 @@ async def annotate_image_endpoint(request: AnnotateImageRequest):
                     raise HTTPException(status_code=503, detail="PDF processing not available")
                 
                 # Convert PDF first page to image
-                pages_data = pdf_processor.convert_pdf_to_images(image_bytes)
-                if not pages_data:
+                first_page = await _run_vision(_render_first_pdf_page, image_bytes)
+                if not first_page:
                     raise HTTPException(status_code=400, detail="Could not convert PDF to image")
                 
                 # Get first page as image
-                first_page = pages_data[0]
                 original_image = first_page["image"]
                 
+            except HTTPException as pdf_error:
+                if pdf_error.status_code == 503:
+                    raise
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Could not process file as image or PDF: {str(pdf_error)}"
+                )
             except Exception as pdf_error:
                 raise HTTPException(
                     status_code=400, 
                     detail=f"Could not process file as image or PDF: {str(pdf_error)}"
                 )
         
-        final_image = image_service.create_final_annotated_image(
+        final_image = await _run_vision(
+            image_service.create_final_annotated_image,
             image=original_image,
             texts_dict=request.texts_dict,
             ui_fields=request.ui_fields,
@@ -365,12 +501,12 @@ async def annotate_image_endpoint(request: AnnotateImageRequest):
             signature_field_id=request.signature_field_id
         )
         
-        buffered = io.BytesIO()
-        final_image.save(buffered, format="PNG")
-        img_bytes = buffered.getvalue()
+        img_bytes = await _run_vision(_image_to_png_bytes, final_image, "fill")
         
         return Response(content=img_bytes, media_type="image/png")
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {str(e)}")
@@ -386,14 +522,14 @@ async def process_pdf(file: UploadFile = File(...), session_id: str = Form(None)
         
         # 2. Create or get session
         if not session_id:
-            session_id = session_service.create_session()
+            session_id = await session_service.create_session()
         
         # 3. Process PDF and extract information
         pdf_info, form_fields = pdf_processor.process_pdf(pdf_bytes, session_id)
         
         # 4. Update session with extracted information
-        session_service.update_session(session_id, 'pdf_info', pdf_info)
-        session_service.update_session(session_id, 'form_fields', form_fields)
+        await session_service.update_session(session_id, 'pdf_info', pdf_info)
+        await session_service.update_session(session_id, 'form_fields', form_fields)
         
         return PDFFormAnalysisResponse(
             session_id=session_id,
@@ -410,7 +546,7 @@ async def pdf_page(request: PDFPageRequest):
     """
     try:
         # 1. Validate and get the session
-        session_data = session_service.get_session(request.session_id)
+        session_data = await session_service.get_session(request.session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -447,21 +583,24 @@ async def preview_analyze_image(session_id: str, stage: str = "corrected", langu
     try:
         # Load from session
         try:
-            session_data = session_service.get_session(session_id)
+            session_data = await session_service.get_session(session_id)
+            corrected_image = await _load_image(session_data["converted_image"])
+        except HTTPException:
+            raise
         except Exception:
-            session_data = None
-        if not session_data or not session_data.get("converted_image_b64"):
+            corrected_image = None
+        if corrected_image is None:
             raise HTTPException(status_code=404, detail="No image found in session. Call /form/check-file first.")
 
-        img_bytes = base64.b64decode(session_data["converted_image_b64"])
-        corrected_image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-
         stage_norm = (stage or "corrected").lower()
         if stage_norm in ("annotated", "gpt", "numbered"):
             final_language = language_direction or session_data.get("language_direction") or "rtl"
-            fields_data = yolo_service.detect_fields_with_language(corrected_image, final_language)
+            fields_data = await _run_vision(
+                yolo_service.detect_fields_with_language, corrected_image, final_language
+            )
             if fields_data:
-                out_img = image_service.create_annotated_image_for_gpt(
+                out_img = await _run_vision(
+                    image_service.create_annotated_image_for_gpt,
                     corrected_image, fields_data, with_numbers=True
                 )
             else:
@@ -469,9 +608,7 @@ async def preview_analyze_image(session_id: str, stage: str = "corrected", langu
         else:
             out_img = corrected_image
 
-        buf = io.BytesIO()
-        out_img.save(buf, format="PNG")
-        img_out = buf.getvalue()
+        img_out = await _run_vision(_image_to_png_bytes, out_img)
 
         # Optional: save a log copy
         try:
@@ -518,41 +655,46 @@ async def check_pdf_quality(file: UploadFile = File(...)):
         file_content = await file.read()
         
         # التحقق من صحة PDF
-        is_valid, validation_message = pdf_processor.validate_pdf_for_forms(file_content)
+        is_valid, validation_message = await _run_vision(
+            pdf_processor.validate_pdf_for_forms, file_content
+        )
         if not is_valid:
             raise HTTPException(status_code=400, detail=validation_message)
         
         # الحصول على معلومات PDF
-        pdf_info_raw = pdf_processor.get_pdf_info(file_content)
-        pdf_info = PDFInfo(
-            total_pages=pdf_info_raw.get("total_pages", 0),
-            title=pdf_info_raw.get("title", ""),
-            author=pdf_info_raw.get("author", ""),
-            subject=pdf_info_raw.get("subject", "")
-        )
+        pdf_info_raw = await _run_vision(pdf_processor.get_pdf_info, file_content)
+        pdf_info_data = {
+            "total_pages": pdf_info_raw.get("total_pages", 0),
+            "title": pdf_info_raw.get("title", ""),
+            "author": pdf_info_raw.get("author", ""),
+            "subject": pdf_info_raw.get("subject", ""),
+        }
+        pdf_info = PDFInfo(**pdf_info_data)
         
-        # تحويل PDF إلى صور
-        pages_data = pdf_processor.convert_pdf_to_images(file_content)
+        # فتح PDF للعرض عند الطلب (لا يتم تحويل الصفحات إلى صور هنا)
+        pages_data = await _run_vision(pdf_processor.open_pdf, file_content)
         
         # إنشاء جلسة جديدة
-        session_id = session_service.create_session()
+        session_id = await session_service.create_session()
+        page_sources.put(session_id, pages_data)
         
         # تحديد اللغة المُوصى بها (افتراضياً RTL للعربية)
         recommended_language = "rtl"
         
-        # تخزين بيانات PDF في الجلسة المؤقتة
-        pdf_sessions[session_id] = {
+        # تخزين بيانات PDF في الجلسة؛ الملف نفسه في مخزن الـ blobs
+        await session_service.save("pdf", session_id, {
             "filename": file.filename,
-            "pdf_info": pdf_info,
-            "pages_data": pages_data,
-            "file_content": file_content,
-            "recommended_language": recommended_language
-        }
+            "pdf_info": pdf_info_data,
+            "total_pages": pdf_info.total_pages,
+            "file_blob": await blob_store.put(session_id, file_content),
+            "recommended_language": recommended_language,
+            "page_angles": {},
+        })
         
         # تحديث جلسة المستخدم
-        session_service.update_session(session_id, 'pdf_mode', True)
-        session_service.update_session(session_id, 'total_pages', pdf_info.total_pages)
-        session_service.update_session(session_id, 'language_direction', recommended_language)
+        await session_service.update_session(session_id, 'pdf_mode', True)
+        await session_service.update_session(session_id, 'total_pages', pdf_info.total_pages)
+        await session_service.update_session(session_id, 'language_direction', recommended_language)
         
         # إنشاء رسالة شرح للنموذج
         form_explanation = f"تم العثور على مستند PDF يحتوي على {pdf_info.total_pages} صفحة. سيتم تحليل كل صفحة للبحث عن حقول قابلة للتعبئة."
@@ -578,12 +720,12 @@ async def analyze_pdf_form(session_id: str = Form(...), language_direction: str
     """
     try:
         # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة أو منتهية الصلاحية")
-        
-        pdf_session = pdf_sessions[session_id]
-        pages_data = pdf_session["pages_data"]
-        pdf_info = pdf_session["pdf_info"]
+        pdf_session = await _load_pdf_session(session_id)
+        pages_data = await _get_pages_data(session_id, pdf_session)
+        pdf_info = PDFInfo(**pdf_session["pdf_info"])
+        file_content = await blob_store.get(pdf_session["file_blob"])
+        if file_content is None:
+            raise HTTPException(status_code=404, detail="ملف PDF للجلسة غير موجود أو منتهي الصلاحية")
         
         # تحديد اللغة المُستخدمة
         final_language = language_direction or pdf_session["recommended_language"]
@@ -592,79 +734,70 @@ async def analyze_pdf_form(session_id: str = Form(...), language_direction: str
         analyzed_pages = []
         total_fields = 0
         pages_with_fields = 0
+        page_angles = pdf_session.setdefault("page_angles", {})
+        
+        # تحليل الصفحات بالتوازي: الاتجاه و YOLO في عمليات منفصلة بالتزامن مع طلبات Gemini
+        page_results = await page_pipeline_service.analyze_pages(
+            file_content,
+            list(range(1, len(pages_data) + 1)),
+            final_language,
+            {int(page): angle for page, angle in page_angles.items()},
+        )
         
-        for page_data in pages_data:
-            try:
-                page_number = page_data["page_number"]
-                page_image = page_data["image"]
-                
-                # تصحيح اتجاه الصورة
-                corrected_image = image_service.correct_image_orientation(page_image)
-                
-                # البحث عن الحقول باستخدام YOLO
-                fields_data = yolo_service.detect_fields_with_language(corrected_image, final_language)
-                
-                if fields_data:
-                    # إنشاء صورة مُرقمة للذكاء الاصطناعي
-                    gpt_image = image_service.create_annotated_image_for_gpt(
-                        corrected_image, fields_data, with_numbers=True
-                    )
-                    
-                    # الحصول على تسميات الحقول من Gemini
-                    gpt_fields_raw = gemini_service.get_form_fields_only(gpt_image, final_language)
-                    
-                    if gpt_fields_raw:
-                        # تصفية الحقول الصحيحة
-                        gpt_fields = [field for field in gpt_fields_raw if field.get("valid", False)]
-                        final_fields = image_service.combine_yolo_and_gpt_results(fields_data, gpt_fields)
-                        
-                        # إضافة معرف الصفحة لكل حقل
-                        for field in final_fields:
-                            field['page_number'] = page_number
-                            field['box_id'] = f"page_{page_number}_{field['box_id']}"
-                        
-                        total_fields += len(final_fields)
-                        pages_with_fields += 1
-                    else:
-                        final_fields = []
-                else:
-                    final_fields = []
-                
-                # إنشاء تحليل الصفحة
-                page_analysis = {
-                    "page_number": page_number,
-                    "fields": final_fields,
-                    "language_direction": final_language,
-                    "image_width": corrected_image.width,
-                    "image_height": corrected_image.height,
-                    "has_fields": len(final_fields) > 0,
-                    "field_count": len(final_fields)
-                }
-                
-                analyzed_pages.append(page_analysis)
-                
-            except Exception as e:
+        for result in page_results:
+            page_number = result["page_number"]
+            
+            if "error" in result:
                 # في حالة خطأ في معالجة صفحة معينة، أضف صفحة فارغة
+                image_width, image_height = _upright_page_size(pages_data, page_angles, page_number)
                 analyzed_pages.append({
-                    "page_number": page_data["page_number"],
+                    "page_number": page_number,
                     "fields": [],
                     "language_direction": final_language,
-                    "image_width": page_data["width"],
-                    "image_height": page_data["height"],
+                    "image_width": image_width,
+                    "image_height": image_height,
                     "has_fields": False,
                     "field_count": 0,
-                    "error": f"خطأ في معالجة الصفحة: {str(e)}"
+                    "error": f"خطأ في معالجة الصفحة: {result['error']}"
                 })
+                continue
+            
+            page_angles[str(page_number)] = result["angle"]
+            final_fields = result["fields"]
+            
+            # إضافة معرف الصفحة لكل حقل
+            for field in final_fields:
+                field['page_number'] = page_number
+                field['box_id'] = f"page_{page_number}_{field['box_id']}"
+            
+            if final_fields:
+                total_fields += len(final_fields)
+                pages_with_fields += 1
+            
+            # إنشاء تحليل الصفحة
+            analyzed_pages.append({
+                "page_number": page_number,
+                "fields": final_fields,
+                "language_direction": final_language,
+                "image_width": result["width"],
+                "image_height": result["height"],
+                "has_fields": len(final_fields) > 0,
+                "field_count": len(final_fields)
+            })
         
         # تحديث بيانات الجلسة
-        pdf_session["analyzed_pages"] = analyzed_pages
-        pdf_session["final_language"] = final_language
+        def _store_analysis(data: dict):
+            data["analyzed_pages"] = analyzed_pages
+            data["final_language"] = final_language
+            data.setdefault("page_angles", {}).update(page_angles)
+        
+        await session_service.modify("pdf", session_id, _store_analysis)
         
         # تحديث جلسة المستخدم
-        session_service.update_session(session_id, 'analysis_completed', True)
-        session_service.update_session(session_id, 'language_direction', final_language)
-        session_service.update_session(session_id, 'total_fields', total_fields)
-        session_service.update_session(session_id, 'pages_with_fields', pages_with_fields)
+        await session_service.update_session(session_id, 'analysis_completed', True)
+        await session_service.update_session(session_id, 'language_direction', final_language)
+        await session_service.update_session(session_id, 'total_fields', total_fields)
+        await session_service.update_session(session_id, 'pages_with_fields', pages_with_fields)
         
         return PDFFormAnalysisResponse(
             pdf_info=pdf_info,
@@ -681,37 +814,34 @@ async def analyze_pdf_form(session_id: str = Form(...), language_direction: str
         raise HTTPException(status_code=500, detail=f"خطأ في تحليل PDF: {str(e)}")
 
 @router.get("/pdf/{session_id}/page/{page_number}", response_model=PDFPageResponse)
-async def get_pdf_page(session_id: str, page_number: int):
+async def get_pdf_page(session_id: str, page_number: int, include_image: bool = False):
     """
     الحصول على صفحة محددة من PDF مع الحقول المُحللة
+    الصورة متاحة كملف PNG عبر image_url؛ أرسل include_image=true لتضمينها كـ base64
     """
     try:
         # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة")
-        
-        pdf_session = pdf_sessions[session_id]
+        pdf_session = await _load_pdf_session(session_id, "جلسة PDF غير موجودة")
         
         # التحقق من رقم الصفحة
-        total_pages = pdf_session["pdf_info"].total_pages
+        total_pages = pdf_session["total_pages"]
         if page_number < 1 or page_number > total_pages:
             raise HTTPException(status_code=400, detail=f"رقم صفحة غير صحيح. يجب أن يكون بين 1 و {total_pages}")
         
-        # البحث عن الصفحة المطلوبة
-        pages_data = pdf_session["pages_data"]
-        analyzed_pages = pdf_session.get("analyzed_pages", [])
-        
-        # الحصول على بيانات الصورة
-        page_data = next((p for p in pages_data if p["page_number"] == page_number), None)
-        if not page_data:
-            raise HTTPException(status_code=404, detail="بيانات الصفحة غير موجودة")
+        # الحصول على بيانات الصورة (base64 فقط عند الطلب)
+        image_base64 = None
+        if include_image:
+            pages_data = await _get_pages_data(session_id, pdf_session)
+            image_base64 = await _run_vision(pages_data.get_page_base64, page_number)
+            if image_base64 is None:
+                raise HTTPException(status_code=404, detail="بيانات الصفحة غير موجودة")
         
         # الحصول على تحليل الصفحة
-        page_analysis = next((p for p in analyzed_pages if p["page_number"] == page_number), None)
+        page_analysis = _find_page_analysis(pdf_session, page_number)
         
         if page_analysis:
             fields = page_analysis["fields"]
-            language_direction = page_analysis["language_direction"]
+            language_direction = page_analysis.get("language_direction", pdf_session.get("final_language", "rtl"))
             has_fields = page_analysis["has_fields"]
         else:
             # إذا لم يكن هناك تحليل، أرجع صفحة فارغة
@@ -723,7 +853,8 @@ async def get_pdf_page(session_id: str, page_number: int):
             page_number=page_number,
             total_pages=total_pages,
             fields=fields,
-            image_base64=page_data["image_base64"],
+            image_base64=image_base64,
+            image_url=f"{router.prefix}/pdf/{session_id}/page/{page_number}/image",
             language_direction=language_direction,
             has_fields=has_fields,
             session_id=session_id
@@ -734,6 +865,42 @@ async def get_pdf_page(session_id: str, page_number: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"خطأ في الحصول على الصفحة: {str(e)}")
 
+@router.get("/pdf/{session_id}/page/{page_number}/image")
+async def get_pdf_page_image(session_id: str, page_number: int):
+    """
+    صورة صفحة PDF كملف PNG (بدون ترميز base64)
+    """
+    try:
+        pdf_session = await _load_pdf_session(session_id, "جلسة PDF غير موجودة")
+        
+        total_pages = pdf_session["total_pages"]
+        if page_number < 1 or page_number > total_pages:
+            raise HTTPException(status_code=400, detail=f"رقم صفحة غير صحيح. يجب أن يكون بين 1 و {total_pages}")
+        
+        pages_data = await _get_pages_data(session_id, pdf_session)
+        page_data = await _run_vision(pages_data.get_page, page_number)
+        if not page_data:
+            raise HTTPException(status_code=404, detail="بيانات الصفحة غير موجودة")
+        
+        img_bytes = await _run_vision(
+            _image_to_png_bytes, page_data["image"], "form", f"pdf:{session_id}:{page_number}"
+        )
+        return Response(
+            content=img_bytes,
+            media_type="image/png",
+            headers={
+                "X-Session-ID": session_id,
+                "X-Page-Number": str(page_number),
+                "X-Width": str(page_data["width"]),
+                "X-Height": str(page_data["height"]),
+            },
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"خطأ في الحصول على صورة الصفحة: {str(e)}")
+
 @router.post("/pdf/{session_id}/annotate-page")
 async def annotate_pdf_page(
     session_id: str,
@@ -749,10 +916,7 @@ async def annotate_pdf_page(
         import json
         
         # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة")
-        
-        pdf_session = pdf_sessions[session_id]
+        pdf_session = await _load_pdf_session(session_id, "جلسة PDF غير موجودة")
         
         # تحويل JSON إلى dict
         try:
@@ -761,13 +925,13 @@ async def annotate_pdf_page(
             raise HTTPException(status_code=400, detail="بيانات النص غير صحيحة")
         
         # الحصول على بيانات الصفحة
-        page_data = next((p for p in pdf_session["pages_data"] if p["page_number"] == page_number), None)
+        pages_data = await _get_pages_data(session_id, pdf_session)
+        page_data = await _run_vision(pages_data.get_page, page_number)
         if not page_data:
             raise HTTPException(status_code=404, detail="الصفحة غير موجودة")
         
         # الحصول على تحليل الصفحة
-        analyzed_pages = pdf_session.get("analyzed_pages", [])
-        page_analysis = next((p for p in analyzed_pages if p["page_number"] == page_number), None)
+        page_analysis = _find_page_analysis(pdf_session, page_number)
         
         if not page_analysis:
             raise HTTPException(status_code=400, detail="لم يتم تحليل هذه الصفحة بعد")
@@ -789,21 +953,22 @@ async def annotate_pdf_page(
                 })
         
         try:
-            final_image = image_service.create_final_annotated_image(
+            final_image = await _run_vision(
+                image_service.create_final_annotated_image,
                 image=original_image,
                 texts_dict=texts_dict_parsed,
                 ui_fields=ui_fields,
                 signature_image_b64=signature_image_b64,
                 signature_field_id=signature_field_id
             )
+        except HTTPException:
+            raise
         except Exception as img_error:
             # في حالة فشل الرسم، أرجع الصورة الأصلية
             final_image = original_image
         
         # تحويل إلى bytes وإرجاع
-        buffered = io.BytesIO()
-        final_image.save(buffered, format="PNG")
-        img_bytes = buffered.getvalue()
+        img_bytes = await _run_vision(_image_to_png_bytes, final_image, "fill")
         
         return Response(content=img_bytes, media_type="image/png")
         
@@ -838,43 +1003,46 @@ async def explore_pdf(file: UploadFile = File(...)):
         file_content = await file.read()
         
         # التحقق من صحة PDF
-        is_valid, validation_message = pdf_processor.validate_pdf_for_forms(file_content)
+        is_valid, validation_message = await _run_vision(
+            pdf_processor.validate_pdf_for_forms, file_content
+        )
         if not is_valid:
             raise HTTPException(status_code=400, detail=validation_message)
         
         # الحصول على معلومات PDF
-        pdf_info_raw = pdf_processor.get_pdf_info(file_content)
+        pdf_info_raw = await _run_vision(pdf_processor.get_pdf_info, file_content)
         total_pages = pdf_info_raw.get("total_pages", 0)
         
         if total_pages == 0:
             raise HTTPException(status_code=400, detail="لا يحتوي ملف PDF على صفحات صالحة")
         
-        # تحويل جميع الصفحات إلى صور
-        pages_data = pdf_processor.convert_pdf_to_images(file_content)
-        if not pages_data:
+        # فتح PDF للعرض عند الطلب؛ كل صفحة تُحوَّل إلى صورة عند أول استخدام
+        pages_data = await _run_vision(pdf_processor.open_pdf, file_content)
+        if not len(pages_data):
             raise HTTPException(status_code=400, detail="فشل في تحويل صفحات PDF إلى صور")
         
         # إنشاء جلسة جديدة
-        session_id = session_service.create_session()
+        session_id = await session_service.create_session()
+        page_sources.put(session_id, pages_data)
         
-        # تخزين بيانات PDF في الجلسة المؤقتة
-        pdf_sessions[session_id] = {
+        # تخزين بيانات PDF في الجلسة؛ الملف والصور في مخزن الـ blobs
+        await session_service.save("pdf", session_id, {
             "filename": file.filename,
             "total_pages": total_pages,
-            "pages_data": pages_data,
-            "file_content": file_content,
+            "file_blob": await blob_store.put(session_id, file_content),
             "current_stage": "explore",  # explore -> explain -> analyze -> fill -> complete
             "current_page": 1,
             "explained_pages": [],
             "analyzed_pages": [],
-            "filled_pages": {},
+            "filled_pages": {},  # { str(page_number): {...} }
+            "page_angles": {},  # { str(page_number): angle }
             "language_direction": "rtl"  # افتراضي
-        }
+        })
         
         # تحديث جلسة المستخدم
-        session_service.update_session(session_id, 'pdf_multipage_mode', True)
-        session_service.update_session(session_id, 'total_pages', total_pages)
-        session_service.update_session(session_id, 'current_stage', 'explore')
+        await session_service.update_session(session_id, 'pdf_multipage_mode', True)
+        await session_service.update_session(session_id, 'total_pages', total_pages)
+        await session_service.update_session(session_id, 'current_stage', 'explore')
         
         return {
             "session_id": session_id,
@@ -891,80 +1059,99 @@ async def explore_pdf(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"خطأ في استكشاف PDF: {str(e)}")
 
+# Internal helpers shared by /explain-pdf-page and its streaming variant
+async def _prepare_page_explanation(session_id: str, page_number: int):
+    """Validate the page and check its language/quality; returns what the explanation needs"""
+    # التحقق من وجود الجلسة
+    pdf_session = await _load_pdf_session(session_id)
+    
+    # التحقق من رقم الصفحة
+    if page_number < 1 or page_number > pdf_session["total_pages"]:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"رقم صفحة غير صحيح. يجب أن يكون بين 1 و {pdf_session['total_pages']}"
+        )
+    
+    # تصحيح اتجاه الصورة وتحضيرها بدقة الرفع إلى Gemini
+    pages_data = await _get_pages_data(session_id, pdf_session)
+    corrected_image, = await _upright_session_page(
+        session_id, pdf_session, page_number, "upload"
+    )
+    image_width, image_height = _upright_page_size(
+        pages_data, pdf_session["page_angles"], page_number
+    )
+    
+    # فحص اللغة والجودة
+    language_direction, quality_good, quality_message = await gemini_service.detect_language_and_quality(corrected_image)
+    return {
+        "corrected_image": corrected_image,
+        "language_direction": language_direction,
+        "quality_good": quality_good,
+        "quality_message": quality_message,
+        "image_width": image_width,
+        "image_height": image_height,
+    }
+
+async def _finish_page_explanation(session_id: str, page_number: int, language_direction: str) -> dict:
+    """Record the page as explained; returns the navigation part of the response"""
+    # تحديث معلومات الجلسة وإضافة الصفحة إلى قائمة الصفحات المشروحة
+    def _mark_explained(data: dict):
+        data["language_direction"] = language_direction
+        data["current_page"] = page_number
+        if page_number not in data["explained_pages"]:
+            data["explained_pages"].append(page_number)
+    
+    pdf_session = await session_service.modify("pdf", session_id, _mark_explained)
+    if pdf_session is None:
+        raise HTTPException(status_code=404, detail="الجلسة غير موجودة")
+    
+    # تحديد ما إذا كانت هناك صفحة تالية
+    has_next_page = page_number < pdf_session["total_pages"]
+    
+    return {
+        "total_pages": pdf_session["total_pages"],
+        "has_next_page": has_next_page,
+        "next_page_number": page_number + 1 if has_next_page else None,
+        # تحديد ما إذا كان بإمكان البدء في التحليل
+        "all_pages_explained": len(pdf_session["explained_pages"]) >= pdf_session["total_pages"],
+    }
+
 @router.post("/explain-pdf-page", response_model=dict)
 async def explain_pdf_page(session_id: str = Form(...), page_number: int = Form(...)):
     """
     المرحلة الثانية: شرح محتوى صفحة محددة من PDF
     """
     try:
-        # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة أو منتهية الصلاحية")
-        
-        pdf_session = pdf_sessions[session_id]
-        
-        # التحقق من رقم الصفحة
-        if page_number < 1 or page_number > pdf_session["total_pages"]:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"رقم صفحة غير صحيح. يجب أن يكون بين 1 و {pdf_session['total_pages']}"
-            )
-        
-        # البحث عن بيانات الصفحة
-        page_data = next(
-            (p for p in pdf_session["pages_data"] if p["page_number"] == page_number), 
-            None
-        )
-        if not page_data:
-            raise HTTPException(status_code=404, detail="بيانات الصفحة غير موجودة")
-        
-        # تصحيح اتجاه الصورة
-        page_image = page_data["image"]
-        corrected_image = image_service.correct_image_orientation(page_image)
-        
-        # فحص اللغة والجودة
-        language_direction, quality_good, quality_message = gemini_service.detect_language_and_quality(corrected_image)
+        page = await _prepare_page_explanation(session_id, page_number)
+        language_direction = page["language_direction"]
         
         # الحصول على شرح محتوى الصفحة
         form_explanation = ""
-        if quality_good:
+        if page["quality_good"]:
             try:
                 # استخدام فانكشن الشرح فقط بدون تحليل الحقول
-                explanation = gemini_service.get_quick_form_explanation(corrected_image, language_direction)
+                explanation = await gemini_service.get_quick_form_explanation(page["corrected_image"], language_direction)
                 form_explanation = explanation or f"هذه هي الصفحة رقم {page_number} من المستند."
             except Exception as e:
                 form_explanation = f"هذه هي الصفحة رقم {page_number} من المستند. (لم يتمكن من تحليل المحتوى تلقائياً)"
         else:
-            form_explanation = f"هذه هي الصفحة رقم {page_number} من المستند. {quality_message}"
+            form_explanation = f"هذه هي الصفحة رقم {page_number} من المستند. {page['quality_message']}"
         
-        # تحديث معلومات الجلسة
-        pdf_session["language_direction"] = language_direction
-        pdf_session["current_page"] = page_number
-        
-        # إضافة الصفحة إلى قائمة الصفحات المشروحة
-        if page_number not in pdf_session["explained_pages"]:
-            pdf_session["explained_pages"].append(page_number)
-        
-        # تحديد ما إذا كانت هناك صفحة تالية
-        has_next_page = page_number < pdf_session["total_pages"]
-        next_page_number = page_number + 1 if has_next_page else None
-        
-        # تحديد ما إذا كان بإمكان البدء في التحليل
-        all_pages_explained = len(pdf_session["explained_pages"]) >= pdf_session["total_pages"]
+        progress = await _finish_page_explanation(session_id, page_number, language_direction)
         
         return {
             "session_id": session_id,
             "page_number": page_number,
-            "total_pages": pdf_session["total_pages"],
+            "total_pages": progress["total_pages"],
             "explanation": form_explanation,
             "language_direction": language_direction,
-            "quality_good": quality_good,
-            "quality_message": quality_message,
-            "has_next_page": has_next_page,
-            "next_page_number": next_page_number,
-            "all_pages_explained": all_pages_explained,
-            "image_width": corrected_image.width,
-            "image_height": corrected_image.height
+            "quality_good": page["quality_good"],
+            "quality_message": page["quality_message"],
+            "has_next_page": progress["has_next_page"],
+            "next_page_number": progress["next_page_number"],
+            "all_pages_explained": progress["all_pages_explained"],
+            "image_width": page["image_width"],
+            "image_height": page["image_height"]
         }
         
     except HTTPException:
@@ -972,6 +1159,58 @@ async def explain_pdf_page(session_id: str = Form(...), page_number: int = Form(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"خطأ في شرح الصفحة: {str(e)}")
 
+@router.post("/explain-pdf-page/stream")
+async def stream_explain_pdf_page(session_id: str = Form(...), page_number: int = Form(...)):
+    """
+    شرح صفحة PDF كأحداث SSE: حدث "page" بنتيجة فحص اللغة والجودة، ثم أحداث
+    "chunk" بجمل الشرح فور توليدها، ثم "done" بالشرح الكامل وحالة التقدم
+    """
+    try:
+        page = await _prepare_page_explanation(session_id, page_number)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"خطأ في شرح الصفحة: {str(e)}")
+    language_direction = page["language_direction"]
+
+    async def events():
+        yield sse_event("page", {
+            "session_id": session_id,
+            "page_number": page_number,
+            "language_direction": language_direction,
+            "quality_good": page["quality_good"],
+            "quality_message": page["quality_message"],
+            "image_width": page["image_width"],
+            "image_height": page["image_height"],
+        })
+        
+        if page["quality_good"]:
+            form_explanation = ""
+            try:
+                async for text, final in gemini_service.stream_quick_form_explanation(
+                    page["corrected_image"], language_direction
+                ):
+                    if final:
+                        form_explanation = text
+                    else:
+                        yield sse_event("chunk", {"text": text})
+            except Exception:
+                form_explanation = f"هذه هي الصفحة رقم {page_number} من المستند. (لم يتمكن من تحليل المحتوى تلقائياً)"
+                yield sse_event("chunk", {"text": form_explanation})
+            form_explanation = form_explanation or f"هذه هي الصفحة رقم {page_number} من المستند."
+        else:
+            form_explanation = f"هذه هي الصفحة رقم {page_number} من المستند. {page['quality_message']}"
+            yield sse_event("chunk", {"text": form_explanation})
+        
+        try:
+            progress = await _finish_page_explanation(session_id, page_number, language_direction)
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+            return
+        yield sse_event("done", {"explanation": form_explanation, **progress})
+
+    return sse_response(events())
+
 @router.post("/analyze-pdf-page", response_model=dict)
 async def analyze_pdf_page(session_id: str = Form(...), page_number: int = Form(...)):
     """
@@ -979,10 +1218,7 @@ async def analyze_pdf_page(session_id: str = Form(...), page_number: int = Form(
     """
     try:
         # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة أو منتهية الصلاحية")
-        
-        pdf_session = pdf_sessions[session_id]
+        pdf_session = await _load_pdf_session(session_id)
         
         # التحقق من رقم الصفحة
         if page_number < 1 or page_number > pdf_session["total_pages"]:
@@ -992,10 +1228,7 @@ async def analyze_pdf_page(session_id: str = Form(...), page_number: int = Form(
             )
         
         # التحقق من وجود تحليل سابق لهذه الصفحة
-        existing_analysis = next(
-            (p for p in pdf_session.get("analyzed_pages", []) if p["page_number"] == page_number),
-            None
-        )
+        existing_analysis = _find_page_analysis(pdf_session, page_number)
         
         if existing_analysis:
             return {
@@ -1013,32 +1246,33 @@ async def analyze_pdf_page(session_id: str = Form(...), page_number: int = Form(
                 "field_count": len(existing_analysis.get("fields", []))
             }
         
-        # البحث عن بيانات الصفحة
-        page_data = next(
-            (p for p in pdf_session["pages_data"] if p["page_number"] == page_number), 
-            None
+        # تصحيح اتجاه الصورة بدقة الكشف
+        corrected_image, = await _upright_session_page(
+            session_id, pdf_session, page_number, "detection"
         )
-        if not page_data:
-            raise HTTPException(status_code=404, detail="بيانات الصفحة غير موجودة")
-        
-        # تصحيح اتجاه الصورة
-        page_image = page_data["image"]
-        corrected_image = image_service.correct_image_orientation(page_image)
         
         # تحديد اللغة المُستخدمة
         language_direction = pdf_session.get("language_direction", "rtl")
         
         # البحث عن الحقول باستخدام YOLO
-        fields_data = yolo_service.detect_fields_with_language(corrected_image, language_direction)
+        fields_data = await _run_vision(
+            yolo_service.detect_fields_with_language, corrected_image, language_direction
+        )
         
         if not fields_data:
             # لا توجد حقول قابلة للتعبئة في هذه الصفحة
-            pdf_session["analyzed_pages"].append({
+            empty_analysis = {
                 "page_number": page_number,
                 "has_fields": False,
                 "fields": [],
                 "message": "لا توجد حقول قابلة للتعبئة في هذه الصفحة"
-            })
+            }
+            
+            def _store_empty_page(data: dict):
+                if _find_page_analysis(data, page_number) is None:
+                    data["analyzed_pages"].append(empty_analysis)
+            
+            pdf_session = await session_service.modify("pdf", session_id, _store_empty_page) or pdf_session
             
             has_next_page = page_number < pdf_session["total_pages"]
             next_page_number = page_number + 1 if has_next_page else None
@@ -1057,12 +1291,12 @@ async def analyze_pdf_page(session_id: str = Form(...), page_number: int = Form(
                 "language_direction": language_direction
             }
         
-        # إنشاء صورة مُرقمة للذكاء الاصطناعي
-        gpt_image = image_service.create_annotated_image_for_gpt(corrected_image, fields_data, with_numbers=True)
+        # إنشاء صورة مُرقمة للذكاء الاصطناعي بدقة الرفع
+        gpt_image = await _run_vision(_annotated_upload_image, corrected_image, fields_data)
         
         # الحصول على تسميات الحقول من Gemini
         try:
-            gpt_fields_raw = gemini_service.get_form_fields_only(gpt_image, language_direction)
+            gpt_fields_raw = await gemini_service.get_form_fields_only(gpt_image, language_direction)
         except Exception as gemini_error:
             gpt_fields_raw = None
         
@@ -1108,29 +1342,19 @@ async def analyze_pdf_page(session_id: str = Form(...), page_number: int = Form(
             "language_direction": language_direction,
             "image_width": corrected_image.width,
             "image_height": corrected_image.height,
-            "corrected_image_b64": None  # سيتم ملؤها عند الحاجة
+            # الصورة المصححة لا تُخزَّن: التعبئة تعيد استخدام صفحة PDF بنفس الدقة والاتجاه
         }
         
-        # تخزين الصورة المصححة كـ base64 للاستخدام في التعبئة
-        try:
-            img_buffer = io.BytesIO()
-            corrected_image.save(img_buffer, format="PNG")
-            corrected_image_b64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-            page_analysis["corrected_image_b64"] = corrected_image_b64
-        except Exception as img_save_error:
-            pass
-        
-        # Check for existing analysis of this page and remove to avoid duplication
-        existing_analysis_indices = [
-            i for i, p in enumerate(pdf_session["analyzed_pages"]) 
-            if p["page_number"] == page_number
-        ]
-        for idx in reversed(existing_analysis_indices):  # حذف من الخلف للأمام لتجنب مشاكل الفهرسة
-            pdf_session["analyzed_pages"].pop(idx)
+        def _store_page_analysis(data: dict):
+            # Check for existing analysis of this page and remove to avoid duplication
+            data["analyzed_pages"] = [
+                p for p in data["analyzed_pages"] if p["page_number"] != page_number
+            ]
+            data["analyzed_pages"].append(page_analysis)
+            data["current_stage"] = "analyze"
+            data["current_page"] = page_number
         
-        pdf_session["analyzed_pages"].append(page_analysis)
-        pdf_session["current_stage"] = "analyze"
-        pdf_session["current_page"] = page_number
+        pdf_session = await session_service.modify("pdf", session_id, _store_page_analysis) or pdf_session
         
         # تحديد ما إذا كانت هناك صفحة تالية
         has_next_page = page_number < pdf_session["total_pages"]
@@ -1172,10 +1396,7 @@ async def fill_pdf_page(
         import json
         
         # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة أو منتهية الصلاحية")
-        
-        pdf_session = pdf_sessions[session_id]
+        pdf_session = await _load_pdf_session(session_id)
         
         # تحويل JSON إلى dict
         try:
@@ -1184,22 +1405,20 @@ async def fill_pdf_page(
             raise HTTPException(status_code=400, detail="بيانات النص غير صحيحة")
         
         # البحث عن تحليل الصفحة
-        page_analysis = next(
-            (p for p in pdf_session["analyzed_pages"] if p["page_number"] == page_number),
-            None
-        )
+        page_analysis = _find_page_analysis(pdf_session, page_number)
         if not page_analysis:
             raise HTTPException(status_code=400, detail="لم يتم تحليل هذه الصفحة بعد")
         
-        # الحصول على الصورة المصححة
-        corrected_image_b64 = page_analysis.get("corrected_image_b64")
-        if not corrected_image_b64:
+        # الحصول على الصورة المصححة (نفس صفحة الكشف التي حُللت، من ذاكرة الصفحات إن وُجدت)
+        try:
+            original_image, = await _upright_session_page(
+                session_id, pdf_session, page_number, "detection"
+            )
+        except HTTPException:
+            raise
+        except Exception:
             raise HTTPException(status_code=400, detail="لا توجد صورة متاحة للصفحة")
         
-        # تحويل base64 إلى صورة
-        image_bytes = base64.b64decode(corrected_image_b64)
-        original_image = Image.open(io.BytesIO(image_bytes))
-        
         # الحصول على حقول الصفحة
         ui_fields = page_analysis.get("fields", [])
         
@@ -1228,37 +1447,46 @@ async def fill_pdf_page(
                     }
                     validated_fields.append(validated_field)
             
-            final_image = image_service.create_final_annotated_image(
+            final_image = await _run_vision(
+                image_service.create_final_annotated_image,
                 image=original_image,
                 texts_dict=texts_dict_parsed,
                 ui_fields=validated_fields,
                 signature_image_b64=signature_image_b64,
                 signature_field_id=signature_field_id
             )
+        except HTTPException:
+            raise
         except Exception as img_error:
             # في حالة فشل الرسم، أرجع الصورة الأصلية
             final_image = original_image
             import traceback
         
-        # تحويل الصورة النهائية إلى bytes و base64
-        buffered = io.BytesIO()
-        final_image.save(buffered, format="PNG")
-        final_image_bytes = buffered.getvalue()
-        final_image_b64 = base64.b64encode(final_image_bytes).decode('utf-8')
+        # تحويل الصورة النهائية إلى PNG مرة واحدة: للاستجابة وللتخزين
+        final_image_bytes = await _run_vision(_image_to_png_bytes, final_image, "fill")
+        final_image_blob = await _store_image(session_id, final_image, final_image_bytes)
         
         # حفظ الصفحة المعبأة (مع استبدال أي نسخة سابقة)
-        pdf_session["filled_pages"][page_number] = {
+        filled_page = {
             "page_number": page_number,
-            "image_data": final_image_bytes,
-            "image_b64": final_image_b64,
+            "image": final_image_blob.to_dict(),
             "texts_dict": texts_dict_parsed,
             "width": final_image.width,
             "height": final_image.height,
             "fields": ui_fields
         }
+        replaced_images = []
         
-        pdf_session["current_stage"] = "fill"
+        def _store_filled_page(data: dict):
+            previous = data["filled_pages"].get(str(page_number))
+            replaced_images[:] = [previous["image"]] if previous else []
+            data["filled_pages"][str(page_number)] = filled_page
+            data["current_stage"] = "fill"
         
+        pdf_session = await session_service.modify("pdf", session_id, _store_filled_page) or pdf_session
+        for previous_image in replaced_images:
+            if previous_image["ref"] != final_image_blob.ref:
+                await ImageBlob.from_dict(previous_image).delete()
         
         # تحديد ما إذا كانت هناك صفحة تالية
         has_next_page = page_number < pdf_session["total_pages"]
@@ -1292,10 +1520,7 @@ async def download_filled_pdf(session_id: str):
     """
     try:
         # التحقق من وجود الجلسة
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة أو منتهية الصلاحية")
-        
-        pdf_session = pdf_sessions[session_id]
+        pdf_session = await _load_pdf_session(session_id)
         
         # التحقق من أن جميع الصفحات تم تعبئتها
         total_pages = pdf_session["total_pages"]
@@ -1314,31 +1539,28 @@ async def download_filled_pdf(session_id: str):
         
         # تحضير قائمة الصفحات للدمج
         pages_for_pdf = []
+        pages_data = None
         for page_num in range(1, total_pages + 1):
-            if page_num in filled_pages:
+            filled_page = filled_pages.get(str(page_num))
+            filled_image = await ImageBlob.from_dict(filled_page["image"]).read() if filled_page else None
+            if filled_image:
                 # استخدم الصفحة المعبأة
-                filled_page = filled_pages[page_num]
                 pages_for_pdf.append({
                     "page_number": page_num,
-                    "image_data": filled_page["image_data"],
+                    "image_data": filled_image,
                     "width": filled_page.get("width"),
                     "height": filled_page.get("height")
                 })
             else:
                 # استخدم الصفحة الأصلية إذا لم يتم تعبئتها
-                page_data = next(
-                    (p for p in pdf_session["pages_data"] if p["page_number"] == page_num),
-                    None
-                )
+                if pages_data is None:
+                    pages_data = await _get_pages_data(session_id, pdf_session)
+                page_data = await _run_vision(pages_data.get_page, page_num, "output")
                 if page_data:
-                    # تحويل صورة الصفحة الأصلية إلى bytes
-                    img_buffer = io.BytesIO()
-                    page_data["image"].save(img_buffer, format="PNG")
-                    original_image_bytes = img_buffer.getvalue()
-                    
+                    # تمرير الصورة مباشرة (بدون ترميز PNG وسيط)
                     pages_for_pdf.append({
                         "page_number": page_num,
-                        "image_data": original_image_bytes,
+                        "image": page_data["image"],
                         "width": page_data.get("width"),
                         "height": page_data.get("height")
                     })
@@ -1394,12 +1616,16 @@ async def download_filled_pdf(session_id: str):
         safe_filename = sanitize_filename(original_filename)
         
         try:
-            pdf_bytes = pdf_merger.create_pdf_from_images(pages_for_pdf, safe_filename)
+            pdf_bytes = await _run_vision(
+                pdf_merger.create_pdf_from_images, pages_for_pdf, safe_filename
+            )
             
             # التحقق من صحة PDF
             if len(pdf_bytes) == 0:
                 raise ValueError("PDF bytes is empty")
                 
+        except HTTPException:
+            raise
         except Exception as merge_error:
             for i, page in enumerate(pages_for_pdf):
                 page_size = len(page.get('image_data', b'')) if page.get('image_data') else 0
@@ -1421,7 +1647,9 @@ async def download_filled_pdf(session_id: str):
             )
         
         # تحديث حالة الجلسة
-        pdf_session["current_stage"] = "complete"
+        await session_service.modify(
+            "pdf", session_id, lambda data: data.__setitem__("current_stage", "complete")
+        )
         
         # إنشاء header آمن لاسم الملف
         # استخدام ASCII فقط لضمان التوافق الكامل
@@ -1506,10 +1734,7 @@ async def get_pdf_session_status(session_id: str):
     الحصول على حالة جلسة PDF متعددة الصفحات
     """
     try:
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة")
-        
-        pdf_session = pdf_sessions[session_id]
+        pdf_session = await _load_pdf_session(session_id, "جلسة PDF غير موجودة")
         
         return {
             "session_id": session_id,
@@ -1536,11 +1761,12 @@ async def delete_pdf_session(session_id: str):
     """
     try:
         
-        if session_id not in pdf_sessions:
-            raise HTTPException(status_code=404, detail="جلسة PDF غير موجودة")
+        deleted_session = await _load_pdf_session(session_id, "جلسة PDF غير موجودة")
         
-        # حذف الجلسة
-        deleted_session = pdf_sessions.pop(session_id, None)
+        # حذف الجلسة (والملف والصور إن لم تعد مستخدمة) وإغلاق الـ PDF المفتوح في هذه العملية
+        await session_service.remove("pdf", session_id)
+        page_sources.discard(session_id)
+        image_codec.discard(f"pdf:{session_id}:")
         
         return {
             "message": f"تم حذف جلسة PDF {session_id} بنجاح",
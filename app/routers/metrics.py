@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+
+from app.services.session import SessionService
+from app.services.gemini_cache import gemini_cache
+from app.services.gemini_client import gemini_client
+from app.services.gemini_metrics import gemini_metrics
+from app.services.image_blob import decoded_images
+from app.services.image_codec import image_codec
+from app.services.page_prefetch import page_prefetcher
+from app.routers.form_analyzer import page_sources
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+session_service = SessionService()
+
+
+@router.get("/sessions")
+async def get_session_stats():
+    """
+    Session memory usage: live sessions, session/blob store usage (including
+    sessions spilled to disk) and the per-process image, PDF and encoded image caches and the page prefetcher.
+    """
+    stats = await session_service.stats()
+    stats["process_caches"] = {
+        "decoded_images": decoded_images.stats(),
+        "open_pdfs": page_sources.stats(),
+        "encoded_images": image_codec.stats(),
+        "page_prefetch": page_prefetcher.stats(),
+    }
+    return stats
+
+
+@router.get("/gemini")
+async def get_gemini_stats():
+    """
+    Gemini call health per model: circuit breaker state, retries, deadline
+    overruns, hedged requests and recent p95 latency; per call and model
+    histograms of wall time, image bytes and prompt/output tokens with
+    finish reasons (and estimated cost when gemini_token_prices is set);
+    and the result cache.
+    """
+    return {
+        "client": gemini_client.stats(),
+        "calls": gemini_metrics.stats(),
+        "cache": gemini_cache.stats(),
+    }
@@ -0,0 +1,374 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from app.config import get_settings
+from app.services.session_store import REDIS_AVAILABLE, session_store
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+if REDIS_AVAILABLE:
+    import redis.asyncio as aioredis
+
+# References look like "<session_id>/<blob_id>"; session ids are uuid4 strings
+_REF_PATTERN = re.compile(r"^[A-Za-z0-9_-]+/[0-9a-f]{32}$")
+
+
+def _split_ref(ref: str):
+    if not isinstance(ref, str) or not _REF_PATTERN.match(ref):
+        raise ValueError(f"Invalid blob reference: {ref!r}")
+    return ref.split("/", 1)
+
+
+class BlobStore:
+    """
+    Storage for large session payloads (uploaded files, page images, filled
+    pages) kept out of the session documents.
+
+    Blobs are owned by a session: put() returns a reference string that the
+    session stores, and delete_session() drops all blobs of a session at
+    once when it is deleted or expires.
+    """
+
+    name = "base"
+
+    async def put(self, session_id: str, data: bytes) -> str:
+        ref = f"{session_id}/{uuid.uuid4().hex}"
+        await self._write(ref, data)
+        return ref
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def delete(self, ref: str):
+        raise NotImplementedError
+
+    async def delete_session(self, session_id: str):
+        raise NotImplementedError
+
+    async def touch(self, session_id: str):
+        """Keep a session's blobs alive; only needed where blobs expire on their own"""
+
+    def register_cache(self, name: str, memory_bytes: Callable[[], int]):
+        """
+        Count a per-process cache of session data against the memory budget;
+        only the memory backend has one
+        """
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage figures for the metrics endpoint"""
+        return {"backend": self.name}
+
+    async def _write(self, ref: str, data: bytes):
+        raise NotImplementedError
+
+
+class MemoryBlobStore(BlobStore):
+    """
+    Process-local blobs; pairs with the memory session store.
+
+    Blob bytes are kept in RAM up to budget_bytes. Sessions are ordered by
+    last use (put/get/touch), and when the budget is exceeded the coldest
+    sessions are spilled to files under spill_dir. A spilled session is
+    loaded back into memory on its next read. Per-process caches derived
+    from session data (decoded images, open PDFs) register with
+    register_cache() and count against the same budget: they are bounded
+    by their own limits, so when they grow more blobs are spilled.
+    """
+
+    name = "memory"
+
+    def __init__(self, budget_bytes: int = 0, spill_dir: str = ""):
+        # session_id -> blob_id -> bytes, least recently used session first
+        self._blobs: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+        # Sessions whose blobs are being written to disk, still readable here
+        self._spilling: Dict[str, Dict[str, bytes]] = {}
+        # session_id -> bytes on disk
+        self._spilled: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = Lock()
+        self._caches: Dict[str, Callable[[], int]] = {}
+        self.budget_bytes = budget_bytes
+        self.spill_root: Optional[Path] = None
+        if budget_bytes > 0 and spill_dir:
+            try:
+                # Per-process directory; leftovers of a previous run are unreachable
+                self.spill_root = Path(spill_dir) / str(os.getpid())
+                shutil.rmtree(self.spill_root, True)
+                self._remove_stale_spills(Path(spill_dir))
+                self.spill_root.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Blob spill directory unavailable ({e}); keeping all blobs in memory")
+                self.spill_root = None
+        self.evictions = 0
+        self.rehydrations = 0
+
+    async def _write(self, ref: str, data: bytes):
+        session_id, blob_id = _split_ref(ref)
+        with self._lock:
+            blobs = self._blobs.setdefault(session_id, {})
+            self._bytes += len(data) - len(blobs.get(blob_id, b""))
+            blobs[blob_id] = bytes(data)
+            self._blobs.move_to_end(session_id)
+        await self._enforce_budget()
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        session_id, blob_id = _split_ref(ref)
+        with self._lock:
+            blobs = self._blobs.get(session_id)
+            if blobs is not None and blob_id in blobs:
+                self._blobs.move_to_end(session_id)
+                return blobs[blob_id]
+            data = self._spilling.get(session_id, {}).get(blob_id)
+            if data is not None or session_id not in self._spilled:
+                return data
+        await self._rehydrate(session_id)
+        with self._lock:
+            return self._blobs.get(session_id, {}).get(blob_id)
+
+    async def delete(self, ref: str):
+        session_id, blob_id = _split_ref(ref)
+        with self._lock:
+            data = self._blobs.get(session_id, {}).pop(blob_id, None)
+            if data is not None:
+                self._bytes -= len(data)
+            self._spilling.get(session_id, {}).pop(blob_id, None)
+            spilled = session_id in self._spilled
+        if spilled:
+            await asyncio.to_thread(self._unlink, self.spill_root / session_id / blob_id)
+
+    async def delete_session(self, session_id: str):
+        with self._lock:
+            blobs = self._blobs.pop(session_id, None)
+            if blobs:
+                self._bytes -= sum(len(data) for data in blobs.values())
+            # A spill in progress sees the session is gone and removes its files
+            self._spilling.pop(session_id, None)
+            spilled = self._spilled.pop(session_id, None) is not None
+        if spilled:
+            await asyncio.to_thread(shutil.rmtree, self.spill_root / session_id, True)
+
+    async def touch(self, session_id: str):
+        with self._lock:
+            if session_id in self._blobs:
+                self._blobs.move_to_end(session_id)
+
+    def register_cache(self, name: str, memory_bytes: Callable[[], int]):
+        self._caches[name] = memory_bytes
+
+    def _cache_bytes(self) -> Dict[str, int]:
+        # Called outside self._lock: each cache takes its own lock
+        return {name: memory_bytes() for name, memory_bytes in self._caches.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        cache_bytes = self._cache_bytes()
+        with self._lock:
+            return {
+                "backend": self.name,
+                "memory_bytes": self._bytes,
+                "cache_bytes": cache_bytes,
+                "budget_bytes": self.budget_bytes,
+                "sessions_in_memory": len(self._blobs),
+                "sessions_spilled": len(self._spilled),
+                "spilled_bytes": sum(self._spilled.values()),
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
+
+    async def _enforce_budget(self):
+        if self.spill_root is None:
+            return
+        victims = []
+        budget = self.budget_bytes - sum(self._cache_bytes().values())
+        with self._lock:
+            # The most recently used session always stays in memory
+            while self._bytes > budget and len(self._blobs) > 1:
+                session_id, blobs = self._blobs.popitem(last=False)
+                self._bytes -= sum(len(data) for data in blobs.values())
+                self._spilling[session_id] = blobs
+                victims.append(session_id)
+        for session_id in victims:
+            blobs = self._spilling.get(session_id, {})
+            spilled_bytes = await asyncio.to_thread(self._spill_files, session_id, dict(blobs))
+            with self._lock:
+                if self._spilling.pop(session_id, None) is None:
+                    # Deleted while being written
+                    deleted = True
+                else:
+                    deleted = False
+                    self._spilled[session_id] = self._spilled.get(session_id, 0) + spilled_bytes
+                    self.evictions += 1
+            if deleted:
+                await asyncio.to_thread(shutil.rmtree, self.spill_root / session_id, True)
+
+    async def _rehydrate(self, session_id: str):
+        blobs = await asyncio.to_thread(self._read_files, session_id)
+        with self._lock:
+            if self._spilled.pop(session_id, None) is None:
+                # Deleted or already loaded by a concurrent read
+                return
+            current = self._blobs.setdefault(session_id, {})
+            for blob_id, data in blobs.items():
+                if blob_id not in current:
+                    current[blob_id] = data
+                    self._bytes += len(data)
+            self._blobs.move_to_end(session_id)
+            self.rehydrations += 1
+        await asyncio.to_thread(shutil.rmtree, self.spill_root / session_id, True)
+        await self._enforce_budget()
+
+    @staticmethod
+    def _remove_stale_spills(spill_dir: Path):
+        """Delete spill directories of processes that no longer run"""
+        if os.name != "posix" or not spill_dir.is_dir():
+            # os.kill(pid, 0) is only a liveness probe on POSIX
+            return
+        for entry in spill_dir.iterdir():
+            if not entry.name.isdigit() or int(entry.name) == os.getpid():
+                continue
+            try:
+                os.kill(int(entry.name), 0)
+            except ProcessLookupError:
+                shutil.rmtree(entry, True)
+            except OSError:
+                pass
+
+    def _spill_files(self, session_id: str, blobs: Dict[str, bytes]) -> int:
+        directory = self.spill_root / session_id
+        directory.mkdir(parents=True, exist_ok=True)
+        for blob_id, data in blobs.items():
+            (directory / blob_id).write_bytes(data)
+        return sum(len(data) for data in blobs.values())
+
+    def _read_files(self, session_id: str) -> Dict[str, bytes]:
+        directory = self.spill_root / session_id
+        try:
+            return {path.name: path.read_bytes() for path in directory.iterdir()}
+        except FileNotFoundError:
+            return {}
+
+    @staticmethod
+    def _unlink(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class DiskBlobStore(BlobStore):
+    """
+    One file per blob under <root>/<session_id>/, shared by all worker
+    processes on the host. Writes go to a temporary file that is renamed
+    into place, so readers never see a partial blob.
+    """
+
+    name = "disk"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, ref: str) -> Path:
+        session_id, blob_id = _split_ref(ref)
+        return self.root / session_id / blob_id
+
+    def _write_file(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_file(path: Path) -> Optional[bytes]:
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    async def _write(self, ref: str, data: bytes):
+        await asyncio.to_thread(self._write_file, self._path(ref), data)
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read_file, self._path(ref))
+
+    async def delete(self, ref: str):
+        try:
+            self._path(ref).unlink()
+        except FileNotFoundError:
+            pass
+
+    async def delete_session(self, session_id: str):
+        if not re.match(r"^[A-Za-z0-9_-]+$", session_id):
+            return
+        await asyncio.to_thread(shutil.rmtree, self.root / session_id, True)
+
+
+class RedisBlobStore(BlobStore):
+    """
+    One Redis hash per session (blob_id -> bytes). The hash expires with the
+    session TTL and touch() renews it whenever the session is used.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl_seconds: int, prefix: str = "insight"):
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self._redis = aioredis.from_url(url)
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}:blobs:{session_id}"
+
+    async def _write(self, ref: str, data: bytes):
+        session_id, blob_id = _split_ref(ref)
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, blob_id, data)
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def get(self, ref: str) -> Optional[bytes]:
+        session_id, blob_id = _split_ref(ref)
+        return await self._redis.hget(self._key(session_id), blob_id)
+
+    async def delete(self, ref: str):
+        session_id, blob_id = _split_ref(ref)
+        await self._redis.hdel(self._key(session_id), blob_id)
+
+    async def delete_session(self, session_id: str):
+        await self._redis.delete(self._key(session_id))
+
+    async def touch(self, session_id: str):
+        await self._redis.expire(self._key(session_id), self.ttl_seconds)
+
+
+def create_blob_store(backend: str) -> BlobStore:
+    # By default blobs live next to the sessions: SQLite sessions are shared
+    # per host, so their blobs go to the shared disk directory
+    if not backend:
+        backend = {"sqlite": "disk", "redis": "redis"}.get(session_store.name, "memory")
+    if backend == "redis":
+        if REDIS_AVAILABLE:
+            return RedisBlobStore(settings.redis_url, settings.session_ttl_seconds)
+        logger.warning("redis package not installed; using the disk blob store")
+        backend = "disk"
+    if backend == "disk":
+        try:
+            return DiskBlobStore(settings.blob_dir)
+        except OSError as e:
+            logger.warning(f"Disk blob store unavailable ({e}); using memory")
+    elif backend != "memory":
+        logger.warning(f"Unknown blob backend {backend!r}; using memory")
+    return MemoryBlobStore(settings.blob_memory_budget_bytes, settings.blob_spill_dir)
+
+
+blob_store = create_blob_store(settings.blob_backend)
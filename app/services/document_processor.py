@@ -1,13 +1,26 @@
 import io
 import base64
+import hashlib
 import tempfile
 import os
+import posixpath
+import uuid
+import zipfile
+import xml.etree.ElementTree as ET
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
 from PIL import Image
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 import logging
+from app.config import get_settings
+from app.services.image_codec import image_codec
+from app.services.ppt_pool import ppt_pool
 from app.utils.text import clean_and_format_text
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # Document processing libraries
 try:
@@ -28,6 +41,144 @@ except ImportError:
     logger.warning("PyMuPDF not available. PDF support disabled.")
 
 
+# Worker processes for large PDFs; created on first use and shared by all processors
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = Lock()
+# Processor used inside worker processes
+_worker_processor = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn: the parent holds threads (executors, torch) that make fork unsafe
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=settings.document_pdf_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_pool
+
+
+def _reset_pdf_pool(pool: ProcessPoolExecutor):
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def process_pdf_page_range(
+    file_content: bytes, start: int, end: int, deferred_xrefs: frozenset = frozenset()
+) -> List[Dict[str, Any]]:
+    """Worker process entry point: pages [start, end) of a PDF"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor._process_pdf_range(file_content, start, end, deferred_xrefs)
+
+
+# PPTX (Office Open XML) namespaces used by the text-only extractor
+_A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# Placeholders on notes pages that hold no speaker notes
+_NOTES_SKIPPED_PLACEHOLDERS = {"sldNum", "sldImg", "hdr", "ftr", "dt"}
+
+
+def _pptx_rels(archive: zipfile.ZipFile, part_path: str) -> Dict[str, Tuple[str, str]]:
+    """Relationships of a part: rId -> (type, resolved target path)"""
+    directory, name = posixpath.split(part_path)
+    rels_path = posixpath.join(directory, "_rels", f"{name}.rels")
+    if rels_path not in archive.namelist():
+        return {}
+    rels = {}
+    for rel in ET.fromstring(archive.read(rels_path)).iter(f"{_REL_NS}Relationship"):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") != "External":
+            target = posixpath.normpath(posixpath.join(directory, target))
+        rels[rel.get("Id")] = (rel.get("Type", ""), target)
+    return rels
+
+
+def _pptx_slide_paths(archive: zipfile.ZipFile) -> List[str]:
+    """Slide part paths in presentation order"""
+    presentation = ET.fromstring(archive.read("ppt/presentation.xml"))
+    rels = _pptx_rels(archive, "ppt/presentation.xml")
+    paths = []
+    for slide_id in presentation.iter(f"{_P_NS}sldId"):
+        rel = rels.get(slide_id.get(f"{_R_NS}id"))
+        if rel:
+            paths.append(rel[1])
+    return paths
+
+
+def _pptx_related_part(archive: zipfile.ZipFile, part_path: str, type_suffix: str) -> Optional[str]:
+    for rel_type, target in _pptx_rels(archive, part_path).values():
+        if rel_type.endswith(type_suffix):
+            return target
+    return None
+
+
+def _pptx_paragraphs(element) -> List[str]:
+    paragraphs = []
+    for paragraph in element.iter(f"{_A_NS}p"):
+        text = "".join(
+            node.text or "" if node.tag == f"{_A_NS}t" else "\n"
+            for node in paragraph.iter()
+            if node.tag in (f"{_A_NS}t", f"{_A_NS}br")
+        ).strip()
+        if text:
+            paragraphs.append(text)
+    return paragraphs
+
+
+def _pptx_placeholder_type(shape) -> Optional[str]:
+    placeholder = shape.find(f".//{_P_NS}nvPr/{_P_NS}ph")
+    if placeholder is None:
+        return None
+    return placeholder.get("type", "body")
+
+
+def _pptx_slide_text(archive: zipfile.ZipFile, slide_path: str) -> Tuple[str, str]:
+    """(title, text) of a slide; text covers shapes, groups and tables in document order"""
+    root = ET.fromstring(archive.read(slide_path))
+    title = ""
+    for shape in root.iter(f"{_P_NS}sp"):
+        if _pptx_placeholder_type(shape) in ("title", "ctrTitle"):
+            title = " ".join(_pptx_paragraphs(shape))
+            break
+    return title, "\n".join(_pptx_paragraphs(root))
+
+
+def _pptx_notes_text(archive: zipfile.ZipFile, notes_path: str) -> str:
+    root = ET.fromstring(archive.read(notes_path))
+    paragraphs = []
+    for shape in root.iter(f"{_P_NS}sp"):
+        if _pptx_placeholder_type(shape) in _NOTES_SKIPPED_PLACEHOLDERS:
+            continue
+        paragraphs.extend(_pptx_paragraphs(shape))
+    return "\n".join(paragraphs)
+
+
+def _pptx_slide_count(file_content: bytes) -> Optional[int]:
+    """Slide count from presentation.xml; None when the file is not a readable PPTX (e.g. .ppt)"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(file_content)) as archive:
+            return len(_pptx_slide_paths(archive))
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        return None
+
+
 class DocumentProcessor:
     def __init__(self):
         self.temp_dir = tempfile.mkdtemp()
@@ -49,98 +200,300 @@ class DocumentProcessor:
         except Exception:
             return self._create_fallback_document("unknown")
 
+    def open_document_pages(
+        self, file_content: bytes, file_extension: str
+    ) -> Tuple[int, Iterator[List[Dict[str, Any]]]]:
+        """
+        Page count of a document and an iterator over its processed pages,
+        yielded in order as batches (lists of page dicts) as soon as they
+        are ready. The iterator is driven one step at a time from a worker
+        thread; close() it to stop early.
+        """
+        extension = file_extension.lower()
+        if extension == ".pdf":
+            if not PDF_AVAILABLE:
+                raise ImportError("PyMuPDF library is required for PDF processing")
+            with fitz.open(stream=io.BytesIO(file_content), filetype="pdf") as pdf_document:
+                total_pages = len(pdf_document)
+            return total_pages, self._iter_pdf_pages(file_content, total_pages)
+        if extension in [".pptx", ".ppt"]:
+            if settings.ppt_workers > 0:
+                # Spire runs in recyclable worker processes; slide ranges render in parallel.
+                # Counting a PPTX only needs presentation.xml, not a Spire load.
+                total_slides = _pptx_slide_count(file_content)
+                if total_slides is None:
+                    total_slides = ppt_pool.count_slides(file_content)
+                return total_slides, ppt_pool.iter_slides(file_content, total_slides)
+            presentation, temp_file = self._load_presentation(file_content)
+            return (
+                len(presentation.Slides),
+                self._iter_powerpoint_pages(presentation, temp_file),
+            )
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
     def _process_pdf(self, file_content: bytes) -> Dict[str, Any]:
         """Process PDF file with embedded image extraction"""
         if not PDF_AVAILABLE:
             raise ImportError("PyMuPDF library is required for PDF processing")
 
         try:
-            # Open PDF from bytes - create file-like object
-            file_stream = io.BytesIO(file_content)
-            pdf_document = fitz.open(stream=file_stream, filetype="pdf")
-            pages = []
-            total_pages = len(pdf_document)
+            total_pages, batches = self.open_document_pages(file_content, ".pdf")
+            pages = [page for batch in batches for page in batch]
 
-            for page_num in range(total_pages):
-                page = pdf_document[page_num]
+            return {"file_type": ".pdf", "total_pages": total_pages, "pages": pages}
 
-                # Extract text from page and clean it
-                page_text = page.get_text()
-                cleaned_text = clean_and_format_text(page_text)
+        except Exception:
+            # Create fallback response instead of failing
+            return self._create_fallback_document("pdf")
 
-                # Extract embedded images from this page
-                embedded_images = self._extract_embedded_images_from_pdf(
-                    page, pdf_document
+    def _iter_pdf_pages(
+        self, file_content: bytes, total_pages: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Large PDFs are split into page ranges handled by worker processes
+        (each opens the PDF bytes itself) and yielded in page order; smaller
+        ones are processed here one page at a time.
+
+        Embedded images are encoded once per document: images that appear
+        in more than one range are left to this process (the workers mark
+        the pages with image_xref), so every page showing the same logo or
+        background shares one encoded copy.
+        """
+        chunk_size = max(1, settings.document_pdf_chunk_pages)
+        start = 0
+        # xref -> (base64, mime), or None when the image cannot be used
+        image_cache: Dict[int, Optional[Tuple[str, str]]] = {}
+        with fitz.open(stream=io.BytesIO(file_content), filetype="pdf") as pdf_document:
+            if settings.document_pdf_workers > 0 and total_pages > chunk_size:
+                pool = _get_pdf_pool()
+                ranges = [
+                    (range_start, min(range_start + chunk_size, total_pages))
+                    for range_start in range(0, total_pages, chunk_size)
+                ]
+                shared_xrefs = self._shared_pdf_image_xrefs(pdf_document, ranges)
+                futures = [
+                    pool.submit(
+                        process_pdf_page_range, file_content, range_start, range_end, shared_xrefs
+                    )
+                    for range_start, range_end in ranges
+                ]
+                try:
+                    for future, (_, range_end) in zip(futures, ranges):
+                        yield [
+                            self._resolve_deferred_image(pdf_document, page, image_cache)
+                            for page in future.result()
+                        ]
+                        start = range_end
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM); finish in-process, fresh pool next time
+                    logger.warning("PDF worker pool broke; processing the remaining pages in-process")
+                    _reset_pdf_pool(pool)
+                finally:
+                    for future in futures:
+                        future.cancel()
+
+            for page_num in range(start, total_pages):
+                yield [self._process_pdf_page(pdf_document, page_num, image_cache)]
+
+    def _shared_pdf_image_xrefs(self, pdf_document, ranges: List[Tuple[int, int]]) -> frozenset:
+        """xrefs of images drawn in more than one page range (listed without decoding)"""
+        first_range: Dict[int, int] = {}
+        shared = set()
+        for range_index, (range_start, range_end) in enumerate(ranges):
+            for page_num in range(range_start, range_end):
+                for entry in self._index_embedded_images_from_pdf(pdf_document[page_num]):
+                    if first_range.setdefault(entry["xref"], range_index) != range_index:
+                        shared.add(entry["xref"])
+        return frozenset(shared)
+
+    def _resolve_deferred_image(
+        self, pdf_document, page: Dict[str, Any], image_cache: Dict[int, Optional[Tuple[str, str]]]
+    ) -> Dict[str, Any]:
+        """Fill in the image of a page a worker left to this process (see _iter_pdf_pages)"""
+        xref = page.pop("image_xref", None)
+        if xref is None:
+            return page
+        if xref not in image_cache:
+            image_cache[xref] = self._extract_pdf_image(pdf_document, xref)
+        if image_cache[xref] is None:
+            # Unusable image: redo the page here, which falls through to the next image or a render
+            return self._process_pdf_page(pdf_document, page["page_number"] - 1, image_cache)
+        page["image_base64"], page["image_mime"] = image_cache[xref]
+        return page
+
+    def _process_pdf_range(
+        self, file_content: bytes, start: int, end: int, deferred_xrefs: frozenset = frozenset()
+    ) -> List[Dict[str, Any]]:
+        """
+        Process pages [start, end) (0-based) of a PDF given as bytes. Pages
+        whose image is one of deferred_xrefs get image_xref instead of an
+        encoded image.
+        """
+        pages = []
+        # Images repeated within the range are encoded once
+        image_cache: Dict[int, Optional[Tuple[str, str]]] = {}
+        with fitz.open(stream=io.BytesIO(file_content), filetype="pdf") as pdf_document:
+            for page_num in range(start, end):
+                pages.append(
+                    self._process_pdf_page(pdf_document, page_num, image_cache, deferred_xrefs)
                 )
+        return pages
+
+    def _process_pdf_page(
+        self,
+        pdf_document,
+        page_num: int,
+        image_cache: Dict[int, Optional[Tuple[str, str]]],
+        deferred_xrefs: frozenset = frozenset(),
+    ) -> Dict[str, Any]:
+        page = pdf_document[page_num]
+
+        # Extract text from page and clean it
+        page_text = page.get_text()
+        cleaned_text = clean_and_format_text(page_text)
+
+        # List embedded images (no decoding) and materialize only the first usable one
+        embedded_images = self._index_embedded_images_from_pdf(page)
+        chosen_image = None
+        deferred_xref = None
+        for entry in embedded_images:
+            xref = entry["xref"]
+            if xref in deferred_xrefs and xref not in image_cache:
+                # Encoded once per document by the parent process
+                deferred_xref = xref
+                break
+            if xref not in image_cache:
+                image_cache[xref] = self._extract_pdf_image(pdf_document, xref)
+            chosen_image = image_cache[xref]
+            if chosen_image is not None:
+                break
+
+        # Use first embedded image if available, otherwise create page render
+        if deferred_xref is not None:
+            image_base64, image_mime = None, None
+        elif chosen_image is not None:
+            image_base64, image_mime = chosen_image
+        else:
+            # Fallback: render page as image if no embedded images
+            mat = fitz.Matrix(2.0, 2.0)
+            pix = page.get_pixmap(matrix=mat)
+            img_data = pix.tobytes("ppm")
+            pil_image = Image.open(io.BytesIO(img_data))
+            if pil_image.mode != "RGB":
+                pil_image = pil_image.convert("RGB")
+            image_base64 = self._image_to_base64(pil_image)
+            image_mime = image_codec.mime_type_of_base64(image_base64)
+
+        # Create page data
+        page_data = {
+            "page_number": page_num + 1,
+            "title": f"Page {page_num + 1}",
+            "text": cleaned_text,
+            "image_base64": image_base64,
+            "image_mime": image_mime,
+            "notes": "",
+            "has_embedded_images": len(embedded_images) > 0,
+            "embedded_images_count": len(embedded_images),
+        }
+        if deferred_xref is not None:
+            page_data["image_xref"] = deferred_xref
+        return page_data
 
-                # Use first embedded image if available, otherwise create page render
-                if embedded_images:
-                    image_base64 = embedded_images[0]  # Use first embedded image
-                else:
-                    # Fallback: render page as image if no embedded images
-                    mat = fitz.Matrix(2.0, 2.0)
-                    pix = page.get_pixmap(matrix=mat)
-                    img_data = pix.tobytes("ppm")
-                    pil_image = Image.open(io.BytesIO(img_data))
-                    if pil_image.mode != "RGB":
-                        pil_image = pil_image.convert("RGB")
-                    image_base64 = self._image_to_base64(pil_image)
-
-                # Create page data
-                page_data = {
-                    "page_number": page_num + 1,
-                    "title": f"Page {page_num + 1}",
-                    "text": cleaned_text,
-                    "image_base64": image_base64,
-                    "notes": "",
-                    "has_embedded_images": len(embedded_images) > 0,
-                    "embedded_images_count": len(embedded_images),
-                }
-
-                pages.append(page_data)
-
-            pdf_document.close()
+    def _process_powerpoint(self, file_content: bytes) -> Dict[str, Any]:
+        """Process PowerPoint file"""
+        if not SPIRE_AVAILABLE:
+            raise ImportError(
+                "Spire.Presentation library is required for PowerPoint processing"
+            )
 
-            return {"file_type": ".pdf", "total_pages": total_pages, "pages": pages}
+        try:
+            total_slides, batches = self.open_document_pages(file_content, ".pptx")
+            pages = [page for batch in batches for page in batch]
+
+            return {"file_type": ".pptx", "total_pages": total_slides, "pages": pages}
 
         except Exception:
             # Create fallback response instead of failing
-            return self._create_fallback_document("pdf")
+            return self._create_fallback_document("pptx")
 
-    def _process_powerpoint(self, file_content: bytes) -> Dict[str, Any]:
-        """Process PowerPoint file"""
+    def _load_presentation(self, file_content: bytes):
+        """Load a presentation from bytes; returns (presentation, temp_file)"""
         if not SPIRE_AVAILABLE:
             raise ImportError(
                 "Spire.Presentation library is required for PowerPoint processing"
             )
 
+        # Save content to a temporary file (unique per upload)
+        fd, temp_file = tempfile.mkstemp(suffix=".pptx", dir=self.temp_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_content)
+
         try:
-            # Save content to temporary file
-            temp_file = os.path.join(self.temp_dir, "temp_presentation.pptx")
-            with open(temp_file, "wb") as f:
-                f.write(file_content)
+            presentation = self._load_presentation_file(temp_file)
+        except Exception:
+            os.remove(temp_file)
+            raise
+        return presentation, temp_file
 
-            # Load presentation using Spire.Presentation
-            presentation = Presentation()
-            presentation.LoadFromFile(temp_file)
+    def _load_presentation_file(self, path: str):
+        """Load a presentation from a file the caller owns"""
+        if not SPIRE_AVAILABLE:
+            raise ImportError(
+                "Spire.Presentation library is required for PowerPoint processing"
+            )
 
-            pages = []
-            total_slides = len(presentation.Slides)
+        # Load presentation using Spire.Presentation
+        presentation = Presentation()
+        presentation.LoadFromFile(path)
+        return presentation
+
+    def _iter_powerpoint_pages(
+        self,
+        presentation,
+        temp_file: Optional[str],
+        start: int = 0,
+        end: Optional[int] = None,
+        dispose: bool = True,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Process slides [start, end) one at a time; disposes the presentation
+        and removes temp_file when done unless dispose is False (the caller
+        keeps the presentation loaded)
+        """
+        try:
+            # Pictures repeated across slides are encoded once per presentation
+            image_cache: Dict[str, Optional[Tuple[str, str]]] = {}
 
             for i, slide in enumerate(presentation.Slides):
+                if i < start:
+                    continue
+                if end is not None and i >= end:
+                    break
                 try:
                     # Extract slide text first (safer operation)
                     slide_text = self._extract_slide_text(slide)
 
-                    # Extract embedded images from slide
-                    embedded_images = self._extract_embedded_images_from_slide(slide)
+                    # List the pictures on the slide; copy and encode only the first usable one
+                    embedded_images = self._index_embedded_images_from_slide(slide)
+                    chosen_image = None
+                    for picture in embedded_images:
+                        image_data = self._read_slide_picture(picture)
+                        if not image_data:
+                            continue
+                        key = hashlib.sha1(image_data).hexdigest()
+                        if key not in image_cache:
+                            image_cache[key] = self._encode_embedded_image(image_data)
+                        chosen_image = image_cache[key]
+                        if chosen_image is not None:
+                            break
 
                     # Use first embedded image if available, otherwise render slide
-                    if embedded_images:
-                        image_base64 = embedded_images[0]  # Use first embedded image
+                    if chosen_image is not None:
+                        image_base64, image_mime = chosen_image
                     else:
                         # Fallback: render slide as image if no embedded images
                         image_base64 = self._save_slide_as_image(slide, i)
+                        image_mime = image_codec.mime_type_of_base64(image_base64)
 
                     # Create slide data
                     slide_data = {
@@ -148,13 +501,12 @@ class DocumentProcessor:
                         "title": f"Slide {i + 1}",
                         "text": slide_text,
                         "image_base64": image_base64,
+                        "image_mime": image_mime,
                         "notes": "",
                         "has_embedded_images": len(embedded_images) > 0,
                         "embedded_images_count": len(embedded_images),
                     }
 
-                    pages.append(slide_data)
-
                 except Exception as e:
                     logger.warning(f"Error processing slide {i}: {str(e)}")
                     # Create fallback slide data with text extraction attempt
@@ -174,27 +526,63 @@ class DocumentProcessor:
                         "image_base64": image_base64,
                         "notes": "",
                     }
-                    pages.append(slide_data)
 
-            # Cleanup
-            presentation.Dispose()
-            try:
-                os.remove(temp_file)
-            except:
-                pass
+                yield [slide_data]
 
-            return {"file_type": ".pptx", "total_pages": total_slides, "pages": pages}
+        finally:
+            # Cleanup
+            if dispose:
+                presentation.Dispose()
+                try:
+                    os.remove(temp_file)
+                except:
+                    pass
 
-        except Exception:
-            # Create fallback response instead of failing
-            return self._create_fallback_document("pptx")
+    def extract_pptx_text(self, file_content: bytes) -> Dict[str, Any]:
+        """
+        Text-only PPTX extraction without Spire: reads the zip and parses
+        only the presentation, slide and notes XML parts. Pages carry text,
+        title and notes but no image; render_slide_image renders one later.
+        Raises on anything that is not a readable PPTX.
+        """
+        with zipfile.ZipFile(io.BytesIO(file_content)) as archive:
+            slide_paths = _pptx_slide_paths(archive)
+            pages = []
+            for index, slide_path in enumerate(slide_paths):
+                title, text = _pptx_slide_text(archive, slide_path)
+                notes_path = _pptx_related_part(archive, slide_path, "/notesSlide")
+                notes = _pptx_notes_text(archive, notes_path) if notes_path else ""
+                pages.append({
+                    "page_number": index + 1,
+                    "title": title or f"Slide {index + 1}",
+                    "text": clean_and_format_text(text),
+                    "notes": notes,
+                    "has_embedded_images": _pptx_related_part(archive, slide_path, "/image") is not None,
+                })
+        return {"file_type": ".pptx", "total_pages": len(pages), "pages": pages}
+
+    def render_slide_image(self, file_content: bytes, page_number: int) -> Optional[str]:
+        """Base64 image of one slide (first embedded picture or a render), as in a full conversion"""
+        start = page_number - 1
+        if settings.ppt_workers > 0:
+            pages = ppt_pool.convert_slides(file_content, start, page_number)
+        else:
+            presentation, temp_file = self._load_presentation(file_content)
+            pages = [
+                page
+                for batch in self._iter_powerpoint_pages(presentation, temp_file, start, page_number)
+                for page in batch
+            ]
+        return pages[0].get("image_base64") if pages else None
 
     def _save_slide_as_image(self, slide, slide_index: int) -> str:
         """Save slide as image with font error handling"""
         temp_image_path = None
         try:
             # Try to save slide as image
-            temp_image_path = os.path.join(self.temp_dir, f"slide_{slide_index}.png")
+            temp_image_path = os.path.join(
+                self.temp_dir, f"slide_{slide_index}_{uuid.uuid4().hex}.png"
+            )
 
             # Try different methods to get slide image
             try:
@@ -351,7 +739,7 @@ class DocumentProcessor:
         return clean_and_format_text(combined_text)
 
     def _image_to_base64(self, image: Image.Image) -> str:
-        """Convert PIL image to base64"""
+        """Convert PIL image to base64 ("slide" codec policy: WebP/JPEG for photos, else PNG)"""
         try:
             # Resize image if too large
             max_size = 4096  # Increased from 1920 for better quality
@@ -359,11 +747,8 @@ class DocumentProcessor:
                 image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
 
             # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG", optimize=True)
-            img_bytes = buffer.getvalue()
-
-            return base64.b64encode(img_bytes).decode("utf-8")
+            image_base64, _ = image_codec.encode_base64(image, "slide")
+            return image_base64
 
         except Exception as e:
             logger.error(f"Error converting image to base64: {str(e)}")
@@ -437,39 +822,35 @@ class DocumentProcessor:
         except Exception:
             pass
 
-    def _extract_embedded_images_from_pdf(self, page, pdf_document) -> List[str]:
-        """Extract actual embedded images from PDF page"""
-        images = []
+    def _index_embedded_images_from_pdf(self, page) -> List[Dict[str, Any]]:
+        """List the distinct images drawn on a PDF page (xref and size) without decoding them"""
+        entries = []
+        seen = set()
         try:
-            image_list = page.get_images()
-
-            for img_index, img in enumerate(image_list):
-                try:
-                    xref = img[0]
-                    base_image = pdf_document.extract_image(xref)
-                    image_bytes = base_image["image"]
-
-                    # Convert to PIL Image
-                    pil_image = Image.open(io.BytesIO(image_bytes))
-                    if pil_image.mode != "RGB":
-                        pil_image = pil_image.convert("RGB")
-
-                    image_base64 = self._image_to_base64(pil_image)
-                    images.append(image_base64)
-
-                except Exception as e:
-                    logger.warning(
-                        f"Failed to extract embedded image {img_index}: {str(e)}"
-                    )
+            for img in page.get_images(full=True):
+                xref = img[0]
+                if xref in seen:
                     continue
-
+                seen.add(xref)
+                entries.append({"xref": xref, "width": img[2], "height": img[3]})
         except Exception as e:
             logger.warning(f"Failed to get embedded images from page: {str(e)}")
+        return entries
 
-        return images
+    def _extract_pdf_image(self, pdf_document, xref: int) -> Optional[Tuple[str, str]]:
+        """Base64 and MIME type of one embedded PDF image; None if it cannot be read"""
+        try:
+            base_image = pdf_document.extract_image(xref)
+            return self._encode_embedded_image(base_image["image"])
+        except Exception as e:
+            logger.warning(f"Failed to extract embedded image {xref}: {str(e)}")
+            return None
 
-    def _extract_embedded_images_from_slide(self, slide) -> List[str]:
-        """Extract actual embedded images from PowerPoint slide"""
+    def _index_embedded_images_from_slide(self, slide) -> List[Any]:
+        """
+        Picture objects of the shapes on a PowerPoint slide, in shape order.
+        Their data is not copied here; see _read_slide_picture.
+        """
         images = []
         try:
             for shape_index in range(slide.Shapes.Count):
@@ -479,16 +860,9 @@ class DocumentProcessor:
                     # Check if shape is an image/picture
                     if hasattr(shape, "ShapeType") and hasattr(shape, "Image"):
                         try:
-                            # Try to access image data
-                            if hasattr(shape.Image, "Data") and shape.Image.Data:
-                                image_data = shape.Image.Data
-                                pil_image = Image.open(io.BytesIO(image_data))
-                                if pil_image.mode != "RGB":
-                                    pil_image = pil_image.convert("RGB")
-
-                                image_base64 = self._image_to_base64(pil_image)
-                                images.append(image_base64)
-
+                            picture = shape.Image
+                            if picture is not None and hasattr(picture, "Data"):
+                                images.append(picture)
                         except Exception as img_error:
                             logger.debug(
                                 f"Could not extract image from shape {shape_index}: {str(img_error)}"
@@ -505,3 +879,37 @@ class DocumentProcessor:
             logger.warning(f"Failed to extract embedded images from slide: {str(e)}")
 
         return images
+
+    def _read_slide_picture(self, picture) -> Optional[bytes]:
+        """Copy of a slide picture's data; None if it is empty or cannot be read"""
+        try:
+            data = picture.Data
+            return bytes(data) if data else None
+        except Exception as e:
+            logger.debug(f"Could not read slide picture data: {str(e)}")
+            return None
+
+    def _encode_embedded_image(self, image_bytes: bytes) -> Optional[Tuple[str, str]]:
+        """
+        Base64 and MIME type for an embedded image. RGB/grayscale JPEGs within
+        the size limit are passed through as-is (only the header is read);
+        anything else is decoded and re-encoded with the "slide" codec policy.
+        """
+        try:
+            pil_image = Image.open(io.BytesIO(image_bytes))
+            max_size = 4096
+            if (
+                pil_image.format == "JPEG"
+                and pil_image.mode in ("RGB", "L")
+                and pil_image.width <= max_size
+                and pil_image.height <= max_size
+            ):
+                return base64.b64encode(image_bytes).decode("utf-8"), "image/jpeg"
+
+            if pil_image.mode != "RGB":
+                pil_image = pil_image.convert("RGB")
+            image_base64 = self._image_to_base64(pil_image)
+            return image_base64, image_codec.mime_type_of_base64(image_base64)
+        except Exception as e:
+            logger.warning(f"Failed to decode embedded image: {str(e)}")
+            return None
@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a pool and its queue are full and no slot frees up in time"""
+
+
+class BoundedPool:
+    """
+    Thread pool with a bounded queue in front of it.
+
+    At most max_workers calls run at once and at most queue_size more wait
+    for a worker; callers beyond that wait up to acquire_timeout seconds for
+    a slot and then get ExecutorSaturatedError.
+    """
+
+    def __init__(
+        self, name: str, max_workers: int, queue_size: int, acquire_timeout: float
+    ):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.capacity = self.max_workers + max(0, queue_size)
+        self.acquire_timeout = acquire_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"{name}-pool"
+        )
+        self._slots = asyncio.Semaphore(self.capacity)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        await self._acquire()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def _acquire(self):
+        if self.acquire_timeout <= 0:
+            if self._slots.locked():
+                self._reject()
+            await self._slots.acquire()
+            return
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+
+    def _reject(self):
+        self.rejected += 1
+        logger.warning(
+            f"{self.name} pool saturated ({self.in_flight}/{self.capacity} in flight)"
+        )
+        raise ExecutorSaturatedError(f"{self.name} pool is saturated")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ExecutorService:
+    """
+    Runs blocking CPU-bound vision work (Tesseract, YOLO, rendering,
+    encoding) off the asyncio event loop. Gemini calls are async-native
+    and go through app.services.gemini_client instead.
+    """
+
+    def __init__(self):
+        self.vision_pool = BoundedPool(
+            "vision",
+            settings.vision_executor_workers,
+            settings.vision_executor_queue_size,
+            settings.executor_queue_timeout,
+        )
+
+    async def run_vision(self, func: Callable, *args, **kwargs) -> Any:
+        """Run blocking CPU-bound image work in the vision pool"""
+        return await self.vision_pool.run(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"vision": self.vision_pool.stats()}
+
+    def shutdown(self):
+        self.vision_pool.shutdown()
+
+
+executor_service = ExecutorService()
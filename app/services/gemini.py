@@ -1,22 +1,57 @@
 from app.config import get_settings
+from app.services.executor import executor_service
+from app.services.gemini_cache import gemini_cache
+from app.services.gemini_client import gemini_client
+from app.services.image_codec import image_codec
 import google.generativeai as genai
 from PIL import Image
-import base64
-import io
+import asyncio
 import json
 import re
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional, Tuple, Union
 
 settings = get_settings()
-genai.configure(api_key=settings.google_ai_api_key)
 
 logger = logging.getLogger(__name__)
 
 
+# Streaming: a sentence ends at . ! ? ؟ followed by whitespace, or at a line break
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s+|\s*\n\s*")
+
+# Finish reasons of a complete answer, as accepted (and cached) by the
+# non-stream methods; get_quick_form_explanation also accepts MAX_TOKENS
+_COMPLETE_FINISH_REASONS = ("STOP", "4")
+
+_PERMISSIVE_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+
+async def _sentence_chunks(text_stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Regroup streamed text into sentences; an unfinished sentence is held until it ends"""
+    buffer = ""
+    async for text in text_stream:
+        buffer += text
+        *sentences, buffer = _SENTENCE_END.split(buffer)
+        for sentence in sentences:
+            if sentence.strip():
+                yield sentence
+    if buffer.strip():
+        yield buffer
+
+
+def _image_to_png_base64(image: Image.Image) -> str:
+    # Form images sent to Gemini: lossless "form" codec policy
+    return image_codec.encode(image, "form").to_base64()
+
+
 class GeminiService:
     def __init__(self):
-        self.model = genai.GenerativeModel(settings.gemini_model)
+        self.model = gemini_client.get_model(settings.gemini_model)
 
     def remove_markdown_formatting(self, text: str) -> str:
         """Remove Markdown formatting from text"""
@@ -60,15 +95,13 @@ class GeminiService:
 
         return text
 
-    def detect_language_and_quality(self, image: Image.Image) -> Tuple[str, bool, str]:
+    async def detect_language_and_quality(self, image: Image.Image) -> Tuple[str, bool, str]:
         """
         Detects language direction and checks image quality
         Returns (language_direction, is_good_quality, quality_message)
         """
         try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+            img_str = await executor_service.run_vision(_image_to_png_base64, image)
 
             prompt = """
 Analyze the uploaded image and respond ONLY in this JSON format:
@@ -109,15 +142,26 @@ IMPORTANT: Default to quality_good=true unless image is completely unusable. Be
                 },
             ]
 
-            response = self.model.generate_content(
+            generation_config = genai.GenerationConfig(
+                temperature=0,
+                candidate_count=1,
+                top_k=1,
+                top_p=0.1,
+                max_output_tokens=5000,
+            )
+
+            cache_key = gemini_cache.make_key(
+                "detect_language_and_quality", settings.gemini_model, prompt, generation_config, img_str
+            )
+            cached = await gemini_cache.get(cache_key)
+            if cached is not None:
+                return tuple(cached)
+
+            response = await gemini_client.generate(
+                settings.gemini_model,
                 [prompt, image_part],
-                generation_config=genai.GenerationConfig(
-                    temperature=0,
-                    candidate_count=1,
-                    top_k=1,
-                    top_p=0.1,
-                    max_output_tokens=5000,
-                ),
+                call="detect_language_and_quality",
+                generation_config=generation_config,
                 safety_settings=safety_settings,
                 stream=False,
             )
@@ -182,6 +226,7 @@ IMPORTANT: Default to quality_good=true unless image is completely unusable. Be
                     "quality_message", "Image quality check completed"
                 )
 
+                await gemini_cache.set(cache_key, [language_direction, quality_good, quality_message])
                 return language_direction, quality_good, quality_message
             except json.JSONDecodeError:
                 return "ltr", True, "Error analyzing image"
@@ -189,15 +234,13 @@ IMPORTANT: Default to quality_good=true unless image is completely unusable. Be
         except (json.JSONDecodeError, Exception):
             return "ltr", True, "Error analyzing image"
 
-    def get_form_details(self, image: Image.Image, language: str):
+    async def get_form_details(self, image: Image.Image, language: str):
         """
         Makes a single call to Gemini to get both the field labels and a general
         explanation of the form.
         """
         try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+            img_str = await executor_service.run_vision(_image_to_png_base64, image)
             lang_name = "Arabic" if language == "rtl" else "English"
 
             # --- Language-Specific Prompts ---
@@ -224,8 +267,10 @@ IMPORTANT: Default to quality_good=true unless image is completely unusable. Be
                 },
             ]
 
-            response = self.model.generate_content(
+            response = await gemini_client.generate(
+                settings.gemini_model,
                 [prompt, image_part],
+                call="get_form_details",
                 generation_config=genai.GenerationConfig(
                     temperature=0,
                     candidate_count=1,
@@ -346,14 +391,12 @@ IMPORTANT: Default to quality_good=true unless image is completely unusable. Be
             )
             return explanation, []
 
-    def get_form_fields_only(self, image: Image.Image, language: str):
+    async def get_form_fields_only(self, image: Image.Image, language: str):
         """
         Get only the form fields without explanation (for when we already have explanation from check-image)
         """
         try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+            img_str = await executor_service.run_vision(_image_to_png_base64, image)
             lang_name = "Arabic" if language == "rtl" else "English"
 
             # --- Language-Specific Prompts (fields only) ---
@@ -459,8 +502,17 @@ Constraints:
                 },
             ]
 
-            response = self.model.generate_content(
+            cache_key = gemini_cache.make_key(
+                "get_form_fields_only", settings.gemini_model, prompt, img_str
+            )
+            cached = await gemini_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await gemini_client.generate(
+                settings.gemini_model,
                 [prompt, image_part],
+                call="get_form_fields_only",
                 safety_settings=safety_settings,
             )
             try:
@@ -515,6 +567,8 @@ Constraints:
                     return []
 
                 if isinstance(fields, list):
+                    if fields:
+                        await gemini_cache.set(cache_key, fields)
                     return fields
 
                 return []
@@ -527,18 +581,11 @@ Constraints:
             traceback.print_exc()
             return []
 
-    def get_quick_form_explanation(self, image: Image.Image, language: str) -> str:
-        """
-        Get a quick form explanation without field detection (lightweight operation)
-        Used in check-image endpoint for faster response
-        """
-        try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-            if language == "rtl":
-                prompt = """
+    @staticmethod
+    def _quick_form_explanation_prompt(language: str) -> str:
+        """Instruction prompt for get_quick_form_explanation (text of the form, as-is)"""
+        if language == "rtl":
+            prompt = """
 استخرج النص المكتوب داخل صورة النموذج وأعده كما هو تماماً.
 
 قواعد صارمة للإخراج:
@@ -551,8 +598,8 @@ Constraints:
 
 أعد النص الآن كما هو من الصورة:
 """
-            else:
-                prompt = """
+        else:
+            prompt = """
 Extract the text written inside the form image and return it exactly as it appears.
 
 Strict output rules:
@@ -565,6 +612,17 @@ Strict output rules:
 
 Now return the text from the image exactly as-is:
 """
+        return prompt
+
+    async def get_quick_form_explanation(self, image: Image.Image, language: str) -> str:
+        """
+        Get a quick form explanation without field detection (lightweight operation)
+        Used in check-image endpoint for faster response
+        """
+        try:
+            img_str = await executor_service.run_vision(_image_to_png_base64, image)
+
+            prompt = self._quick_form_explanation_prompt(language)
 
             image_part = {"mime_type": "image/png", "data": img_str}
 
@@ -582,11 +640,22 @@ Now return the text from the image exactly as-is:
                 },
             ]
 
-            response = self.model.generate_content(
+            generation_config = genai.GenerationConfig(
+                temperature=0.2, candidate_count=1, max_output_tokens=25000
+            )
+
+            cache_key = gemini_cache.make_key(
+                "get_quick_form_explanation", settings.gemini_model, prompt, generation_config, img_str
+            )
+            cached = await gemini_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await gemini_client.generate(
+                settings.gemini_model,
                 [prompt, image_part],
-                generation_config=genai.GenerationConfig(
-                    temperature=0.2, candidate_count=1, max_output_tokens=25000
-                ),
+                call="get_quick_form_explanation",
+                generation_config=generation_config,
                 safety_settings=safety_settings,
                 stream=False,
             )
@@ -642,6 +711,7 @@ Now return the text from the image exactly as-is:
 
                 explanation = response_text.strip()
                 logger.info(f"Form text extracted: {explanation[:100]}...")
+                await gemini_cache.set(cache_key, explanation)
                 return explanation
 
             except Exception:
@@ -672,11 +742,43 @@ Now return the text from the image exactly as-is:
                 else "Quick summary: This looks like a form. We'll guide you to detect and fill fields when you start analysis."
             )
 
+    async def stream_quick_form_explanation(
+        self, image: Image.Image, language: str
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """
+        get_quick_form_explanation as a stream: yields (sentence, False) as
+        Gemini produces the text, then (full_text, True). Shares its cache entry.
+        """
+        img_str = await executor_service.run_vision(_image_to_png_base64, image)
+        prompt = self._quick_form_explanation_prompt(language)
+        generation_config = genai.GenerationConfig(
+            temperature=0.2, candidate_count=1, max_output_tokens=25000
+        )
+        cache_key = gemini_cache.make_key(
+            "get_quick_form_explanation", settings.gemini_model, prompt, generation_config, img_str
+        )
+        fallback = (
+            "ملخص سريع: هذه استمارة. يمكنك المتابعة للتحليل لاستخراج الحقول."
+            if language == "rtl"
+            else "Quick summary: This is a form. You can proceed to analysis to extract fields."
+        )
+        async for item in self._stream_sentences(
+            "get_quick_form_explanation",
+            cache_key,
+            [prompt, {"mime_type": "image/png", "data": img_str}],
+            str.strip,
+            fallback,
+            complete_finish_reasons=_COMPLETE_FINISH_REASONS + ("MAX_TOKENS",),
+            generation_config=generation_config,
+            safety_settings=_PERMISSIVE_SAFETY_SETTINGS,
+        ):
+            yield item
+
     # =============================================================================
     # PPT & PDF READER METHODS
     # =============================================================================
 
-    def analyze_document_bulk(
+    async def analyze_document_bulk(
         self, document_data: Dict[str, Any], language: str = "arabic"
     ) -> Dict[str, Any]:
         """
@@ -715,8 +817,11 @@ Now return the text from the image exactly as-is:
             ]
 
             # Get AI analysis
-            response = self.model.generate_content(
-                prompt, safety_settings=safety_settings
+            response = await gemini_client.generate(
+                settings.gemini_model,
+                prompt,
+                call="analyze_document_bulk",
+                safety_settings=safety_settings,
             )
 
             # Check response and handle errors
@@ -839,21 +944,12 @@ Now return the text from the image exactly as-is:
 
         return None
 
-    def analyze_page_image(
-        self, image_base64: str, language: str = "arabic", page_text: str = ""
-    ) -> str:
-        """تحليل صورة الصفحة باستخدام الذكاء الاصطناعي مع السياق النصي"""
-        try:
-            if not self.model:
-                return (
-                    "خدمة تحليل الصور غير متوفرة حالياً"
-                    if language == "arabic"
-                    else "Image analysis service is currently unavailable"
-                )
-
-            if language == "arabic":
-                if page_text and page_text.strip():
-                    prompt = f"""لديك النص التالي المستخرج من هذه الصفحة:
+    @staticmethod
+    def _page_image_prompt(language: str, page_text: str) -> str:
+        """Instruction prompt for the analysis of one page image"""
+        if language == "arabic":
+            if page_text and page_text.strip():
+                prompt = f"""لديك النص التالي المستخرج من هذه الصفحة:
 "{page_text}"
 
 الآن حلل الصورة في سياق هذا النص واشرح المحتوى المرئي مباشرة باللغة العربية:
@@ -863,16 +959,16 @@ Now return the text from the image exactly as-is:
 - إذا كانت معقدة: حتى 8 جمل مع التفاصيل المهمة
 - ركز على الربط بين النص والعناصر المرئية
 - ابدأ الرد مباشرة بالتحليل بدون مقدمات"""
-                else:
-                    prompt = """اشرح محتوى هذه الصورة مباشرة باللغة العربية بدون مقدمات.
+            else:
+                prompt = """اشرح محتوى هذه الصورة مباشرة باللغة العربية بدون مقدمات.
 - إذا كانت الصورة بسيطة: 3 جمل تكفي
 - إذا كانت معقدة ومليئة بالتفاصيل: حتى 8 جمل
 - ركز على المحتوى الأساسي والعناصر المهمة
 - اذكر أي تفاصيل تقنية أو تعليمية أو مخططات أو مفاهيم مهمة
 - ابدأ الرد مباشرة بالمحتوى، لا تقل "سأقوم بتحليل" أو "بالتأكيد" أو أي مقدمات"""
-            else:
-                if page_text and page_text.strip():
-                    prompt = f"""Here is the extracted text from this page:
+        else:
+            if page_text and page_text.strip():
+                prompt = f"""Here is the extracted text from this page:
 "{page_text}"
 
 Now analyze the image in the context of this text and explain the visual content directly in English:
@@ -882,16 +978,38 @@ Now analyze the image in the context of this text and explain the visual content
 - If it's complex: up to 8 sentences with important details
 - Focus on linking the text with visual elements
 - Start the response directly with the analysis without introductions"""
-                else:
-                    prompt = """Explain the content of this image directly in English without introductions.
+            else:
+                prompt = """Explain the content of this image directly in English without introductions.
 - If the image is simple: 3 sentences are enough
 - If it's complex with many details: up to 8 sentences
 - Focus on the main content and important elements
 - Mention any technical, educational details, graphs or important concepts
 - Start the response directly with the content, don't say "I will analyze" or "Certainly" or any introductions"""
+        return prompt
+
+    async def analyze_page_image(
+        self,
+        image_data: Union[bytes, str],
+        language: str = "arabic",
+        page_text: str = "",
+        mime_type: str = "image/png",
+    ) -> str:
+        """
+        تحليل صورة الصفحة باستخدام الذكاء الاصطناعي مع السياق النصي
+        image_data: بايتات الصورة المخزنة كما هي (أو base64)
+        """
+        try:
+            if not self.model:
+                return (
+                    "خدمة تحليل الصور غير متوفرة حالياً"
+                    if language == "arabic"
+                    else "Image analysis service is currently unavailable"
+                )
 
-            # تحويل base64 إلى image part
-            image_part = {"mime_type": "image/png", "data": image_base64}
+            prompt = self._page_image_prompt(language, page_text)
+
+            # الصورة تُرسل كما خُزنت (PNG/JPEG) بدون إعادة ترميز
+            image_part = {"mime_type": mime_type, "data": image_data}
 
             # Add safety settings to reduce blocking
             safety_settings = [
@@ -907,8 +1025,18 @@ Now analyze the image in the context of this text and explain the visual content
                 },
             ]
 
-            response = self.model.generate_content(
-                [prompt, image_part], safety_settings=safety_settings
+            cache_key = gemini_cache.make_key(
+                "analyze_page_image", settings.gemini_model, prompt, mime_type, image_data
+            )
+            cached = await gemini_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await gemini_client.generate(
+                settings.gemini_model,
+                [prompt, image_part],
+                call="analyze_page_image",
+                safety_settings=safety_settings,
             )
 
             # Check response and handle errors
@@ -962,6 +1090,7 @@ Now analyze the image in the context of this text and explain the visual content
 
                 # إزالة تنسيقات Markdown من الرد
                 clean_response = self.remove_markdown_formatting(response_text)
+                await gemini_cache.set(cache_key, clean_response)
                 return clean_response
 
             except Exception:
@@ -980,6 +1109,105 @@ Now analyze the image in the context of this text and explain the visual content
                 else "Error occurred while analyzing the image"
             )
 
+    async def stream_page_image_analysis(
+        self,
+        image_data: Union[bytes, str],
+        language: str = "arabic",
+        page_text: str = "",
+        mime_type: str = "image/png",
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """
+        analyze_page_image as a stream: yields (sentence, False) as Gemini
+        produces the text, then (full_text, True). Shares its cache entry.
+        """
+        if not self.model:
+            unavailable = (
+                "خدمة تحليل الصور غير متوفرة حالياً"
+                if language == "arabic"
+                else "Image analysis service is currently unavailable"
+            )
+            yield unavailable, False
+            yield unavailable, True
+            return
+
+        prompt = self._page_image_prompt(language, page_text)
+        cache_key = gemini_cache.make_key(
+            "analyze_page_image", settings.gemini_model, prompt, mime_type, image_data
+        )
+        fallback = (
+            "لم نتمكن من تحليل صورة الصفحة"
+            if language == "arabic"
+            else "Unable to analyze page image"
+        )
+        async for item in self._stream_sentences(
+            "analyze_page_image",
+            cache_key,
+            [prompt, {"mime_type": mime_type, "data": image_data}],
+            self.remove_markdown_formatting,
+            fallback,
+            safety_settings=_PERMISSIVE_SAFETY_SETTINGS,
+        ):
+            yield item
+
+    async def _stream_sentences(
+        self,
+        call: str,
+        cache_key: str,
+        contents: List[Any],
+        finalize: Callable[[str], str],
+        fallback: str,
+        complete_finish_reasons: Tuple[str, ...] = _COMPLETE_FINISH_REASONS,
+        **kwargs,
+    ) -> AsyncIterator[Tuple[str, bool]]:
+        """
+        Stream a Gemini response as (sentence, False) items with Markdown
+        removed, then (finalize(full_text), True). A cached result is
+        replayed as one sentence; the result is written to the cache only
+        when the stream finished with one of complete_finish_reasons, the
+        same rule the non-stream method applies before caching.
+        """
+        cached = await gemini_cache.get(cache_key)
+        if cached is not None:
+            yield cached, False
+            yield cached, True
+            return
+
+        raw_parts: List[str] = []
+        stream = gemini_client.generate_stream(settings.gemini_model, contents, call=call, **kwargs)
+
+        async def collect() -> AsyncIterator[str]:
+            async for text in stream:
+                raw_parts.append(text)
+                yield text
+
+        sent = False
+        try:
+            async for sentence in _sentence_chunks(collect()):
+                chunk = self.remove_markdown_formatting(sentence)
+                if chunk:
+                    sent = True
+                    yield chunk, False
+        except Exception as e:
+            logger.error(f"Error streaming Gemini response: {e}")
+            if not sent:
+                yield fallback, False
+            yield (finalize("".join(raw_parts)) if sent else fallback), True
+            return
+
+        final_text = finalize("".join(raw_parts))
+        if final_text and stream.finish_reason in complete_finish_reasons:
+            await gemini_cache.set(cache_key, final_text)
+        elif final_text:
+            # Cut off (SAFETY, RECITATION, MAX_TOKENS, ...): served as is, never cached
+            logger.warning(
+                f"Gemini stream for {call} ended with {stream.finish_reason or 'no finish reason'}; not cached"
+            )
+        else:
+            # Blocked or empty response
+            final_text = fallback
+            yield final_text, False
+        yield final_text, True
+
     def has_actual_image_content(self, image_base64: str) -> bool:
         """
         Public method to check if the base64 string contains actual image content
@@ -1115,58 +1343,62 @@ Now analyze the image in the context of this text and explain the visual content
             logger.warning(f"Error validating image content: {str(e)}")
             return False
 
-    def analyze_all_page_images(
+    async def analyze_all_page_images(
         self, document_data: Dict[str, Any], language: str = "arabic"
     ) -> Dict[str, Any]:
-        """تحليل جميع صور الصفحات وحفظ النتائج في ملف JSON"""
+        """
+        تحليل جميع صور الصفحات وحفظ النتائج في ملف JSON
+
+        Pages with image content are packed into batched requests (up to
+        gemini_batch_pages images and gemini_batch_max_bytes of payload each)
+        that return one analysis per page as JSON; batches run concurrently.
+        Pages missing from a batch's parsed result are analyzed one by one.
+        """
         try:
             if not self.model:
                 return {"error": "Image analysis service is currently unavailable"}
 
-            image_analyses = []
-            total_pages = len(document_data.get("pages", []))
+            pages = document_data.get("pages", [])
+            total_pages = len(pages)
 
-            for page_index, page_data in enumerate(document_data.get("pages", [])):
-                page_number = page_index + 1
-                image_base64 = page_data.get("image_base64", "")
-
-                # Check if there's actual image content before running analysis
-                if image_base64 and self._has_actual_image_content(image_base64):
-                    try:
-                        # Get page text for context
-                        page_text = page_data.get("text", "")
-                        # Analyze each page image only if it contains real content
-                        image_analysis = self.analyze_page_image(
-                            image_base64, language, page_text
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Error analyzing image for page {page_number}: {str(e)}"
-                        )
-                        image_analysis = (
-                            f"فشل في تحليل صورة الصفحة {page_number}"
-                            if language == "arabic"
-                            else f"Failed to analyze image for page {page_number}"
-                        )
+            # Check which pages have actual image content before running analysis
+            async def has_content(image_base64: str) -> bool:
+                return bool(image_base64) and await executor_service.run_vision(
+                    self._has_actual_image_content, image_base64
+                )
+
+            content_flags = await asyncio.gather(*[
+                has_content(page_data.get("image_base64", "")) for page_data in pages
+            ])
+            pending = []
+            for page_index, page_data in enumerate(pages):
+                if content_flags[page_index]:
+                    pending.append({
+                        "page_number": page_index + 1,
+                        "text": page_data.get("text", ""),
+                        "image_base64": page_data["image_base64"],
+                        "mime_type": page_data.get("image_mime", "image/png"),
+                    })
                 else:
                     # No actual image content available - return empty string
-                    image_analysis = ""
                     logger.info(
-                        f"Page {page_number}: No actual image content detected, skipping analysis"
+                        f"Page {page_index + 1}: No actual image content detected, skipping analysis"
                     )
 
-                page_analysis = {
+            results = await self._analyze_page_images_batched(pending, language)
+
+            image_analyses = []
+            for page_index, page_data in enumerate(pages):
+                page_number = page_index + 1
+                image_analyses.append({
                     "page_number": page_number,
                     "title": page_data.get("title", f"Page {page_number}"),
                     "original_text": page_data.get("text", ""),
-                    "image_analysis": image_analysis,
+                    "image_analysis": results.get(page_number, ""),
                     "processed_at": None,  # Will be set when saving to file
-                }
-
-                image_analyses.append(page_analysis)
+                })
 
-                # Log progress
-                logger.info(f"Analyzed image for page {page_number}/{total_pages}")
+            logger.info(f"Analyzed images for {len(pending)}/{total_pages} pages")
 
             return {
                 "total_pages": total_pages,
@@ -1182,6 +1414,156 @@ Now analyze the image in the context of this text and explain the visual content
                 "status": "failed",
             }
 
+    async def _analyze_page_images_batched(
+        self, pages: List[Dict[str, Any]], language: str
+    ) -> Dict[int, str]:
+        """Analysis text per page_number for pages (dicts with page_number, text, image_base64, mime_type)"""
+        results: Dict[int, str] = {}
+
+        # Per-page cache keys, independent of how pages are grouped into batches
+        uncached = []
+        for page in pages:
+            page["cache_key"] = gemini_cache.make_key(
+                "analyze_page_images_batch", settings.gemini_model, language,
+                page["text"], page["mime_type"], page["image_base64"],
+            )
+            cached = await gemini_cache.get(page["cache_key"])
+            if cached is not None:
+                results[page["page_number"]] = cached
+            else:
+                uncached.append(page)
+
+        batches = self._split_page_batches(uncached)
+        semaphore = asyncio.Semaphore(max(1, settings.gemini_batch_concurrency))
+
+        async def run_batch(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            """Analyze one batch; returns the pages that still need a per-page call"""
+            if len(batch) == 1:
+                return batch
+            async with semaphore:
+                try:
+                    parsed = await self._analyze_page_image_batch(batch, language)
+                except Exception as e:
+                    logger.warning(f"Batched page analysis failed, using per-page calls: {e}")
+                    return batch
+            missing = []
+            for page in batch:
+                analysis = parsed.get(page["page_number"])
+                if analysis:
+                    results[page["page_number"]] = analysis
+                    await gemini_cache.set(page["cache_key"], analysis)
+                else:
+                    missing.append(page)
+            return missing
+
+        async def run_single(page: Dict[str, Any]):
+            async with semaphore:
+                try:
+                    results[page["page_number"]] = await self.analyze_page_image(
+                        page["image_base64"], language, page["text"], mime_type=page["mime_type"]
+                    )
+                except Exception as e:
+                    logger.error(f"Error analyzing image for page {page['page_number']}: {str(e)}")
+                    results[page["page_number"]] = (
+                        f"فشل في تحليل صورة الصفحة {page['page_number']}"
+                        if language == "arabic"
+                        else f"Failed to analyze image for page {page['page_number']}"
+                    )
+
+        leftovers = await asyncio.gather(*[run_batch(batch) for batch in batches])
+        fallback_pages = [page for missing in leftovers for page in missing]
+        if fallback_pages:
+            logger.info(f"Analyzing {len(fallback_pages)} pages with per-page requests")
+            await asyncio.gather(*[run_single(page) for page in fallback_pages])
+        return results
+
+    @staticmethod
+    def _split_page_batches(pages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group pages in order, within gemini_batch_pages pages and gemini_batch_max_bytes each"""
+        max_pages = max(1, settings.gemini_batch_pages)
+        batches: List[List[Dict[str, Any]]] = []
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for page in pages:
+            # Decoded image size plus the page text
+            page_bytes = len(page["image_base64"]) * 3 // 4 + len(page["text"].encode("utf-8"))
+            if batch and (
+                len(batch) >= max_pages or batch_bytes + page_bytes > settings.gemini_batch_max_bytes
+            ):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(page)
+            batch_bytes += page_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _analyze_page_image_batch(
+        self, batch: List[Dict[str, Any]], language: str
+    ) -> Dict[int, str]:
+        """One request for several page images; analysis per page_number parsed from its JSON"""
+        page_numbers = [page["page_number"] for page in batch]
+        if language == "arabic":
+            prompt = f"""ستتلقى صور {len(batch)} صفحات من مستند، كل صورة مسبوقة برقم صفحتها والنص المستخرج منها.
+لكل صفحة، اشرح محتوى صورتها مباشرة باللغة العربية:
+- اربط العناصر المرئية (مخططات، صور، رسوم بيانية) بنص الصفحة إن وُجد
+- إذا كانت الصورة بسيطة: 3-4 جمل تكفي
+- إذا كانت معقدة: حتى 8 جمل مع التفاصيل المهمة
+- ابدأ كل تحليل مباشرة بالمحتوى بدون مقدمات ولا تنسيق Markdown
+
+أعد JSON فقط بالشكل التالي، بعنصر واحد لكل صفحة من الصفحات {page_numbers}:
+{{"pages": [{{"page_number": رقم_الصفحة, "image_analysis": "التحليل"}}]}}"""
+        else:
+            prompt = f"""You will receive the images of {len(batch)} document pages, each preceded by its page number and extracted text.
+For each page, explain the content of its image directly in English:
+- Connect visual elements (charts, images, diagrams) with the page text when there is any
+- If the image is simple: 3-4 sentences are enough
+- If it's complex: up to 8 sentences with important details
+- Start each analysis directly with the content, without introductions or Markdown formatting
+
+Return JSON only, in this shape, with one entry for each of the pages {page_numbers}:
+{{"pages": [{{"page_number": <page number>, "image_analysis": "<analysis>"}}]}}"""
+
+        contents: List[Any] = [prompt]
+        for page in batch:
+            label = "الصفحة" if language == "arabic" else "Page"
+            text = page["text"].strip()
+            contents.append(f"--- {label} {page['page_number']} ---\n{text}" if text else f"--- {label} {page['page_number']} ---")
+            contents.append({"mime_type": page["mime_type"], "data": page["image_base64"]})
+
+        response = await gemini_client.generate(
+            settings.gemini_model,
+            contents,
+            call="analyze_page_images_batch",
+            generation_config=genai.GenerationConfig(
+                temperature=0, candidate_count=1, response_mime_type="application/json"
+            ),
+            safety_settings=_PERMISSIVE_SAFETY_SETTINGS,
+        )
+        return self._parse_page_batch_response(getattr(response, "text", ""), page_numbers)
+
+    def _parse_page_batch_response(self, response_text: str, page_numbers: List[int]) -> Dict[int, str]:
+        """{page_number: analysis} for the expected pages found in a batch response"""
+        clean_text = (response_text or "").strip().replace("```json", "").replace("```", "").strip()
+        try:
+            parsed = json.loads(clean_text)
+        except json.JSONDecodeError:
+            logger.warning("Failed to parse batched page analysis JSON")
+            return {}
+        entries = parsed.get("pages", []) if isinstance(parsed, dict) else parsed
+        results: Dict[int, str] = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                page_number = int(entry.get("page_number"))
+            except (TypeError, ValueError):
+                continue
+            analysis = entry.get("image_analysis")
+            if page_number in page_numbers and isinstance(analysis, str) and analysis.strip():
+                results[page_number] = self.remove_markdown_formatting(analysis.strip())
+        return results
+
     # NOTE: The per-page question analysis endpoint was removed; corresponding method
     # analyze_page_with_question has been deleted to keep the service minimal.
 
@@ -1433,16 +1815,14 @@ Respond with valid JSON only, without any additional text, warnings, or disclaim
                 ],
             }
 
-    def check_image_quality(
+    async def check_image_quality(
         self, image: Image.Image, language: str = "ar"
     ) -> Tuple[bool, str]:
         """
         يتحقق من جودة الصورة باستخدام Gemini
         """
         try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+            img_str = await executor_service.run_vision(_image_to_png_base64, image)
 
             if language == "ar":
                 prompt = """
@@ -1478,8 +1858,10 @@ Set quality_good=true in most cases.
 """
 
             image_part = {"mime_type": "image/png", "data": img_str}
-            response = self.model.generate_content(
+            response = await gemini_client.generate(
+                settings.gemini_model,
                 [prompt, image_part],
+                call="check_image_quality",
                 generation_config=genai.GenerationConfig(
                     temperature=0, candidate_count=1, max_output_tokens=500
                 ),
@@ -1503,7 +1885,7 @@ Set quality_good=true in most cases.
             )
             return True, fallback_msg
 
-    def check_image_quality_with_language(
+    async def check_image_quality_with_language(
         self, image: Image.Image, language_direction: str
     ) -> Tuple[bool, str]:
         """
@@ -1511,9 +1893,7 @@ Set quality_good=true in most cases.
         Returns (quality_good, quality_message)
         """
         try:
-            buffered = io.BytesIO()
-            image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+            img_str = await executor_service.run_vision(_image_to_png_base64, image)
 
             # Set language for response
             if language_direction == "rtl":
@@ -1585,8 +1965,10 @@ IMPORTANT: Set quality_good=true unless image is completely unusable. Be very fo
                 },
             ]
 
-            response = self.model.generate_content(
+            response = await gemini_client.generate(
+                settings.gemini_model,
                 [prompt, image_part],
+                call="check_image_quality_with_language",
                 generation_config=genai.GenerationConfig(
                     temperature=0,
                     candidate_count=1,
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps of expired disk entries; a sweep also resyncs the
+# disk size counter with entries written by other worker processes
+DISK_SWEEP_SECONDS = 600
+
+
+class GeminiCache:
+    """
+    Content-addressed cache for Gemini results.
+
+    Keys are sha256 digests of everything that determines a response
+    (method, model, prompt, generation config, image bytes). Values must be
+    JSON-serializable. Entries live in an in-memory LRU bounded by count and
+    bytes, and optionally in a SQLite file shared across restarts and
+    workers. Both tiers expire entries after ttl_seconds. Disk reads and
+    writes run in a thread so SQLite never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: int = 86400,
+        disk_path: str = "",
+        disk_max_bytes: int = 512 * 1024 * 1024,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_bytes = disk_max_bytes
+        # key -> (expires_at, size, serialized value)
+        self._memory: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_lock = Lock()
+        self._disk_bytes = 0
+        self._swept_at = 0.0
+        if enabled and disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path: str):
+        try:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS gemini_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS gemini_cache_accessed ON gemini_cache (accessed_at)"
+            )
+            self._db.commit()
+            self._disk_bytes = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM gemini_cache"
+            ).fetchone()[0]
+            self._swept_at = time.time()
+        except sqlite3.Error as e:
+            logger.warning(f"Gemini disk cache disabled ({disk_path}): {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Digest of the given parts; bytes and str are hashed as content, others by repr"""
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, bytes):
+                data = part
+            elif isinstance(part, str):
+                data = part.encode("utf-8")
+            else:
+                data = repr(part).encode("utf-8")
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[2])
+                self._drop(key)
+
+        serialized = None
+        if self._db is not None:
+            serialized = await asyncio.to_thread(self._disk_get, key, now)
+        with self._lock:
+            if serialized is None:
+                self.misses += 1
+                return None
+            self._remember(key, serialized, now + self.ttl_seconds)
+            self.hits += 1
+        return json.loads(serialized)
+
+    async def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        try:
+            serialized = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Value not cacheable: {e}")
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, serialized, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, serialized, expires_at)
+
+    def _remember(self, key: str, serialized: str, expires_at: float):
+        size = len(serialized.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self._memory[key] = (expires_at, size, serialized)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._drop(oldest)
+
+    def _drop(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        try:
+            with self._disk_lock:
+                row = self._db.execute(
+                    "SELECT value FROM gemini_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._db.execute(
+                    "UPDATE gemini_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._db.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Gemini disk cache read failed: {e}")
+            return None
+
+    def _disk_set(self, key: str, serialized: str, expires_at: float):
+        now = time.time()
+        size = len(serialized.encode("utf-8"))
+        try:
+            with self._disk_lock:
+                replaced = self._db.execute(
+                    "SELECT size FROM gemini_cache WHERE key = ?", (key,)
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO gemini_cache (key, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, serialized, size, expires_at, now),
+                )
+                self._disk_bytes += size - (replaced[0] if replaced else 0)
+                if now - self._swept_at >= DISK_SWEEP_SECONDS:
+                    self._disk_sweep(now)
+                while self._disk_bytes > self.disk_max_bytes:
+                    row = self._db.execute(
+                        "SELECT key, size FROM gemini_cache ORDER BY accessed_at LIMIT 1"
+                    ).fetchone()
+                    if row is None:
+                        self._disk_bytes = 0
+                        break
+                    self._db.execute("DELETE FROM gemini_cache WHERE key = ?", (row[0],))
+                    self._disk_bytes -= row[1]
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Gemini disk cache write failed: {e}")
+
+    def _disk_sweep(self, now: float):
+        """Delete expired entries and recount the disk size"""
+        self._db.execute("DELETE FROM gemini_cache WHERE expires_at <= ?", (now,))
+        self._disk_bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM gemini_cache"
+        ).fetchone()[0]
+        self._swept_at = now
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk": self._db is not None,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+gemini_cache = GeminiCache(
+    max_entries=settings.gemini_cache_max_entries,
+    max_bytes=settings.gemini_cache_max_bytes,
+    ttl_seconds=settings.gemini_cache_ttl_seconds,
+    disk_path=settings.gemini_cache_path,
+    disk_max_bytes=settings.gemini_cache_disk_max_bytes,
+    enabled=settings.gemini_cache_enabled,
+)
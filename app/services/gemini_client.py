@@ -0,0 +1,470 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from app.config import get_settings
+from app.services.gemini_metrics import gemini_metrics, request_image_bytes, response_usage
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Configured once for the whole process; the SDK then reuses one async
+# transport (and its HTTP/2 connection) for every model created below.
+genai.configure(api_key=settings.google_ai_api_key)
+
+# Errors worth retrying (and counted against the circuit breaker): quota
+# exhaustion, any 5xx, and calls that ran past their deadline
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServerError,
+    asyncio.TimeoutError,
+)
+
+# Deadline in seconds per call name (the GeminiService/SpeechService method);
+# gemini_call_deadlines overrides entries, others use gemini_deadline_seconds
+CALL_DEADLINES = {
+    "detect_language_and_quality": 20.0,
+    "check_image_quality": 20.0,
+    "check_image_quality_with_language": 20.0,
+    "get_quick_form_explanation": 45.0,
+    "analyze_page_image": 45.0,
+    "speech_to_text": 30.0,
+    "get_form_details": 120.0,
+    "get_form_fields_only": 120.0,
+    "analyze_document_bulk": 120.0,
+    "analyze_page_images_batch": 120.0,
+}
+
+# Successful call latencies kept per model for the hedging threshold
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+
+class GeminiUnavailableError(Exception):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures and then
+    rejects calls for `reset_seconds`; after that a single trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(
+                    f"Gemini circuit opened after {self.consecutive_failures} failures; "
+                    f"failing fast for {self.reset_seconds}s"
+                )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release(self):
+        """A trial call ended without a verdict (e.g. a non-retryable error)"""
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class _ModelHealth:
+    """Circuit breaker, recent latencies and resilience counters of one model"""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            settings.gemini_breaker_failures, settings.gemini_breaker_reset_seconds
+        )
+        self.latencies: "deque[float]" = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {
+            "calls": 0, "failures": 0, "retries": 0, "deadline_exceeded": 0,
+            "hedges": 0, "hedge_wins": 0,
+        }
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "circuit": self.breaker.stats(),
+            "p95_latency_seconds": round(p95, 3) if p95 is not None else None,
+            **self.counters,
+        }
+
+
+class _Deadline:
+    """
+    Deadline of one call. Its clock starts when the first attempt holds a
+    concurrency slot, so time spent queueing locally is not counted.
+    """
+
+    __slots__ = ("seconds", "at")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.at: Optional[float] = None
+
+    def start(self) -> float:
+        if self.at is None:
+            self.at = time.monotonic() + self.seconds
+        return self.at
+
+    def remaining(self) -> float:
+        if self.at is None:
+            return self.seconds
+        return max(0.0, self.at - time.monotonic())
+
+
+class GeminiStream:
+    """
+    Text of a streaming response as an async iterator. finish_reason (e.g.
+    "STOP", "MAX_TOKENS", "SAFETY"; "" when unknown) is set once the stream
+    has ended, so callers can tell a complete answer from a cut-off one.
+    """
+
+    def __init__(self):
+        self.finish_reason = ""
+        self.chunks: Optional[AsyncIterator[str]] = None
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self.chunks
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `per_minute` requests per minute, with bursts of up
+    to `per_minute` requests. A limit of 0 disables limiting.
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.capacity = float(max(per_minute, 1))
+        self.tokens = self.capacity
+        self.refill_per_second = per_minute / 60.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.per_minute <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self._updated) * self.refill_per_second,
+                )
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.refill_per_second)
+
+
+class GeminiClient:
+    """
+    Shared async Gemini backend.
+
+    Every Gemini call in the app goes through generate(), which uses the
+    SDK's async path under a global concurrency limit and a per-model
+    request-per-minute limit, so load is bounded by Gemini quota rather
+    than by blocked threads.
+
+    Calls are named after the service method making them (`call`), which
+    selects their deadline. The deadline clock starts once the request holds
+    a concurrency slot: waiting for the rate limit or a free slot is local
+    queueing, not a Gemini timeout, and never counts against the circuit
+    breaker or the latency window. Within the deadline, quota and 5xx errors are
+    retried with jittered exponential backoff; with gemini_hedge_enabled a
+    duplicate request is sent once an attempt outlasts the model's p95
+    latency, and the first answer wins. A per-model circuit breaker fails
+    calls fast with GeminiUnavailableError while Gemini keeps failing, so
+    callers drop straight to their fallback responses.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._semaphore = asyncio.Semaphore(max(1, settings.gemini_max_concurrency))
+        self._limiters: Dict[str, RateLimiter] = {
+            settings.gemini_model: RateLimiter(settings.gemini_rpm),
+            settings.gemini_tts_model: RateLimiter(settings.gemini_tts_rpm),
+        }
+        self._health: Dict[str, _ModelHealth] = {}
+        self.in_flight = 0
+
+    def get_model(self, model_name: Optional[str] = None) -> genai.GenerativeModel:
+        """Cached GenerativeModel for model_name (defaults to gemini_model)"""
+        model_name = model_name or settings.gemini_model
+        model = self._models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+
+    def _model_health(self, model_name: str) -> _ModelHealth:
+        health = self._health.get(model_name)
+        if health is None:
+            health = self._health[model_name] = _ModelHealth()
+        return health
+
+    @staticmethod
+    def deadline_for(call: Optional[str]) -> float:
+        deadline = settings.gemini_call_deadlines.get(call) if call else None
+        if deadline is None:
+            deadline = CALL_DEADLINES.get(call, settings.gemini_deadline_seconds)
+        return float(deadline)
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def _attempt(
+        self,
+        model_name: str,
+        make_request: Callable[[], Awaitable[Any]],
+        health: _ModelHealth,
+        deadline: _Deadline,
+        keep_slot: bool = False,
+    ) -> Any:
+        """
+        One request under the rate limit and the global concurrency limit,
+        timed from the moment it holds a slot. With keep_slot a successful
+        attempt keeps its slot; the caller releases it with _release_slot().
+        """
+        limiter = self._limiters.get(model_name)
+        if limiter is not None:
+            await limiter.acquire()
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        try:
+            started = time.monotonic()
+            result = await asyncio.wait_for(
+                make_request(), timeout=max(0.0, deadline.start() - started)
+            )
+        except BaseException:
+            self._release_slot()
+            raise
+        health.latencies.append(time.monotonic() - started)
+        if not keep_slot:
+            self._release_slot()
+        return result
+
+    async def _hedged_attempt(
+        self,
+        model_name: str,
+        make_request: Callable[[], Awaitable[Any]],
+        health: _ModelHealth,
+        deadline: _Deadline,
+    ) -> Any:
+        """An attempt, duplicated once it outlasts the p95 latency; the first success wins"""
+        threshold = health.p95() if settings.gemini_hedge_enabled else None
+        if threshold is None:
+            return await self._attempt(model_name, make_request, health, deadline)
+
+        primary = asyncio.ensure_future(self._attempt(model_name, make_request, health, deadline))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(
+                tasks, timeout=max(threshold, settings.gemini_hedge_min_seconds)
+            )
+            if not done:
+                health.counters["hedges"] += 1
+                tasks.add(
+                    asyncio.ensure_future(self._attempt(model_name, make_request, health, deadline))
+                )
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None or not tasks:
+                        if task is not primary and task.exception() is None:
+                            health.counters["hedge_wins"] += 1
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _call(
+        self, model_name: str, call: Optional[str], make_request: Callable[[], Awaitable[Any]],
+        keep_slot: bool = False,
+    ) -> Any:
+        """
+        make_request() with deadline, retries, hedging and the circuit breaker.
+        keep_slot (used for streams, never hedged) hands the successful
+        attempt's concurrency slot to the caller.
+        """
+        health = self._model_health(model_name)
+        if not health.breaker.allow():
+            raise GeminiUnavailableError(f"Gemini ({model_name}) is temporarily unavailable")
+        health.counters["calls"] += 1
+
+        deadline = _Deadline(self.deadline_for(call))
+        attempt = 0
+        while True:
+            try:
+                if keep_slot:
+                    result = await self._attempt(
+                        model_name, make_request, health, deadline, keep_slot=True
+                    )
+                else:
+                    result = await self._hedged_attempt(model_name, make_request, health, deadline)
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    health.counters["deadline_exceeded"] += 1
+                backoff = random.uniform(
+                    0, min(settings.gemini_retry_max_seconds, settings.gemini_retry_base_seconds * 2 ** attempt)
+                )
+                if attempt >= settings.gemini_max_retries or backoff >= deadline.remaining():
+                    health.counters["failures"] += 1
+                    health.breaker.record_failure()
+                    raise
+                attempt += 1
+                health.counters["retries"] += 1
+                logger.info(f"Retrying Gemini call {call or model_name} in {backoff:.2f}s after: {e!r}")
+                await asyncio.sleep(backoff)
+                continue
+            except BaseException:
+                # Not a service-health signal (bad request, cancellation, ...)
+                health.breaker.release()
+                raise
+            health.breaker.record_success()
+            return result
+
+    async def generate(
+        self, model_name: str, contents: Any, call: Optional[str] = None, **kwargs
+    ) -> Any:
+        """
+        Async equivalent of GenerativeModel.generate_content for model_name.
+        call names the calling method (deadline and metrics); other keyword
+        arguments are passed through unchanged.
+        """
+        model = self.get_model(model_name)
+        started = time.monotonic()
+        try:
+            response = await self._call(
+                model_name, call, lambda: model.generate_content_async(contents, **kwargs)
+            )
+        except Exception as e:
+            gemini_metrics.record(
+                call, model_name, time.monotonic() - started, request_image_bytes(contents),
+                error=type(e).__name__,
+            )
+            raise
+        prompt_tokens, output_tokens, finish_reason = response_usage(response)
+        gemini_metrics.record(
+            call, model_name, time.monotonic() - started, request_image_bytes(contents),
+            prompt_tokens, output_tokens, finish_reason,
+        )
+        return response
+
+    def generate_stream(
+        self, model_name: str, contents: Any, call: Optional[str] = None, **kwargs
+    ) -> GeminiStream:
+        """
+        Streaming generate(): the returned GeminiStream yields response text
+        as Gemini produces it and records the finish reason at the end.
+        Opening the stream gets the deadline, retries and circuit breaker
+        (no hedging); the concurrency slot taken to open it is held until the
+        stream ends or is closed.
+        """
+        stream = GeminiStream()
+        stream.chunks = self._stream_text(stream, model_name, contents, call, **kwargs)
+        return stream
+
+    async def _stream_text(
+        self, stream: GeminiStream, model_name: str, contents: Any, call: Optional[str], **kwargs
+    ) -> AsyncIterator[str]:
+        model = self.get_model(model_name)
+        health = self._model_health(model_name)
+        started = time.monotonic()
+        last_chunk, error = None, None
+        try:
+            response = await self._call(
+                model_name,
+                call,
+                lambda: model.generate_content_async(contents, stream=True, **kwargs),
+                keep_slot=True,
+            )
+            try:
+                async for chunk in response:
+                    # Usage and finish reason arrive with the last chunk
+                    last_chunk = chunk
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. only a finish reason)
+                        continue
+                    if text:
+                        yield text
+            except RETRYABLE_ERRORS:
+                health.counters["failures"] += 1
+                health.breaker.record_failure()
+                raise
+            finally:
+                self._release_slot()
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            prompt_tokens, output_tokens, finish_reason = response_usage(last_chunk)
+            stream.finish_reason = finish_reason
+            gemini_metrics.record(
+                call, model_name, time.monotonic() - started, request_image_bytes(contents),
+                prompt_tokens, output_tokens, finish_reason, error=error, stream=True,
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "hedging": settings.gemini_hedge_enabled,
+            "models": {name: health.stats() for name, health in self._health.items()},
+        }
+
+
+gemini_client = GeminiClient()
@@ -0,0 +1,165 @@
+import json
+import logging
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds (the last bucket is unbounded)
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+TOKEN_BUCKETS = [256, 1024, 4096, 16384, 65536]
+IMAGE_BYTES_BUCKETS = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+class Histogram:
+    """Fixed-bucket histogram with count and sum"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound:g}" for bound in self.bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _CallStats:
+    """Aggregates of one (call, model) pair"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors: Dict[str, int] = {}
+        self.finish_reasons: Dict[str, int] = {}
+        self.wall_seconds = Histogram(LATENCY_BUCKETS)
+        self.image_bytes = Histogram(IMAGE_BYTES_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.output_tokens = Histogram(TOKEN_BUCKETS)
+
+    def to_dict(self, model: str) -> Dict[str, Any]:
+        data = {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "finish_reasons": dict(self.finish_reasons),
+            "wall_seconds": self.wall_seconds.to_dict(),
+            "image_bytes": self.image_bytes.to_dict(),
+            "prompt_tokens": self.prompt_tokens.to_dict(),
+            "output_tokens": self.output_tokens.to_dict(),
+        }
+        cost = estimate_cost(model, self.prompt_tokens.sum, self.output_tokens.sum)
+        if cost is not None:
+            data["estimated_cost_usd"] = round(cost, 4)
+        return data
+
+
+def estimate_cost(model: str, prompt_tokens: float, output_tokens: float) -> Optional[float]:
+    """USD cost from gemini_token_prices ({model: [input, output] per million tokens})"""
+    prices = settings.gemini_token_prices.get(model)
+    if not prices:
+        return None
+    input_price, output_price = prices
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def request_image_bytes(contents: Any) -> int:
+    """Size of the inline media parts ({"mime_type", "data"}) of a request"""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for part in parts:
+        if isinstance(part, dict) and "data" in part:
+            data = part["data"]
+            # base64 strings are counted as their decoded size
+            total += len(data) if isinstance(data, (bytes, bytearray)) else len(data) * 3 // 4
+    return total
+
+
+def response_usage(response: Any) -> Tuple[int, int, str]:
+    """(prompt tokens, output tokens, finish reason) of a response or its last stream chunk"""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    finish_reason = ""
+    candidates = getattr(response, "candidates", None)
+    if candidates:
+        reason = getattr(candidates[0], "finish_reason", None)
+        if reason is not None:
+            finish_reason = getattr(reason, "name", None) or str(reason)
+    return prompt_tokens, output_tokens, finish_reason
+
+
+class GeminiCallMetrics:
+    """
+    Latency, payload, token and finish-reason aggregates per Gemini call
+    name and model, recorded by GeminiClient for every request (wall time
+    includes retries). Each request also gets one structured log line.
+    """
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], _CallStats] = {}
+        self._lock = Lock()
+
+    def record(
+        self,
+        call: Optional[str],
+        model: str,
+        wall_seconds: float,
+        image_bytes: int,
+        prompt_tokens: int = 0,
+        output_tokens: int = 0,
+        finish_reason: str = "",
+        error: Optional[str] = None,
+        stream: bool = False,
+    ):
+        call = call or "unnamed"
+        with self._lock:
+            stats = self._stats.get((call, model))
+            if stats is None:
+                stats = self._stats[(call, model)] = _CallStats()
+            stats.calls += 1
+            stats.wall_seconds.observe(wall_seconds)
+            stats.image_bytes.observe(image_bytes)
+            if error:
+                stats.errors[error] = stats.errors.get(error, 0) + 1
+            else:
+                stats.prompt_tokens.observe(prompt_tokens)
+                stats.output_tokens.observe(output_tokens)
+                reason = finish_reason or "UNKNOWN"
+                stats.finish_reasons[reason] = stats.finish_reasons.get(reason, 0) + 1
+
+        logger.info("gemini_call " + json.dumps({
+            "call": call,
+            "model": model,
+            "stream": stream,
+            "wall_ms": round(wall_seconds * 1000),
+            "image_bytes": image_bytes,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "finish_reason": finish_reason,
+            "error": error,
+        }))
+
+    def stats(self) -> Dict[str, Any]:
+        """{call: {model: aggregates}}"""
+        with self._lock:
+            result: Dict[str, Dict[str, Any]] = {}
+            for (call, model), stats in sorted(self._stats.items()):
+                result.setdefault(call, {})[model] = stats.to_dict(model)
+            return result
+
+
+gemini_metrics = GeminiCallMetrics()
@@ -3,6 +3,7 @@ from PIL import Image, ImageDraw, ImageFont, ImageOps
 from app.utils.arabic import is_arabic_text, reshape_arabic_text
 from app.utils.amiri_font import amiri_manager
 from app.config import get_settings
+from app.services.ocr_backend import ocr_backend
 import cv2
 import numpy as np
 import io
@@ -10,13 +11,10 @@ import base64
 import re
 import pytesseract
 import logging
+import time
 
 settings = get_settings()
-try:
-    # Align pytesseract with configured tesseract binary
-    pytesseract.pytesseract.tesseract_cmd = settings.tesseract_cmd
-except Exception:
-    pass
+logger = logging.getLogger(__name__)
 
 
 class ImageService:
@@ -35,24 +33,125 @@ class ImageService:
             except Exception:
                 pass
 
-            img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+            angle = self.detect_upright_angle(image)
+            return self.rotate_upright(image, angle)
+        except Exception:
+            # Fallback to safe resize only
+            return self._fit_to_max(image)
 
-            # Smart upright selection: try 0/90/180/270 and pick the best by OCR+structure
-            # Using cv2.rotate ensures exact 90-degree rotations without introducing dark borders.
-            img_cv, chosen_angle, details = self._choose_best_upright(img_cv)
-            try:
-                logging.getLogger(__name__).info(
-                    f"Upright angle chosen: {chosen_angle} deg | details={details}"
-                )
-            except Exception:
-                pass
+    def detect_upright_angle(self, image: Image.Image) -> int:
+        """
+        Return the clockwise rotation (0/90/180/270) that makes the image upright.
+        The image can be a low-resolution render of the page; the angle is
+        then applied to the higher-resolution variants with rotate_upright.
+        """
+        try:
+            started = time.perf_counter()
+            img_cv = cv2.cvtColor(np.array(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+            # Tiered upright selection: structure -> OSD -> OCR, cheapest first
+            chosen_angle, details = self._detect_orientation(img_cv)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logger.info(
+                f"Upright angle chosen: {chosen_angle} deg | tier={details.get('tier')} "
+                f"| {elapsed_ms:.0f} ms | details={details}"
+            )
+            return chosen_angle
+        except Exception:
+            return 0
+
+    def _detect_orientation(self, img_bgr: np.ndarray) -> Tuple[int, dict]:
+        """
+        Decide the upright angle on a downscaled copy, cheapest tier first:
+        - structure: edge projection profiles settle the text axis (0/180 vs 90/270)
+        - osd: a single Tesseract OSD call, accepted when it is confident and
+          agrees with the axis; this is the tier that catches upside-down pages
+        - ocr: OCR scoring of the remaining candidate angles as a last resort;
+          180 is only scored here when orientation_check_flipped is set, and a
+          horizontal page the OSD tier could not settle is otherwise kept at 0
+        Returns (angle, details); details["tier"] names the tier that decided.
+        """
+        small = self._downscale_bgr(img_bgr, settings.pdf_orientation_max_side)
+        structure = self._orientation_score(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        margin = settings.orientation_structure_margin
+        if structure >= margin:
+            angles = [0, 180]
+        elif structure <= 1.0 / margin:
+            angles = [90, 270]
+        else:
+            angles = [0, 90, 180, 270]
+        details = {"structure": round(structure, 3), "candidates": angles}
+
+        osd_angle, osd_confidence = self._osd_angle(small)
+        details["osd"] = {"angle": osd_angle, "confidence": round(osd_confidence, 2)}
+        if osd_angle in angles and osd_confidence >= settings.orientation_osd_min_confidence:
+            details["tier"] = "osd"
+            return osd_angle, details
+
+        if not settings.orientation_check_flipped:
+            angles = [a for a in angles if a != 180]
+            if len(angles) == 1:
+                details["tier"] = "structure"
+                return angles[0], details
+
+        _, chosen_angle, ocr_details = self._choose_best_upright(small, angles)
+        details.update(ocr_details)
+        details["tier"] = "ocr"
+        return chosen_angle, details
+
+    def _downscale_bgr(self, img_bgr: np.ndarray, limit: int) -> np.ndarray:
+        h, w = img_bgr.shape[:2]
+        maxdim = max(h, w)
+        if maxdim <= limit:
+            return img_bgr
+        scale = limit / float(maxdim)
+        return cv2.resize(
+            img_bgr, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA
+        )
+
+    def _osd_angle(self, img_bgr: np.ndarray) -> Tuple[Optional[int], float]:
+        """
+        Single Tesseract OSD call. Returns (clockwise angle that makes the
+        image upright, orientation confidence) or (None, 0.0) if OSD fails.
+        """
+        try:
+            pil = Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+
+            # Upscale small images to help OSD
+            min_dim = min(pil.width, pil.height)
+            if min_dim < 800:
+                scale = 800 / float(min_dim)
+                new_size = (int(pil.width * scale), int(pil.height * scale))
+                pil = pil.resize(new_size, Image.Resampling.LANCZOS)
 
-            # Convert and fit to max
-            pil_img = Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
-            return self._fit_to_max(pil_img)
+            osd = ocr_backend.image_to_osd(pil)
+            angle = int(osd.get("rotate", 0)) % 360
+            if angle not in (0, 90, 180, 270):
+                return None, 0.0
+            return angle, float(osd.get("orientation_conf", 0.0))
         except Exception:
-            # Fallback to safe resize only
+            return None, 0.0
+
+    def rotate_upright(self, image: Image.Image, angle: int) -> Image.Image:
+        """
+        Apply a clockwise rotation from detect_upright_angle and fit to max size.
+        Exact 90-degree transposes never introduce dark borders.
+        """
+        try:
+            transpose = {
+                90: Image.Transpose.ROTATE_270,  # PIL rotates counter-clockwise
+                180: Image.Transpose.ROTATE_180,
+                270: Image.Transpose.ROTATE_90,
+            }.get(angle % 360)
+            if transpose is not None:
+                image = image.transpose(transpose)
             return self._fit_to_max(image)
+        except Exception:
+            return self._fit_to_max(image)
+
+    def fit_for_upload(self, image: Image.Image) -> Image.Image:
+        """Downscale an image to the size Gemini actually needs"""
+        return self._fit_to_max(image, settings.gemini_upload_max_side)
 
     def _fit_to_max(
         self, image: Image.Image, max_size: Optional[int] = None
@@ -138,9 +237,7 @@ class ImageService:
         try:
             rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
             pil = Image.fromarray(rgb)
-            data = pytesseract.image_to_data(
-                pil, lang="ara+eng", output_type=pytesseract.Output.DICT
-            )
+            data = ocr_backend.image_to_data(pil, lang="ara+eng")
             confs = []
             for txt, conf in zip(data.get("text", []), data.get("conf", [])):
                 try:
@@ -309,39 +406,33 @@ class ImageService:
         except Exception:
             return img_bgr
 
-    def _choose_best_upright(self, img_bgr: np.ndarray) -> Tuple[np.ndarray, int, dict]:
+    def _choose_best_upright(
+        self, img_bgr: np.ndarray, angles: Optional[list] = None
+    ) -> Tuple[np.ndarray, int, dict]:
         """
-        Try 0/90/180/270 and pick the one with the highest composite score:
-        composite = ocr_score + k * orientation_score. Prefer 0 over 180 on near ties.
+        Try the candidate angles (default 0/90/180/270) and pick the one with the
+        highest composite score: composite = ocr_score + k * orientation_score.
+        Prefer 0 over 180 on near ties.
         Returns (best_image, angle, details)
         """
         try:
             # Prepare candidates
+            rotations = {
+                0: lambda img: img,
+                90: lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
+                180: lambda img: cv2.rotate(img, cv2.ROTATE_180),
+                270: lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
+            }
             candidates = [
-                (0, img_bgr),
-                (90, cv2.rotate(img_bgr, cv2.ROTATE_90_CLOCKWISE)),
-                (180, cv2.rotate(img_bgr, cv2.ROTATE_180)),
-                (270, cv2.rotate(img_bgr, cv2.ROTATE_90_COUNTERCLOCKWISE)),
+                (angle, rotations[angle](img_bgr)) for angle in (angles or [0, 90, 180, 270])
             ]
 
             results = []
             k = 0.5  # weight for structure score
 
-            # Downscale to speed OCR scoring if very large
-            def downscale(
-                bgr: np.ndarray, limit: int = 2400
-            ) -> np.ndarray:  # Increased from 1200 for better quality
-                h, w = bgr.shape[:2]
-                maxdim = max(h, w)
-                if maxdim <= limit:
-                    return bgr
-                scale = limit / float(maxdim)
-                return cv2.resize(
-                    bgr, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA
-                )
-
             for angle, img in candidates:
-                img_small = downscale(img)
+                # Downscale to speed OCR scoring if very large
+                img_small = self._downscale_bgr(img, settings.pdf_orientation_max_side)
                 try:
                     ocr = self._ocr_score(img_small)
                 except Exception:
@@ -377,16 +468,9 @@ class ImageService:
 
             chosen_angle = int(best["angle"])
             # Return the matching image
-            if chosen_angle == 0:
-                best_img = candidates[0][1]
-            elif chosen_angle == 90:
-                best_img = candidates[1][1]
-            elif chosen_angle == 180:
-                best_img = candidates[2][1]
-            else:
-                best_img = candidates[3][1]
+            best_img = dict(candidates)[chosen_angle]
 
-            details = {"candidates": results}
+            details = {"ocr_candidates": results}
             return best_img, chosen_angle, details
         except Exception:
             # Fallback to orientation-only upright
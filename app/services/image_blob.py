@@ -0,0 +1,157 @@
+import base64
+import io
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from app.config import get_settings
+from app.services.blob_store import blob_store
+from app.services.image_codec import MIME_TYPES as IMAGE_MIME_TYPES, image_codec
+
+settings = get_settings()
+
+MIME_TYPES = {**IMAGE_MIME_TYPES, "raw": "application/octet-stream"}
+
+
+class _DecodedImageCache:
+    """Per-process LRU of decoded images keyed by blob reference, bounded by pixel bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._images: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _size(image: Image.Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, ref: str) -> Optional[Image.Image]:
+        with self._lock:
+            image = self._images.get(ref)
+            if image is not None:
+                self._images.move_to_end(ref)
+            return image
+
+    def put(self, ref: str, image: Image.Image):
+        size = self._size(image)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(ref)
+            self._images[ref] = image
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, oldest = self._images.popitem(last=False)
+                self._bytes -= self._size(oldest)
+
+    def _discard(self, ref: str):
+        image = self._images.pop(ref, None)
+        if image is not None:
+            self._bytes -= self._size(image)
+
+    def discard(self, ref: str):
+        with self._lock:
+            self._discard(ref)
+
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"images": len(self._images), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+decoded_images = _DecodedImageCache(settings.image_blob_cache_bytes)
+blob_store.register_cache("decoded_images", decoded_images.memory_bytes)
+
+
+class ImageBlob:
+    """
+    Handle to one session image stored exactly once in the blob store.
+
+    Sessions keep to_dict() (reference, format, size); the image is either
+    encoded bytes ("png"/"jpeg"/"webp", produced by image_codec and stored
+    as is) or a raw pixel array ("raw", image.tobytes(), no encode/decode
+    cost). Pixels are decoded only when needed and kept in a small
+    per-process cache, and base64 is produced only at the HTTP boundary.
+    decode/to_http_bytes are CPU work for the vision pool; create/read only
+    touch the blob store.
+    """
+
+    def __init__(self, ref: str, fmt: str, width: int, height: int, mode: str = "RGB"):
+        self.ref = ref
+        self.format = fmt
+        self.width = width
+        self.height = height
+        self.mode = mode
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES.get(self.format, "application/octet-stream")
+
+    @classmethod
+    async def create(
+        cls, session_id: str, data: bytes, fmt: str, width: int, height: int,
+        mode: str = "RGB", image: Optional[Image.Image] = None,
+    ) -> "ImageBlob":
+        """Store already encoded data; image (if given) primes the decoded cache"""
+        ref = await blob_store.put(session_id, data)
+        blob = cls(ref, fmt, width, height, mode)
+        if image is not None:
+            decoded_images.put(ref, image)
+        return blob
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageBlob":
+        return cls(
+            data["ref"], data.get("format", "png"), data.get("width", 0),
+            data.get("height", 0), data.get("mode", "RGB"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ref": self.ref,
+            "format": self.format,
+            "width": self.width,
+            "height": self.height,
+            "mode": self.mode,
+        }
+
+    async def read(self) -> Optional[bytes]:
+        """Stored bytes, or None when the blob is gone"""
+        return await blob_store.get(self.ref)
+
+    def cached_image(self) -> Optional[Image.Image]:
+        return decoded_images.get(self.ref)
+
+    def decode(self, data: bytes) -> Image.Image:
+        image = decoded_images.get(self.ref)
+        if image is not None:
+            return image
+        if self.format == "raw":
+            image = Image.frombytes(self.mode, (self.width, self.height), data)
+        else:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        decoded_images.put(self.ref, image)
+        return image
+
+    def to_http_bytes(self, data: bytes) -> bytes:
+        """Bytes for an image response: encoded formats as stored, raw arrays as PNG"""
+        if self.format == "raw":
+            return image_codec.encode(self.decode(data), "form").data
+        return data
+
+    @property
+    def http_mime_type(self) -> str:
+        return "image/png" if self.format == "raw" else self.mime_type
+
+    def to_base64(self, data: bytes) -> str:
+        return base64.b64encode(self.to_http_bytes(data)).decode("utf-8")
+
+    async def delete(self):
+        decoded_images.discard(self.ref)
+        await blob_store.delete(self.ref)
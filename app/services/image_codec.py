@@ -0,0 +1,161 @@
+import base64
+import io
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, features
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+WEBP_AVAILABLE = features.check("webp")
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Encoding policy per purpose:
+# - "form": form pages, detection/preview images and Gemini uploads; lossless
+#   because fields and handwriting must stay sharp, with fast zlib settings
+# - "fill": filled pages and PDF output; lossless for fill fidelity
+# - "slide": document/slide pages; lossy (WebP/JPEG) when the content is
+#   photographic, fast lossless PNG for flat graphics and text
+PURPOSES = ("form", "fill", "slide")
+
+# Sample size and distinct-colour count above which a page counts as photographic
+_PHOTO_SAMPLE_SIDE = 128
+_PHOTO_MIN_COLORS = 1024
+
+
+class EncodedImage:
+    """Encoded image bytes with the format they were written in"""
+
+    __slots__ = ("data", "format", "width", "height")
+
+    def __init__(self, data: bytes, fmt: str, width: int, height: int):
+        self.data = data
+        self.format = fmt
+        self.width = width
+        self.height = height
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+
+class ImageCodecService:
+    """
+    Single place where page images are encoded, with a policy per purpose
+    (see PURPOSES). Callers that serve the same image repeatedly pass a
+    cache_key; the encoded artifact is then kept in a per-process LRU
+    bounded by image_codec_cache_bytes.
+    """
+
+    def __init__(self, cache_bytes: int):
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[Tuple[str, str], EncodedImage]" = OrderedDict()
+        self._cache_size = 0
+        self._lock = Lock()
+        self.lossy_format = settings.image_slide_format.lower()
+        if self.lossy_format == "webp" and not WEBP_AVAILABLE:
+            logger.warning("Pillow built without WebP support; photographic slides use JPEG")
+            self.lossy_format = "jpeg"
+
+    def encode(
+        self, image: Image.Image, purpose: str = "form", cache_key: Optional[str] = None
+    ) -> EncodedImage:
+        if cache_key is not None:
+            with self._lock:
+                encoded = self._cache.get((cache_key, purpose))
+                if encoded is not None:
+                    self._cache.move_to_end((cache_key, purpose))
+                    return encoded
+
+        fmt = self.format_for(image, purpose)
+        buffer = io.BytesIO()
+        if fmt == "png":
+            if image.mode not in ("RGB", "RGBA", "L", "LA", "P", "1"):
+                image = image.convert("RGB")
+            image.save(buffer, format="PNG", compress_level=settings.image_png_compress_level)
+        else:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if fmt == "webp":
+                # method 2: much faster than the default 4 for a few percent in size
+                image.save(buffer, format="WEBP", quality=settings.image_lossy_quality, method=2)
+            else:
+                image.save(buffer, format="JPEG", quality=settings.image_lossy_quality, optimize=False)
+        encoded = EncodedImage(buffer.getvalue(), fmt, image.width, image.height)
+
+        if cache_key is not None:
+            self._cache_put((cache_key, purpose), encoded)
+        return encoded
+
+    def encode_base64(self, image: Image.Image, purpose: str = "form") -> Tuple[str, str]:
+        """(base64, mime_type) of an image encoded for purpose"""
+        encoded = self.encode(image, purpose)
+        return encoded.to_base64(), encoded.mime_type
+
+    def format_for(self, image: Image.Image, purpose: str) -> str:
+        if purpose not in PURPOSES:
+            raise ValueError(f"Unknown image purpose: {purpose}")
+        if purpose == "slide" and self.lossy_format != "png" and self._is_photographic(image):
+            return self.lossy_format
+        return "png"
+
+    @staticmethod
+    def _is_photographic(image: Image.Image) -> bool:
+        """Many distinct colours in a small nearest-neighbour sample means photo-like content"""
+        sample = image.resize((_PHOTO_SAMPLE_SIDE, _PHOTO_SAMPLE_SIDE), Image.Resampling.NEAREST)
+        if sample.mode != "RGB":
+            sample = sample.convert("RGB")
+        return sample.getcolors(maxcolors=_PHOTO_MIN_COLORS) is None
+
+    @staticmethod
+    def mime_type_of(data: bytes) -> str:
+        """MIME type from an encoded image's signature"""
+        if data[:3] == b"\xff\xd8\xff":
+            return "image/jpeg"
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return "image/webp"
+        return "image/png"
+
+    def mime_type_of_base64(self, image_base64: str) -> str:
+        return self.mime_type_of(base64.b64decode(image_base64[:16])) if image_base64 else "image/png"
+
+    def _cache_put(self, key: Tuple[str, str], encoded: EncodedImage):
+        size = len(encoded.data)
+        if size > self.cache_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cache_size -= len(previous.data)
+            self._cache[key] = encoded
+            self._cache_size += size
+            while self._cache_size > self.cache_bytes:
+                _, oldest = self._cache.popitem(last=False)
+                self._cache_size -= len(oldest.data)
+
+    def discard(self, key_prefix: str):
+        """Drop cached artifacts whose cache_key starts with key_prefix"""
+        with self._lock:
+            for key in [key for key in self._cache if key[0].startswith(key_prefix)]:
+                self._cache_size -= len(self._cache.pop(key).data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": self._cache_size,
+                "max_bytes": self.cache_bytes,
+                "lossy_format": self.lossy_format,
+            }
+
+
+image_codec = ImageCodecService(settings.image_codec_cache_bytes)
@@ -1,28 +1,118 @@
 import json
+import sqlite3
 from datetime import datetime
-from typing import Dict, Any, Optional
+from threading import Lock
+from typing import Dict, Any, Optional, Callable
 import logging
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Optional fast JSON codec
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dumps(data: Any) -> str:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _loads(data: str) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 class JSONStorageService:
+    """
+    Document analyses stored in a SQLite file (WAL mode) with one row per
+    page, so a single-page update reads and rewrites only that page.
+
+    The document itself (everything except "image_analyses") is one row;
+    each entry of "image_analyses" is a row keyed by (session_id,
+    page_number) that keeps its position in the list. Every write runs in a
+    BEGIN IMMEDIATE transaction, so concurrent writers (threads or worker
+    processes) serialize instead of overwriting each other, and a document
+    is replaced atomically. Analyses saved by older versions as
+    <session_id>_analysis.json are imported on first load.
+    """
+
     def __init__(self, storage_dir: str = "document_analyses"):
         """Initialize JSON storage service with storage directory"""
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
+        self.db_path = self.storage_dir / "analyses.db"
+        self._lock = Lock()
+        self._db = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS page_analyses ("
+            "session_id TEXT NOT NULL, page_number INTEGER NOT NULL, "
+            "position INTEGER NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, page_number))"
+        )
+
+    def _transaction(self, work: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def _legacy_path(self, session_id: str) -> Path:
+        return self.storage_dir / f"{session_id}_analysis.json"
+
+    def _write_document(self, session_id: str, analysis_data: Dict[str, Any]):
+        document = {k: v for k, v in analysis_data.items() if k != "image_analyses"}
+        # Remember whether the list exists so load returns the same shape
+        document["_has_image_analyses"] = "image_analyses" in analysis_data
+        pages = [
+            (session_id, page.get("page_number", position), position, _dumps(page))
+            for position, page in enumerate(analysis_data.get("image_analyses", []))
+        ]
+        document_row = (session_id, _dumps(document))
+
+        def work():
+            self._db.execute("DELETE FROM page_analyses WHERE session_id = ?", (session_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses (session_id, data) VALUES (?, ?)",
+                document_row,
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO page_analyses (session_id, page_number, position, data) "
+                "VALUES (?, ?, ?, ?)",
+                pages,
+            )
+
+        self._transaction(work)
 
     def save_document_analysis(
         self, session_id: str, analysis_data: Dict[str, Any]
     ) -> str:
-        """Save document analysis to JSON file"""
+        """Save document analysis (replacing any previous one)"""
         try:
             # Add metadata
             analysis_data["metadata"] = {
                 "session_id": session_id,
                 "created_at": datetime.now().isoformat(),
-                "file_version": "1.0",
+                "file_version": "2.0",
             }
 
             # Add processed_at timestamp to each page analysis
@@ -31,62 +121,103 @@ class JSONStorageService:
                 for page_analysis in analysis_data["image_analyses"]:
                     page_analysis["processed_at"] = current_time
 
-            # Create filename
-            filename = f"{session_id}_analysis.json"
-            file_path = self.storage_dir / filename
-
-            # Save to file
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(analysis_data, f, ensure_ascii=False, indent=2)
+            self._write_document(session_id, analysis_data)
 
-            logger.info(f"Analysis saved to {file_path}")
-            return str(file_path)
+            logger.info(f"Analysis saved for session {session_id}")
+            return str(self.db_path)
 
         except Exception as e:
-            logger.error(f"Error saving analysis to JSON: {str(e)}")
+            logger.error(f"Error saving analysis: {str(e)}")
             raise
 
+    def _import_legacy(self, session_id: str) -> bool:
+        """Move a <session_id>_analysis.json file into the database"""
+        file_path = self._legacy_path(session_id)
+        if not file_path.exists():
+            return False
+        with open(file_path, "r", encoding="utf-8") as f:
+            analysis_data = json.load(f)
+        self._write_document(session_id, analysis_data)
+        file_path.unlink()
+        logger.info(f"Imported legacy analysis file {file_path}")
+        return True
+
     def load_document_analysis(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Load document analysis from JSON file"""
+        """Load document analysis with all its pages"""
         try:
-            filename = f"{session_id}_analysis.json"
-            file_path = self.storage_dir / filename
-
-            if not file_path.exists():
-                return None
+            def work():
+                row = self._db.execute(
+                    "SELECT data FROM analyses WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    return None, []
+                pages = self._db.execute(
+                    "SELECT data FROM page_analyses WHERE session_id = ? ORDER BY position",
+                    (session_id,),
+                ).fetchall()
+                return row[0], pages
 
-            with open(file_path, "r", encoding="utf-8") as f:
-                analysis_data = json.load(f)
+            document, pages = self._transaction(work)
+            if document is None:
+                if not self._import_legacy(session_id):
+                    return None
+                document, pages = self._transaction(work)
 
-            logger.info(f"Analysis loaded from {file_path}")
+            analysis_data = _loads(document)
+            if analysis_data.pop("_has_image_analyses", False):
+                analysis_data["image_analyses"] = [_loads(page[0]) for page in pages]
             return analysis_data
 
         except Exception as e:
-            logger.error(f"Error loading analysis from JSON: {str(e)}")
+            logger.error(f"Error loading analysis: {str(e)}")
             return None
 
-    
+    def load_page_analysis(
+        self, session_id: str, page_number: int
+    ) -> Optional[Dict[str, Any]]:
+        """Load the analysis of a single page"""
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT data FROM page_analyses WHERE session_id = ? AND page_number = ?",
+                    (session_id, page_number),
+                ).fetchone()
+            if row is None and self._import_legacy(session_id):
+                return self.load_page_analysis(session_id, page_number)
+            return _loads(row[0]) if row else None
+
+        except Exception as e:
+            logger.error(f"Error loading page analysis: {str(e)}")
+            return None
 
     def analysis_exists(self, session_id: str) -> bool:
-        """Check if analysis file exists for session"""
-        filename = f"{session_id}_analysis.json"
-        file_path = self.storage_dir / filename
-        return file_path.exists()
+        """Check if an analysis is stored for session"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM analyses WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None or self._legacy_path(session_id).exists()
 
     def delete_analysis(self, session_id: str) -> bool:
-        """Delete analysis file for session"""
+        """Delete the stored analysis for session"""
         try:
-            filename = f"{session_id}_analysis.json"
-            file_path = self.storage_dir / filename
+            def work():
+                self._db.execute("DELETE FROM page_analyses WHERE session_id = ?", (session_id,))
+                return self._db.execute(
+                    "DELETE FROM analyses WHERE session_id = ?", (session_id,)
+                ).rowcount
 
+            deleted = self._transaction(work) > 0
+            file_path = self._legacy_path(session_id)
             if file_path.exists():
                 file_path.unlink()
-                logger.info(f"Analysis file deleted: {file_path}")
-                return True
-            return False
+                deleted = True
+            if deleted:
+                logger.info(f"Analysis deleted for session {session_id}")
+            return deleted
 
         except Exception as e:
-            logger.error(f"Error deleting analysis file: {str(e)}")
+            logger.error(f"Error deleting analysis: {str(e)}")
             return False
 
     # NOTE: list_all_analyses endpoint was removed; method deleted for cleanup.
@@ -94,25 +225,32 @@ class JSONStorageService:
     def update_page_analysis(
         self, session_id: str, page_number: int, new_analysis: str
     ) -> bool:
-        """Update analysis for a specific page"""
+        """Update analysis for a specific page (reads and writes only that page's row)"""
         try:
-            analysis_data = self.load_document_analysis(session_id)
-            if not analysis_data:
-                return False
-
-            # Find and update the specific page
-            if "image_analyses" in analysis_data:
-                for page_analysis in analysis_data["image_analyses"]:
-                    if page_analysis["page_number"] == page_number:
-                        page_analysis["image_analysis"] = new_analysis
-                        page_analysis["updated_at"] = datetime.now().isoformat()
-                        break
-
-                # Save updated data
-                self.save_document_analysis(session_id, analysis_data)
+            def work():
+                row = self._db.execute(
+                    "SELECT data FROM page_analyses WHERE session_id = ? AND page_number = ?",
+                    (session_id, page_number),
+                ).fetchone()
+                if row is None:
+                    # As before: success as long as the document has a page list
+                    document = self._db.execute(
+                        "SELECT data FROM analyses WHERE session_id = ?", (session_id,)
+                    ).fetchone()
+                    return document is not None and _loads(document[0]).get("_has_image_analyses", False)
+                page_analysis = _loads(row[0])
+                page_analysis["image_analysis"] = new_analysis
+                page_analysis["updated_at"] = datetime.now().isoformat()
+                self._db.execute(
+                    "UPDATE page_analyses SET data = ? WHERE session_id = ? AND page_number = ?",
+                    (_dumps(page_analysis), session_id, page_number),
+                )
                 return True
 
-            return False
+            if not self.analysis_exists(session_id):
+                return False
+            self._import_legacy(session_id)
+            return self._transaction(work)
 
         except Exception as e:
             logger.error(f"Error updating page analysis: {str(e)}")
@@ -2,12 +2,11 @@ import pytesseract
 from PIL import Image
 from langdetect import detect, LangDetectException
 from app.config import get_settings
+from app.services.ocr_backend import ocr_backend
 import cv2
 import numpy as np
 
-# Configure pytesseract globally when the module is imported
 settings = get_settings()
-pytesseract.pytesseract.tesseract_cmd = settings.tesseract_cmd
 
 class OCRService:
     """
@@ -20,16 +19,67 @@ class OCRService:
         """
         try:
             cropped_image = image.crop(box)
-            text = pytesseract.image_to_string(cropped_image, lang='ara+eng').strip()
-            conf_data = pytesseract.image_to_data(cropped_image, output_type=pytesseract.Output.DICT, lang='ara+eng')
+            text = ocr_backend.image_to_string(cropped_image, lang='ara+eng').strip()
+            conf_data = ocr_backend.image_to_data(cropped_image, lang='ara+eng')
             
-            text_conf = [int(c) for i, c in enumerate(conf_data['conf']) if conf_data['text'][i].strip() != '']
+            text_conf = [int(float(c)) for i, c in enumerate(conf_data['conf']) if conf_data['text'][i].strip() != '']
             avg_conf = sum(text_conf) / len(text_conf) if text_conf else 0
             
             return text, avg_conf
         except (pytesseract.TesseractNotFoundError, LangDetectException, Exception):
             return None, 0
 
+    def extract_page_words(self, image: Image.Image) -> dict:
+        """
+        Runs a single Tesseract pass over the whole page.
+        Returns {"boxes": N x 4 [x1, y1, x2, y2] array, "conf": N array, "text": list of words}.
+        """
+        try:
+            data = ocr_backend.image_to_data(image, lang='ara+eng')
+            keep = [i for i, t in enumerate(data['text']) if t.strip() != '']
+            boxes = np.array(
+                [
+                    [data['left'][i], data['top'][i],
+                     data['left'][i] + data['width'][i], data['top'][i] + data['height'][i]]
+                    for i in keep
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 4)
+            conf = np.array([float(data['conf'][i]) for i in keep], dtype=np.float64)
+            return {"boxes": boxes, "conf": conf, "text": [data['text'][i] for i in keep]}
+        except (pytesseract.TesseractNotFoundError, Exception):
+            return {"boxes": np.empty((0, 4)), "conf": np.empty(0), "text": []}
+
+    def regions_with_text(self, page_words: dict, boxes: np.ndarray, min_conf: float = 50,
+                          min_overlap: float = 0.5) -> np.ndarray:
+        """
+        For each [x1, y1, x2, y2] box, whether it already contains printed text:
+        the page words lying mostly inside it (by min_overlap of the word area)
+        have an average confidence above min_conf.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        word_boxes = page_words["boxes"]
+        if len(boxes) == 0 or len(word_boxes) == 0:
+            return np.zeros(len(boxes), dtype=bool)
+
+        inter_w = np.clip(
+            np.minimum(boxes[:, None, 2], word_boxes[None, :, 2])
+            - np.maximum(boxes[:, None, 0], word_boxes[None, :, 0]), 0, None
+        )
+        inter_h = np.clip(
+            np.minimum(boxes[:, None, 3], word_boxes[None, :, 3])
+            - np.maximum(boxes[:, None, 1], word_boxes[None, :, 1]), 0, None
+        )
+        word_area = np.maximum(
+            (word_boxes[:, 2] - word_boxes[:, 0]) * (word_boxes[:, 3] - word_boxes[:, 1]), 1
+        )
+        inside = (inter_w * inter_h) >= min_overlap * word_area[None, :]
+
+        counts = inside.sum(axis=1)
+        conf_sum = inside.astype(np.float64) @ page_words["conf"]
+        avg_conf = np.divide(conf_sum, counts, out=np.zeros(len(boxes)), where=counts > 0)
+        return (counts > 0) & (avg_conf > min_conf)
+
     def correct_image_orientation(self, image: Image.Image) -> Image.Image:
         """
         Corrects the orientation of an image based on OCR data.
@@ -39,13 +89,15 @@ class OCRService:
         # to detect orientation and then rotate the image accordingly.
         return image
 
-    def detect_language_locally(self, image: Image.Image) -> str | None:
+    def detect_language_locally(self, image: Image.Image, extracted_text: str | None = None) -> str | None:
         """
         Uses local OCR (Tesseract) and language detection to determine form direction.
+        Pass extracted_text to reuse an OCR pass that already covered the page.
         """
         try:
             # Extract text from the entire image to get a language sample
-            extracted_text = pytesseract.image_to_string(image, lang='ara+eng')
+            if extracted_text is None:
+                extracted_text = ocr_backend.image_to_string(image, lang='ara+eng')
             if not extracted_text.strip():
                 return None # Not enough text to detect
             # Detect language from the extracted text
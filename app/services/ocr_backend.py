@@ -0,0 +1,137 @@
+import logging
+import threading
+from typing import Any, Dict, List
+
+import pytesseract
+from PIL import Image
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+pytesseract.pytesseract.tesseract_cmd = settings.tesseract_cmd
+
+# Optional in-process Tesseract bindings
+try:
+    import tesserocr
+
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+
+class OCRBackend:
+    """
+    Single entry point for Tesseract OCR.
+
+    With tesserocr installed, each worker thread (and so each worker process)
+    keeps its own long-lived TessBaseAPI per (lang, psm) with the language
+    models loaded once. Otherwise calls go through pytesseract, which starts
+    a tesseract process per call. Results use pytesseract's formats so
+    callers do not depend on the backend.
+    """
+
+    def __init__(self, backend: str = "auto", tessdata_path: str = ""):
+        self.tessdata_path = tessdata_path or None
+        self._local = threading.local()
+        self.use_tesserocr = backend in ("auto", "tesserocr") and TESSEROCR_AVAILABLE
+        if backend == "tesserocr" and not TESSEROCR_AVAILABLE:
+            logger.warning("tesserocr not installed; falling back to pytesseract")
+
+    @property
+    def name(self) -> str:
+        return "tesserocr" if self.use_tesserocr else "pytesseract"
+
+    def _api(self, lang: str, psm: int):
+        """Per-thread TessBaseAPI for (lang, psm), created on first use"""
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        key = (lang, psm)
+        api = apis.get(key)
+        if api is None:
+            kwargs = {"lang": lang, "psm": psm}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            try:
+                api = tesserocr.PyTessBaseAPI(**kwargs)
+            except Exception as e:
+                # A broken tesserocr install (e.g. missing tessdata) should not take OCR down with it
+                logger.warning(f"tesserocr unavailable ({e}); using pytesseract from now on")
+                self.use_tesserocr = False
+                raise
+            apis[key] = api
+        return api
+
+    def _fallback(self, e: Exception):
+        # A failure on one image only sends that call to pytesseract
+        if self.use_tesserocr:
+            logger.warning(f"tesserocr failed ({e}); using pytesseract for this call")
+
+    def image_to_string(self, image: Image.Image, lang: str = "ara+eng") -> str:
+        if self.use_tesserocr:
+            try:
+                api = self._api(lang, tesserocr.PSM.AUTO)
+                api.SetImage(image)
+                return api.GetUTF8Text()
+            except Exception as e:
+                self._fallback(e)
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def image_to_data(self, image: Image.Image, lang: str = "ara+eng") -> Dict[str, List[Any]]:
+        """Word-level results in pytesseract's Output.DICT layout"""
+        if self.use_tesserocr:
+            try:
+                return self._tesserocr_words(image, lang)
+            except Exception as e:
+                self._fallback(e)
+        return pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT, lang=lang)
+
+    def _tesserocr_words(self, image: Image.Image, lang: str) -> Dict[str, List[Any]]:
+        api = self._api(lang, tesserocr.PSM.AUTO)
+        api.SetImage(image)
+        api.Recognize()
+        data = {"text": [], "conf": [], "left": [], "top": [], "width": [], "height": []}
+        level = tesserocr.RIL.WORD
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+        for word in tesserocr.iterate_level(iterator, level):
+            text = word.GetUTF8Text(level)
+            bbox = word.BoundingBox(level)
+            if text is None or bbox is None:
+                continue
+            x1, y1, x2, y2 = bbox
+            data["text"].append(text)
+            data["conf"].append(word.Confidence(level))
+            data["left"].append(x1)
+            data["top"].append(y1)
+            data["width"].append(x2 - x1)
+            data["height"].append(y2 - y1)
+        return data
+
+    def image_to_osd(self, image: Image.Image) -> Dict[str, Any]:
+        """Orientation in pytesseract's Output.DICT layout ("rotate", "orientation_conf", ...)"""
+        if self.use_tesserocr:
+            try:
+                api = self._api("osd", tesserocr.PSM.OSD_ONLY)
+                api.SetImage(image)
+                osd = api.DetectOrientationScript()
+                if osd:
+                    orientation = int(osd["orient_deg"]) % 360
+                    return {
+                        "orientation": orientation,
+                        "rotate": (360 - orientation) % 360,
+                        "orientation_conf": float(osd["orient_conf"]),
+                        "script": osd.get("script_name"),
+                        "script_conf": float(osd.get("script_conf", 0.0)),
+                    }
+                return {}
+            except Exception as e:
+                self._fallback(e)
+        return pytesseract.image_to_osd(
+            image, config="--psm 0", output_type=pytesseract.Output.DICT
+        )
+
+
+ocr_backend = OCRBackend(settings.ocr_backend, settings.tessdata_path)
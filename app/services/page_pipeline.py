@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from app.config import get_settings
+from app.services.gemini import GeminiService
+from app.services.image import ImageService
+from app.services.pdf_processor import PDFProcessor
+from app.services.yolo import YOLOService
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Services used inside worker processes; created once per process on first use
+_worker_services: Dict[str, Any] = {}
+
+# PDFs opened inside a worker process, keyed by the file the parent wrote;
+# each worker reads a document once and reuses it for all its pages
+_worker_documents: "OrderedDict[str, Any]" = OrderedDict()
+WORKER_OPEN_DOCUMENTS = 2
+
+
+def _get_worker_services() -> Dict[str, Any]:
+    if not _worker_services:
+        _worker_services["pdf"] = PDFProcessor()
+        _worker_services["image"] = ImageService()
+        _worker_services["yolo"] = YOLOService()
+    return _worker_services
+
+
+def _get_worker_document(pdf_path: str):
+    pages = _worker_documents.get(pdf_path)
+    if pages is not None:
+        _worker_documents.move_to_end(pdf_path)
+        return pages
+    with open(pdf_path, "rb") as f:
+        pages = _get_worker_services()["pdf"].open_pdf(f.read())
+    _worker_documents[pdf_path] = pages
+    while len(_worker_documents) > WORKER_OPEN_DOCUMENTS:
+        _worker_documents.popitem(last=False)[1].close()
+    return pages
+
+
+def prepare_pdf_page(
+    pdf_path: str, page_number: int, language: str, angle: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    CPU stage for one PDF page, run in a worker process: orientation,
+    YOLO detection and the numbered image sent to Gemini.
+    pdf_path is a uniquely named copy of the upload written by the parent,
+    so only the path is pickled per page. angle skips orientation
+    detection when it is already known.
+    """
+    services = _get_worker_services()
+    image_service = services["image"]
+    pages = _get_worker_document(pdf_path)
+    if angle is None:
+        thumbnail = pages.get_page(page_number, "orientation")["image"]
+        angle = image_service.detect_upright_angle(thumbnail)
+    corrected_image = image_service.rotate_upright(
+        pages.get_page(page_number, "detection")["image"], angle
+    )
+
+    fields_data = services["yolo"].detect_fields_with_language(corrected_image, language)
+    upload_image = None
+    if fields_data:
+        upload_image = image_service.fit_for_upload(
+            image_service.create_annotated_image_for_gpt(
+                corrected_image, fields_data, with_numbers=True
+            )
+        )
+
+    return {
+        "page_number": page_number,
+        "angle": angle,
+        "width": corrected_image.width,
+        "height": corrected_image.height,
+        "fields_data": fields_data,
+        "upload_image": upload_image,
+    }
+
+
+class PagePipelineService:
+    """
+    Page-parallel analysis of multi-page PDF forms.
+
+    The CPU stage of each page (prepare_pdf_page) runs on a process pool
+    while Gemini labeling of other pages is in flight, so wall time stays
+    close to a single page until page_pipeline_parallelism is reached.
+    The PDF is handed to the workers as a temporary file rather than
+    pickled into every page job.
+    """
+
+    def __init__(self):
+        self.gemini_service = GeminiService()
+        self.image_service = ImageService()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that already holds torch/OpenMP threads can deadlock
+            self._pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.page_pipeline_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor):
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _write_temp_pdf(file_content: bytes) -> str:
+        path = os.path.join(tempfile.gettempdir(), f"page_pipeline_{uuid.uuid4().hex}.pdf")
+        with open(path, "wb") as f:
+            f.write(file_content)
+        return path
+
+    @staticmethod
+    def _remove_temp_pdf(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def analyze_pages(
+        self,
+        file_content: bytes,
+        page_numbers: List[int],
+        language: str,
+        page_angles: Optional[Dict[int, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze pages concurrently and return one result per page, in the
+        order of page_numbers. Successful results carry page_number, angle,
+        width, height and fields; failed pages carry page_number and error.
+        """
+        page_angles = page_angles or {}
+        semaphore = asyncio.Semaphore(max(1, settings.page_pipeline_parallelism))
+
+        pdf_path = await asyncio.to_thread(self._write_temp_pdf, file_content)
+
+        async def run_page(page_number: int) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self._analyze_page(
+                        pdf_path, page_number, language, page_angles.get(page_number)
+                    )
+                except Exception as e:
+                    logger.error(f"Error analyzing PDF page {page_number}: {e}")
+                    return {"page_number": page_number, "error": str(e)}
+
+        try:
+            return list(await asyncio.gather(*(run_page(n) for n in page_numbers)))
+        finally:
+            await asyncio.to_thread(self._remove_temp_pdf, pdf_path)
+
+    async def _analyze_page(
+        self, pdf_path: str, page_number: int, language: str, angle: Optional[int]
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            prepared = await loop.run_in_executor(
+                pool, prepare_pdf_page, pdf_path, page_number, language, angle
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); release it and start a fresh pool for the next pages
+            self._reset_pool(pool)
+            raise
+
+        final_fields = []
+        fields_data = prepared.pop("fields_data")
+        upload_image = prepared.pop("upload_image")
+        if fields_data:
+            gpt_fields_raw = await self.gemini_service.get_form_fields_only(upload_image, language)
+            if gpt_fields_raw:
+                gpt_fields = [field for field in gpt_fields_raw if field.get("valid", False)]
+                final_fields = self.image_service.combine_yolo_and_gpt_results(fields_data, gpt_fields)
+
+        prepared["fields"] = final_fields
+        return prepared
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+page_pipeline_service = PagePipelineService()
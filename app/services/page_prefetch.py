@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Sessions whose reading position is remembered per process
+MAX_TRACKED_SESSIONS = 1024
+
+
+class _SessionPrefetch:
+    """Reading position, direction and prefetch tasks of one session"""
+
+    __slots__ = ("last_page", "direction", "tasks", "started")
+
+    def __init__(self):
+        self.last_page: Optional[int] = None
+        self.direction = 1
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.started: Set[int] = set()
+
+
+class PagePrefetcher:
+    """
+    Speculative background work on the pages a reader is likely to open next.
+
+    When page N is served, pages N+1..N+depth (N-1..N-depth when the reader
+    is going backwards; a navigation command also covers its target page)
+    are handed to the session's work function in
+    background tasks. Pages that leave that window are cancelled if their
+    work has not started yet; started work finishes so its result is cached.
+    All sessions share a budget of prefetch_concurrency calls in flight, so
+    speculative work never takes more than that share of the Gemini
+    concurrency limit. A request for a page already being prefetched joins
+    the running task instead of starting a second call. State is per
+    process; results are shared through the caller's session cache.
+    """
+
+    def __init__(self, depth: int, max_concurrency: int):
+        self.depth = max(0, depth)
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._sessions: "OrderedDict[str, _SessionPrefetch]" = OrderedDict()
+        self._counters = {"scheduled": 0, "completed": 0, "cancelled": 0, "failed": 0, "joined": 0}
+
+    def _session(self, session_id: str) -> _SessionPrefetch:
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionPrefetch()
+            while len(self._sessions) > MAX_TRACKED_SESSIONS:
+                oldest_id = next(iter(self._sessions))
+                self.cancel(oldest_id)
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def navigated(
+        self,
+        session_id: str,
+        from_page: int,
+        to_page: int,
+        total_pages: int,
+        work: Callable[[int], Awaitable[Any]],
+    ):
+        """A navigation command moved the reader: prefetch to_page and the pages after it"""
+        if not self.depth or to_page == from_page:
+            return
+        state = self._session(session_id)
+        state.direction = 1 if to_page > from_page else -1
+        state.last_page = from_page
+        window = [
+            to_page + state.direction * step
+            for step in range(self.depth + 1)
+            if 1 <= to_page + state.direction * step <= total_pages
+        ]
+        self._schedule(state, window, work)
+
+    def page_served(
+        self,
+        session_id: str,
+        page_number: int,
+        total_pages: int,
+        work: Callable[[int], Awaitable[Any]],
+    ):
+        """Record that page_number was opened and prefetch the pages after it"""
+        if not self.depth:
+            return
+        state = self._session(session_id)
+        if state.last_page is not None and page_number != state.last_page:
+            state.direction = 1 if page_number > state.last_page else -1
+        state.last_page = page_number
+
+        window = [
+            page_number + state.direction * step
+            for step in range(1, self.depth + 1)
+            if 1 <= page_number + state.direction * step <= total_pages
+        ]
+        self._schedule(state, window, work)
+
+    def _schedule(
+        self,
+        state: _SessionPrefetch,
+        pages: List[int],
+        work: Callable[[int], Awaitable[Any]],
+    ):
+        for page, task in list(state.tasks.items()):
+            if page not in pages and page not in state.started:
+                task.cancel()
+        for page in pages:
+            if page not in state.tasks:
+                task = asyncio.create_task(self._run(state, page, work))
+                task.add_done_callback(lambda done, page=page: self._finished(state, page, done))
+                state.tasks[page] = task
+                self._counters["scheduled"] += 1
+
+    async def _run(self, state: _SessionPrefetch, page: int, work: Callable[[int], Awaitable[Any]]):
+        async with self._semaphore:
+            state.started.add(page)
+            try:
+                return await work(page)
+            except Exception as e:
+                logger.warning(f"Prefetch of page {page} failed: {e}")
+                self._counters["failed"] += 1
+                return None
+
+    def _finished(self, state: _SessionPrefetch, page: int, task: asyncio.Task):
+        # Done callback: also runs for tasks cancelled before they started
+        state.started.discard(page)
+        if state.tasks.get(page) is task:
+            del state.tasks[page]
+        self._counters["cancelled" if task.cancelled() else "completed"] += 1
+
+    async def join(self, session_id: str, page_number: int) -> Optional[Any]:
+        """
+        Result of the prefetch running for page_number, or None when there is
+        none. A prefetch still waiting for the budget is cancelled instead, so
+        the caller does the work itself without queueing behind speculation.
+        """
+        state = self._sessions.get(session_id)
+        task = state.tasks.get(page_number) if state else None
+        if task is None:
+            return None
+        if page_number not in state.started:
+            task.cancel()
+            return None
+        self._counters["joined"] += 1
+        try:
+            # shield: a disconnecting client must not cancel the shared task
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+
+    def cancel(self, session_id: str):
+        """Cancel every prefetch of session_id and forget its reading position"""
+        state = self._sessions.pop(session_id, None)
+        if state is not None:
+            for task in state.tasks.values():
+                task.cancel()
+
+    def cancel_all(self):
+        for session_id in list(self._sessions):
+            self.cancel(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "in_flight": sum(len(state.started) for state in self._sessions.values()),
+            "pending": sum(len(state.tasks) for state in self._sessions.values()),
+            "depth": self.depth,
+            "max_concurrency": self.max_concurrency,
+            **self._counters,
+        }
+
+
+page_prefetcher = PagePrefetcher(
+    settings.document_prefetch_pages, settings.document_prefetch_concurrency
+)
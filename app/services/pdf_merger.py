@@ -30,7 +30,8 @@ class PDFMergerService:
         Args:
             filled_pages: List of dictionaries containing:
                 - page_number: int
-                - image_data: bytes or base64 string
+                - image: PIL Image (optional, inserted without re-encoding)
+                - image_data: bytes or base64 string (used when image is absent)
                 - width: int (optional)
                 - height: int (optional)
             filename: Name for the PDF file
@@ -52,44 +53,42 @@ class PDFMergerService:
         
         for page_data in sorted_pages:
             try:
-                # Get image data
-                image_data = page_data.get('image_data')
-                if not image_data:
-                    continue
+                image = page_data.get('image')
+                if image is not None:
+                    insert_kwargs = self._pixmap_kwargs(image)
+                else:
+                    # Get image data
+                    image_data = page_data.get('image_data')
+                    if not image_data:
+                        continue
+                        
+                    if isinstance(image_data, str):
+                        # Assume it's base64 encoded
+                        if image_data.startswith('data:image'):
+                            # Remove data URL prefix
+                            image_data = image_data.split(',', 1)[1]
+                        try:
+                            image_bytes = base64.b64decode(image_data)
+                        except Exception as decode_error:
+                            continue
+                    else:
+                        # Assume it's already bytes
+                        image_bytes = image_data
+                    
+                    if not image_bytes:
+                        continue
                     
-                if isinstance(image_data, str):
-                    # Assume it's base64 encoded
-                    if image_data.startswith('data:image'):
-                        # Remove data URL prefix
-                        image_data = image_data.split(',', 1)[1]
+                    # Only the header is read here; pixels are decoded if re-encoding is needed
                     try:
-                        image_bytes = base64.b64decode(image_data)
-                    except Exception as decode_error:
+                        image = Image.open(io.BytesIO(image_bytes))
+                    except Exception as img_error:
                         continue
-                else:
-                    # Assume it's already bytes
-                    image_bytes = image_data
-                
-                if not image_bytes:
-                    continue
-                
-                # Convert bytes to PIL Image for processing
-                try:
-                    image = Image.open(io.BytesIO(image_bytes))
-                except Exception as img_error:
-                    continue
-                
-                # Convert to RGB if necessary
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Save image to bytes buffer
-                try:
-                    img_buffer = io.BytesIO()
-                    image.save(img_buffer, format='PNG')
-                    img_buffer.seek(0)
-                except Exception as save_error:
-                    continue
+                    
+                    if image.format in ('PNG', 'JPEG') and image.mode in ('RGB', 'L'):
+                        # PyMuPDF embeds PNG/JPEG streams directly
+                        insert_kwargs = {'stream': image_bytes}
+                    else:
+                        insert_kwargs = self._pixmap_kwargs(image)
                 
                 # Create a new page in the PDF
                 # Use A4 size or image size, whichever is appropriate
@@ -106,7 +105,7 @@ class PDFMergerService:
                 
                 # Insert the image into the page
                 try:
-                    page.insert_image(page_rect, stream=img_buffer.getvalue())
+                    page.insert_image(page_rect, **insert_kwargs)
                 except Exception as insert_error:
                     continue
                 
@@ -128,6 +127,14 @@ class PDFMergerService:
         
         return pdf_bytes
     
+    @staticmethod
+    def _pixmap_kwargs(image: Image.Image) -> Dict[str, Any]:
+        """insert_image() arguments for raw RGB pixels (no PNG round-trip)"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixmap = fitz.Pixmap(fitz.csRGB, image.width, image.height, image.tobytes(), False)
+        return {'pixmap': pixmap}
+    
     def merge_pdf_pages(self, original_pdf_bytes: bytes, filled_page_images: List[Dict[str, Any]]) -> bytes:
         """
         Replace pages in the original PDF with filled versions
@@ -217,13 +224,9 @@ class PDFMergerService:
         doc = fitz.open()
         page = doc.new_page(width=page_width, height=page_height)
         
-        # Save image to buffer
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
-        
-        # Insert image into page
+        # Insert raw pixels into page (no PNG round-trip)
         page_rect = fitz.Rect(0, 0, page_width, page_height)
-        page.insert_image(page_rect, stream=img_buffer.getvalue())
+        page.insert_image(page_rect, **self._pixmap_kwargs(image))
         
         # Get PDF bytes
         pdf_bytes = doc.tobytes()
@@ -1,8 +1,11 @@
 import io
-import base64
-from typing import List, Dict, Any, Tuple
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Dict, Any, Tuple, Optional, Iterator
 from PIL import Image
 import logging
+from app.config import get_settings
+from app.services.image_codec import image_codec
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,242 @@ except ImportError:
     PDF_AVAILABLE = False
     logger.warning("PyMuPDF not available. PDF support disabled.")
 
+settings = get_settings()
+
+# Longest side of a rendered page; matches the limit applied by _image_to_base64
+MAX_PAGE_SIZE = 4096
+
+# Longest side (pixels) each consumer of a rendered page needs; None = full DPI.
+# "detection" is also the coordinate space of detected fields and filled pages.
+RENDER_TIERS = {
+    "orientation": settings.pdf_orientation_max_side,
+    "upload": settings.gemini_upload_max_side,
+    "detection": min(settings.max_image_size, MAX_PAGE_SIZE),
+    "output": MAX_PAGE_SIZE,
+}
+
+# Tiers rendered for a single use (PDF export) and never kept in the page LRU
+UNCACHED_TIERS = {"output"}
+
+
+class PDFPageSource:
+    """
+    Lazy, page-at-a-time view over an uploaded PDF.
+
+    Keeps the raw bytes and the opened fitz document. Each page is parsed
+    once into a fitz display list and rasterized per resolution tier
+    (see RENDER_TIERS) only the first time that tier is requested; rendered
+    variants are kept in a bounded LRU, except UNCACHED_TIERS which are
+    rendered on every request. Base64 is produced only on demand.
+    """
+
+    def __init__(self, file_content: bytes, dpi: int, cache_size: int = 4):
+        self.file_content = file_content
+        self.dpi = dpi
+        self.cache_size = max(1, cache_size)
+        self._document = fitz.open(stream=io.BytesIO(file_content), filetype="pdf")
+        self.total_pages = len(self._document)
+        self._display_lists: "OrderedDict[int, Any]" = OrderedDict()
+        self._cache: "OrderedDict[Tuple[int, str], Dict[str, Any]]" = OrderedDict()
+        # fitz documents are not thread-safe; renders are serialized per document
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return self.total_pages
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for page_number in range(1, self.total_pages + 1):
+            yield self.get_page(page_number)
+
+    def get_page(
+        self, page_number: int, tier: str = "detection"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return page data (page_number, image, width, height) for a 1-based
+        page number at the given resolution tier, rendering it on first
+        access. None if out of range.
+        """
+        if page_number < 1 or page_number > self.total_pages:
+            return None
+        if tier not in RENDER_TIERS:
+            raise ValueError(f"Unknown render tier: {tier}")
+
+        key = (page_number, tier)
+        with self._lock:
+            page_data = self._cache.get(key)
+            if page_data is not None:
+                self._cache.move_to_end(key)
+                return page_data
+
+            page_data = self._render_page(page_number, tier)
+            if tier in UNCACHED_TIERS:
+                return page_data
+            self._cache[key] = page_data
+            # Each page can hold up to one variant per cached tier
+            while len(self._cache) > self.cache_size * (len(RENDER_TIERS) - len(UNCACHED_TIERS)):
+                self._cache.popitem(last=False)
+            return page_data
+
+    def get_page_base64(
+        self, page_number: int, tier: str = "detection"
+    ) -> Optional[str]:
+        """Return the PNG/base64 encoding of a page (not cached: only the pixels are kept)"""
+        page_data = self.get_page(page_number, tier)
+        if page_data is None:
+            return None
+        return _encode_png_base64(page_data["image"])
+
+    def memory_bytes(self) -> int:
+        """Approximate footprint: the PDF bytes plus the rendered pages kept in the LRU"""
+        with self._lock:
+            pixels = sum(
+                page["image"].width * page["image"].height * len(page["image"].getbands())
+                for page in self._cache.values()
+            )
+        return len(self.file_content) + pixels
+
+    def get_page_size(
+        self, page_number: int, tier: str = "detection"
+    ) -> Optional[Tuple[int, int]]:
+        """Pixel size (width, height) of a page at a tier, without rendering it"""
+        if page_number < 1 or page_number > self.total_pages:
+            return None
+        with self._lock:
+            rect = self._get_display_list(page_number).rect
+            zoom = self._zoom_for(rect, tier)
+            irect = (rect * fitz.Matrix(zoom, zoom)).irect
+            return irect.width, irect.height
+
+    def close(self):
+        """Release the fitz document and all rendered pages"""
+        with self._lock:
+            self._cache.clear()
+            self._display_lists.clear()
+            try:
+                self._document.close()
+            except Exception:
+                pass
+
+    def _get_display_list(self, page_number: int):
+        display_list = self._display_lists.get(page_number)
+        if display_list is not None:
+            self._display_lists.move_to_end(page_number)
+            return display_list
+
+        display_list = self._document[page_number - 1].get_displaylist()
+        self._display_lists[page_number] = display_list
+        while len(self._display_lists) > self.cache_size:
+            self._display_lists.popitem(last=False)
+        return display_list
+
+    def _zoom_for(self, rect, tier: str) -> float:
+        # Convert DPI to zoom factor, capped by the tier's longest side
+        zoom = self.dpi / 72
+        max_side = RENDER_TIERS[tier]
+        longest = max(rect.width, rect.height)
+        if max_side and longest > 0:
+            zoom = min(zoom, max_side / longest)
+        return zoom
+
+    def _render_page(self, page_number: int, tier: str) -> Dict[str, Any]:
+        try:
+            display_list = self._get_display_list(page_number)
+
+            zoom = self._zoom_for(display_list.rect, tier)
+            pix = display_list.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            pil_image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+            return {
+                "page_number": page_number,
+                "image": pil_image,
+                "width": pil_image.width,
+                "height": pil_image.height,
+            }
+
+        except Exception as e:
+            logger.error(f"Error processing page {page_number}: {str(e)}")
+            # Create fallback page in case of error
+            fallback_image = Image.new("RGB", (2100, 2970), "white")  # A4 size at 300 DPI
+            if RENDER_TIERS[tier]:
+                fallback_image.thumbnail(
+                    (RENDER_TIERS[tier], RENDER_TIERS[tier]), Image.Resampling.LANCZOS
+                )
+            return {
+                "page_number": page_number,
+                "image": fallback_image,
+                "width": fallback_image.width,
+                "height": fallback_image.height,
+                "error": f"Failed to process page: {str(e)}",
+            }
+
+    def __del__(self):
+        try:
+            self._document.close()
+        except Exception:
+            pass
+
+
+class PDFSourceCache:
+    """
+    Process-local LRU of opened PDFPageSource objects keyed by session id.
+
+    Session documents only reference the uploaded PDF; each worker opens it
+    on first use and keeps the most recently used ones open.
+    """
+
+    def __init__(self, max_open: int = 16):
+        self.max_open = max(1, max_open)
+        self._sources: "OrderedDict[str, PDFPageSource]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, session_id: str) -> Optional[PDFPageSource]:
+        with self._lock:
+            source = self._sources.get(session_id)
+            if source is not None:
+                self._sources.move_to_end(session_id)
+            return source
+
+    def put(self, session_id: str, source: PDFPageSource) -> PDFPageSource:
+        """Cache source and return the cached one (an earlier put wins a race)"""
+        with self._lock:
+            existing = self._sources.get(session_id)
+            if existing is not None:
+                self._sources.move_to_end(session_id)
+                evicted = [source]
+            else:
+                self._sources[session_id] = source
+                existing = source
+                evicted = []
+                while len(self._sources) > self.max_open:
+                    evicted.append(self._sources.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return existing
+
+    def discard(self, session_id: str):
+        with self._lock:
+            source = self._sources.pop(session_id, None)
+        if source is not None:
+            source.close()
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            sources = list(self._sources.values())
+        return sum(source.memory_bytes() for source in sources)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_documents = len(self._sources)
+        return {
+            "open_documents": open_documents,
+            "max_open": self.max_open,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+def _encode_png_base64(image: Image.Image) -> str:
+    return image_codec.encode(image, "form").to_base64()
+
 
 class PDFProcessor:
     """PDF processor for form analysis"""
@@ -27,6 +266,33 @@ class PDFProcessor:
         """Check if PDF processing is supported"""
         return PDF_AVAILABLE
 
+    def open_pdf(self, file_content: bytes) -> PDFPageSource:
+        """
+        Open a PDF for lazy page rendering.
+
+        Nothing is rasterized here; pages are rendered on first access
+        through the returned PDFPageSource.
+        """
+        if not PDF_AVAILABLE:
+            raise ImportError("PyMuPDF library is required for PDF processing")
+
+        try:
+            pages = PDFPageSource(
+                file_content, self.dpi, cache_size=settings.pdf_page_cache_size
+            )
+        except Exception as e:
+            logger.error(f"Error opening PDF: {str(e)}")
+            raise
+
+        if pages.total_pages > self.max_pages:
+            total_pages = pages.total_pages
+            pages.close()
+            raise ValueError(
+                f"PDF has too many pages ({total_pages}). Maximum allowed: {self.max_pages}"
+            )
+
+        return pages
+
     def convert_pdf_to_images(self, file_content: bytes) -> List[Dict[str, Any]]:
         """
         Convert PDF to a collection of images with page information
@@ -211,13 +477,8 @@ class PDFProcessor:
             if image.width > max_size or image.height > max_size:
                 image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
 
-            # Convert to base64
-            buffer = io.BytesIO()
-            # Use high quality for forms - PNG is lossless so quality parameter not needed
-            image.save(buffer, format="PNG", optimize=True)
-            img_bytes = buffer.getvalue()
-
-            return base64.b64encode(img_bytes).decode("utf-8")
+            # Convert to base64 - forms stay lossless PNG ("form" codec policy)
+            return image_codec.encode(image, "form").to_base64()
 
         except Exception as e:
             logger.error(f"Error converting image to base64: {str(e)}")
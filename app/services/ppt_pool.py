@@ -0,0 +1,293 @@
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Seconds between checks whether a worker has started a submitted task
+START_POLL_SECONDS = 0.5
+
+# Presentations kept loaded in each worker process, keyed by content digest
+WORKER_OPEN_PRESENTATIONS = 1
+
+# DocumentProcessor used inside worker processes; created once per process
+_worker_processor = None
+_worker_presentations: "OrderedDict[str, Any]" = OrderedDict()
+# Queue on which workers report (task id, wall-clock start) to the parent
+_task_starts = None
+
+
+def _init_worker(task_starts):
+    global _task_starts
+    _task_starts = task_starts
+
+
+def _task_started(task_id: int):
+    if _task_starts is not None:
+        _task_starts.put((task_id, time.time()))
+
+
+def _get_worker_processor():
+    global _worker_processor
+    if _worker_processor is None:
+        from app.services.document_processor import DocumentProcessor
+
+        _worker_processor = DocumentProcessor()
+    return _worker_processor
+
+
+def _get_worker_presentation(digest: str, path: str):
+    """Loaded presentation for a deck; loaded from path only the first time this worker sees it"""
+    presentation = _worker_presentations.get(digest)
+    if presentation is not None:
+        _worker_presentations.move_to_end(digest)
+        return presentation
+    presentation = _get_worker_processor()._load_presentation_file(path)
+    _worker_presentations[digest] = presentation
+    while len(_worker_presentations) > WORKER_OPEN_PRESENTATIONS:
+        _worker_presentations.popitem(last=False)[1].Dispose()
+    return presentation
+
+
+def _rss_mb() -> float:
+    """Resident memory of this process in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:
+            return 0.0
+
+
+def count_presentation_slides(task_id: int, digest: str, path: str) -> Tuple[int, float]:
+    """Worker process entry point: number of slides (and the worker's RSS)"""
+    _task_started(task_id)
+    presentation = _get_worker_presentation(digest, path)
+    return len(presentation.Slides), _rss_mb()
+
+
+def convert_slide_range(
+    task_id: int, digest: str, path: str, start: int, end: int
+) -> Tuple[List[Dict[str, Any]], float]:
+    """Worker process entry point: slides [start, end) as page dicts (and the worker's RSS)"""
+    _task_started(task_id)
+    processor = _get_worker_processor()
+    presentation = _get_worker_presentation(digest, path)
+    pages = [
+        page
+        for batch in processor._iter_powerpoint_pages(
+            presentation, None, start, end, dispose=False
+        )
+        for page in batch
+    ]
+    return pages, _rss_mb()
+
+
+class PowerPointWorkerPool:
+    """
+    Spire.Presentation conversion in dedicated worker processes.
+
+    A deck is written once to a temporary file and workers get its path
+    and content digest; each worker loads a deck once and keeps it for the
+    following slide ranges, and the native library's memory is released
+    when the worker exits. Workers are replaced after
+    ppt_max_jobs_per_worker tasks, or once a task reports RSS above
+    ppt_worker_max_rss_mb. A task running past ppt_job_timeout_seconds is
+    killed together with its pool; the timeout counts from when a worker
+    reports starting the task, so queueing never uses it up. Tasks of
+    other decks broken by such a kill are retried once on a fresh pool.
+    Slide ranges of a deck are submitted together, so they render in
+    parallel. Calls block and are meant for the vision thread pool.
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+        self._context = multiprocessing.get_context("spawn")
+        # Per pool, so a killed worker cannot leave a half-written report behind
+        self._start_queues: "weakref.WeakKeyDictionary[ProcessPoolExecutor, Any]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._task_ids = itertools.count()
+        self._starts: Dict[int, float] = {}
+        self._starts_lock = Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                task_starts = self._context.Queue()
+                # spawn: fork would copy the parent's threads and native state
+                self._pool = ProcessPoolExecutor(
+                    max_workers=max(1, settings.ppt_workers),
+                    mp_context=self._context,
+                    max_tasks_per_child=max(1, settings.ppt_max_jobs_per_worker),
+                    initializer=_init_worker,
+                    initargs=(task_starts,),
+                )
+                self._start_queues[self._pool] = task_starts
+            return self._pool
+
+    def _retire(self, pool: ProcessPoolExecutor, kill: bool = False):
+        """Stop handing work to pool; queued tasks still finish unless it is killed"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if kill:
+            # A stuck native call never returns; terminate the processes outright
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=kill)
+
+    def _started_at(self, pool: ProcessPoolExecutor, task_id: int) -> Optional[float]:
+        task_starts = self._start_queues[pool]
+        with self._starts_lock:
+            while True:
+                try:
+                    started_id, started = task_starts.get_nowait()
+                except queue.Empty:
+                    break
+                self._starts[started_id] = started
+            return self._starts.get(task_id)
+
+    def _forget(self, task_id: int):
+        with self._starts_lock:
+            self._starts.pop(task_id, None)
+
+    def _wait(self, pool: ProcessPoolExecutor, future, task_id: int) -> Any:
+        """future.result(), timing out ppt_job_timeout_seconds after a worker started the task"""
+        limit = settings.ppt_job_timeout_seconds
+        while True:
+            started = self._started_at(pool, task_id)
+            if started is None:
+                timeout = START_POLL_SECONDS
+            else:
+                timeout = max(0.0, started + limit - time.time())
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                if started is not None and time.time() >= started + limit:
+                    raise
+
+    def _submit(self, pool: ProcessPoolExecutor, fn: Callable, *args) -> Tuple[Any, int]:
+        task_id = next(self._task_ids)
+        return pool.submit(fn, task_id, *args), task_id
+
+    def _result(self, pool: ProcessPoolExecutor, future, task_id: int) -> Any:
+        try:
+            result, rss_mb = self._wait(pool, future, task_id)
+        except FutureTimeoutError:
+            self._retire(pool, kill=True)
+            raise TimeoutError(
+                f"PowerPoint conversion exceeded {settings.ppt_job_timeout_seconds}s"
+            )
+        except BrokenProcessPool:
+            self._retire(pool)
+            raise
+        finally:
+            self._forget(task_id)
+        if settings.ppt_worker_max_rss_mb and rss_mb > settings.ppt_worker_max_rss_mb:
+            logger.info(f"Recycling PowerPoint workers (worker RSS {rss_mb:.0f} MB)")
+            self._retire(pool)
+        return result
+
+    def _run(self, fn: Callable, *args) -> Any:
+        """One task; retried once on a fresh pool if another task's kill broke the pool"""
+        for attempt in range(2):
+            pool = self._get_pool()
+            future, task_id = self._submit(pool, fn, *args)
+            try:
+                return self._result(pool, future, task_id)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                logger.warning("PowerPoint worker pool broke; retrying the task on a fresh pool")
+
+    @staticmethod
+    def _write_deck(file_content: bytes) -> Tuple[str, str]:
+        """(content digest, path of a temporary copy for the workers)"""
+        digest = hashlib.sha1(file_content).hexdigest()
+        path = os.path.join(tempfile.gettempdir(), f"ppt_pool_{uuid.uuid4().hex}.pptx")
+        with open(path, "wb") as f:
+            f.write(file_content)
+        return digest, path
+
+    @staticmethod
+    def _remove_deck(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def count_slides(self, file_content: bytes) -> int:
+        """Slide count via a Spire load; for formats presentation.xml cannot answer (.ppt)"""
+        digest, path = self._write_deck(file_content)
+        try:
+            return self._run(count_presentation_slides, digest, path)
+        finally:
+            self._remove_deck(path)
+
+    def convert_slides(self, file_content: bytes, start: int, end: int) -> List[Dict[str, Any]]:
+        """Slides [start, end) as page dicts, converted in one task"""
+        digest, path = self._write_deck(file_content)
+        try:
+            return self._run(convert_slide_range, digest, path, start, end)
+        finally:
+            self._remove_deck(path)
+
+    def iter_slides(
+        self, file_content: bytes, total_slides: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Convert all slide ranges in parallel and yield them in slide order"""
+        chunk_size = max(1, settings.ppt_slides_per_task)
+        ranges = [
+            (start, min(start + chunk_size, total_slides))
+            for start in range(0, total_slides, chunk_size)
+        ]
+        digest, path = self._write_deck(file_content)
+        pool = self._get_pool()
+        tasks = [
+            self._submit(pool, convert_slide_range, digest, path, start, end)
+            for start, end in ranges
+        ]
+        try:
+            for (future, task_id), (start, end) in zip(tasks, ranges):
+                try:
+                    yield self._result(pool, future, task_id)
+                except BrokenProcessPool:
+                    # Another task killed or crashed the pool; retry this range
+                    yield self._run(convert_slide_range, digest, path, start, end)
+        finally:
+            for future, task_id in tasks:
+                future.cancel()
+                self._forget(task_id)
+            self._remove_deck(path)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+ppt_pool = PowerPointWorkerPool()
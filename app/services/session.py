@@ -1,82 +1,99 @@
+import asyncio
+import logging
 import uuid
 import time
-from typing import Dict, Any, Optional
-from threading import Lock
+from typing import Dict, Any, Optional, Callable
+
+from app.services.session_store import NAMESPACES, SessionStore, session_store
+from app.services.blob_store import BlobStore, blob_store
+
+logger = logging.getLogger(__name__)
+
 
 class SessionService:
-    def __init__(self, session_timeout: int = 3600):  # 1 hour timeout
-        self.sessions: Dict[str, Dict[str, Any]] = {}
-        self.session_timeout = session_timeout
-        self.lock = Lock()
-    
-    def create_session(self) -> str:
+    """
+    Sessions shared by all workers through the configured session store.
+
+    The generic form session (create/get/update_session) lives in the "form"
+    namespace; PDF and document flows keep their own documents under the same
+    id space through load/save/modify/remove. Binary payloads go to the blob
+    store and are released once a session id is gone from every namespace.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore = session_store,
+        blobs: BlobStore = blob_store,
+    ):
+        self.store = store
+        self.blobs = blobs
+        self.session_timeout = store.ttl_seconds
+
+    async def create_session(self) -> str:
         """Create a new session and return session ID"""
-        with self.lock:
-            session_id = str(uuid.uuid4())
-            self.sessions[session_id] = {
-                'created_at': time.time(),
-                'last_access': time.time(),
-                'data': {}
-            }
-            return session_id
-    
-    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session_id = str(uuid.uuid4())
+        await self.store.set("form", session_id, {"created_at": time.time()})
+        return session_id
+
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session data by ID"""
-        with self.lock:
-            if session_id not in self.sessions:
-                return None
-            
-            session = self.sessions[session_id]
-            
-            # Check if session expired
-            if time.time() - session['last_access'] > self.session_timeout:
-                del self.sessions[session_id]
-                return None
-            
-            # Update last access time
-            session['last_access'] = time.time()
-            return session['data']
-    
-    def update_session(self, session_id: str, key: str, value: Any) -> bool:
+        return await self.load("form", session_id)
+
+    async def update_session(self, session_id: str, key: str, value: Any) -> bool:
         """Update session data"""
-        with self.lock:
-            if session_id not in self.sessions:
-                return False
-            
-            session = self.sessions[session_id]
-            
-            # Check if session expired
-            if time.time() - session['last_access'] > self.session_timeout:
-                del self.sessions[session_id]
-                return False
-            
-            # Update last access time and data
-            session['last_access'] = time.time()
-            session['data'][key] = value
-            return True
-    
-    def delete_session(self, session_id: str) -> bool:
+        updated = await self.modify("form", session_id, lambda data: data.__setitem__(key, value))
+        return updated is not None
+
+    async def delete_session(self, session_id: str) -> bool:
         """Delete a session"""
-        with self.lock:
-            if session_id in self.sessions:
-                del self.sessions[session_id]
-                return True
-            return False
-    
-    def cleanup_expired_sessions(self):
-        """Remove expired sessions"""
-        with self.lock:
-            current_time = time.time()
-            expired_sessions = []
-            
-            for session_id, session in self.sessions.items():
-                if current_time - session['last_access'] > self.session_timeout:
-                    expired_sessions.append(session_id)
-            
-            for session_id in expired_sessions:
-                del self.sessions[session_id]
-    
-    def get_session_count(self) -> int:
+        return await self.remove("form", session_id)
+
+    async def cleanup_expired_sessions(self):
+        """Remove expired sessions and the blobs they owned"""
+        for session_id in await self.store.cleanup():
+            await self.blobs.delete_session(session_id)
+
+    async def get_session_count(self) -> int:
         """Get current number of active sessions"""
-        with self.lock:
-            return len(self.sessions) 
\ No newline at end of file
+        return await self.store.count("form")
+
+    async def sweep_forever(self, interval_seconds: float):
+        """Background task: remove expired sessions every interval_seconds"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.cleanup_expired_sessions()
+            except Exception as e:
+                logger.warning(f"Session sweep failed: {e}")
+
+    async def stats(self) -> Dict[str, Any]:
+        """Live sessions per namespace plus session/blob storage usage"""
+        return {
+            "sessions": {ns: await self.store.count(ns) for ns in NAMESPACES},
+            "session_timeout": self.session_timeout,
+            "session_store": self.store.stats(),
+            "blob_store": self.blobs.stats(),
+        }
+
+    async def load(self, namespace: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """Session document of a namespace, renewing its TTL and its blobs'"""
+        data = await self.store.get(namespace, session_id)
+        if data is not None:
+            await self.blobs.touch(session_id)
+        return data
+
+    async def save(self, namespace: str, session_id: str, data: Dict[str, Any]):
+        await self.store.set(namespace, session_id, data)
+
+    async def modify(
+        self, namespace: str, session_id: str, mutate: Callable[[Dict[str, Any]], Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Atomic read-modify-write of a session document; None if it does not exist"""
+        return await self.store.update(namespace, session_id, mutate)
+
+    async def remove(self, namespace: str, session_id: str) -> bool:
+        """Delete a namespace's session; blobs go once no namespace uses the id"""
+        deleted = await self.store.delete(namespace, session_id)
+        if deleted and not await self.store.exists(session_id):
+            await self.blobs.delete_session(session_id)
+        return deleted
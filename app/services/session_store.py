@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Optional Redis client (any server speaking the Redis protocol works)
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import WatchError
+
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+Mutator = Callable[[Dict[str, Any]], Any]
+
+# Session kinds sharing one id space: generic form sessions, multi-page PDF
+# sessions and document reader sessions
+NAMESPACES = ("form", "pdf", "document")
+
+
+class SessionStore:
+    """
+    Storage for session documents shared by every worker process.
+
+    A session is a JSON-serializable dict stored under (namespace, session_id)
+    with a sliding TTL: reads and writes push its expiry ttl_seconds into the
+    future. Large binary data does not belong here; keep it in the blob store
+    and store the returned reference in the session.
+    """
+
+    name = "base"
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, namespace: str, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, namespace: str, session_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def update(
+        self, namespace: str, session_id: str, mutate: Mutator
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically apply mutate (which edits the dict in place) to an existing
+        session and return the updated session; None if it does not exist.
+        mutate may be called more than once, so it must only touch the dict.
+        """
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, session_id: str) -> bool:
+        raise NotImplementedError
+
+    async def exists(self, session_id: str) -> bool:
+        """Whether the session id is live in any namespace"""
+        raise NotImplementedError
+
+    async def count(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    async def cleanup(self) -> List[str]:
+        """
+        Remove expired sessions. Returns the ids that no longer exist in any
+        namespace, whose blobs can be released.
+        """
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage figures for the metrics endpoint"""
+        return {"backend": self.name}
+
+    def _expires_at(self) -> float:
+        return time.time() + self.ttl_seconds
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False)
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; only for a single worker process"""
+
+    name = "memory"
+
+    def __init__(self, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        # (namespace, session_id) -> (expires_at, serialized session)
+        self._sessions: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self._lock = Lock()
+
+    def _load(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        entry = self._sessions.get(key)
+        if entry is None or entry[0] <= time.time():
+            # Expired entries are left for cleanup() so their blobs get released
+            return None
+        return json.loads(entry[1])
+
+    async def get(self, namespace: str, session_id: str) -> Optional[Dict[str, Any]]:
+        key = (namespace, session_id)
+        with self._lock:
+            data = self._load(key)
+            if data is not None:
+                self._sessions[key] = (self._expires_at(), self._sessions[key][1])
+            return data
+
+    async def set(self, namespace: str, session_id: str, data: Dict[str, Any]):
+        serialized = _dumps(data)
+        with self._lock:
+            self._sessions[(namespace, session_id)] = (self._expires_at(), serialized)
+
+    async def update(
+        self, namespace: str, session_id: str, mutate: Mutator
+    ) -> Optional[Dict[str, Any]]:
+        key = (namespace, session_id)
+        with self._lock:
+            data = self._load(key)
+            if data is None:
+                return None
+            mutate(data)
+            self._sessions[key] = (self._expires_at(), _dumps(data))
+            return data
+
+    async def delete(self, namespace: str, session_id: str) -> bool:
+        with self._lock:
+            entry = self._sessions.pop((namespace, session_id), None)
+            return entry is not None and entry[0] > time.time()
+
+    async def exists(self, session_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            return any(
+                sid == session_id and expires_at > now
+                for (_, sid), (expires_at, _) in self._sessions.items()
+            )
+
+    async def count(self, namespace: str) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(
+                1
+                for (ns, _), (expires_at, _) in self._sessions.items()
+                if ns == namespace and expires_at > now
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "documents": len(self._sessions),
+                "memory_bytes": sum(len(serialized) for _, serialized in self._sessions.values()),
+            }
+
+    async def cleanup(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._sessions.items() if expires_at <= now]
+            for key in expired:
+                del self._sessions[key]
+            live = {sid for (_, sid) in self._sessions}
+        return sorted({sid for (_, sid) in expired} - live)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store in a SQLite file (WAL mode), shared by all worker processes on one
+    host. Updates run in BEGIN IMMEDIATE transactions, so concurrent workers
+    serialize on the write lock instead of overwriting each other. Every
+    query runs in a thread (asyncio.to_thread) so a busy database never
+    blocks the event loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, ttl_seconds: int, path: str):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "namespace TEXT NOT NULL, session_id TEXT NOT NULL, data TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (namespace, session_id))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)"
+        )
+
+    def _transaction(self, work: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    async def _run(self, work: Callable[[], Any]) -> Any:
+        """work() in a transaction, off the event loop"""
+        return await asyncio.to_thread(self._transaction, work)
+
+    def _fetchone(self, query: str, params: Tuple) -> Optional[Tuple]:
+        with self._lock:
+            return self._db.execute(query, params).fetchone()
+
+    def _select(self, namespace: str, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            "SELECT data FROM sessions WHERE namespace = ? AND session_id = ? AND expires_at > ?",
+            (namespace, session_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def get(self, namespace: str, session_id: str) -> Optional[Dict[str, Any]]:
+        def work():
+            data = self._select(namespace, session_id)
+            if data is not None:
+                self._db.execute(
+                    "UPDATE sessions SET expires_at = ? WHERE namespace = ? AND session_id = ?",
+                    (self._expires_at(), namespace, session_id),
+                )
+            return data
+
+        return await self._run(work)
+
+    async def set(self, namespace: str, session_id: str, data: Dict[str, Any]):
+        serialized = _dumps(data)
+        await self._run(
+            lambda: self._db.execute(
+                "INSERT OR REPLACE INTO sessions (namespace, session_id, data, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (namespace, session_id, serialized, self._expires_at()),
+            )
+        )
+
+    async def update(
+        self, namespace: str, session_id: str, mutate: Mutator
+    ) -> Optional[Dict[str, Any]]:
+        def work():
+            data = self._select(namespace, session_id)
+            if data is None:
+                return None
+            mutate(data)
+            self._db.execute(
+                "UPDATE sessions SET data = ?, expires_at = ? WHERE namespace = ? AND session_id = ?",
+                (_dumps(data), self._expires_at(), namespace, session_id),
+            )
+            return data
+
+        return await self._run(work)
+
+    async def delete(self, namespace: str, session_id: str) -> bool:
+        cursor = await self._run(
+            lambda: self._db.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND session_id = ? AND expires_at > ?",
+                (namespace, session_id, time.time()),
+            )
+        )
+        return cursor.rowcount > 0
+
+    async def exists(self, session_id: str) -> bool:
+        row = await asyncio.to_thread(
+            self._fetchone,
+            "SELECT 1 FROM sessions WHERE session_id = ? AND expires_at > ? LIMIT 1",
+            (session_id, time.time()),
+        )
+        return row is not None
+
+    async def count(self, namespace: str) -> int:
+        row = await asyncio.to_thread(
+            self._fetchone,
+            "SELECT COUNT(*) FROM sessions WHERE namespace = ? AND expires_at > ?",
+            (namespace, time.time()),
+        )
+        return row[0]
+
+    async def cleanup(self) -> List[str]:
+        def work():
+            now = time.time()
+            expired = {
+                row[0]
+                for row in self._db.execute(
+                    "SELECT DISTINCT session_id FROM sessions WHERE expires_at <= ?", (now,)
+                )
+            }
+            self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+            live = {
+                row[0]
+                for row in self._db.execute(
+                    "SELECT DISTINCT session_id FROM sessions WHERE expires_at > ?", (now,)
+                )
+            }
+            return sorted(expired - live)
+
+        return await self._run(work)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store in Redis (or any Redis-protocol server), shared across hosts.
+    Expiry is delegated to Redis key TTLs; updates use WATCH/MULTI.
+    """
+
+    name = "redis"
+
+    def __init__(self, ttl_seconds: int, url: str, prefix: str = "insight"):
+        super().__init__(ttl_seconds)
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url)
+
+    def _key(self, namespace: str, session_id: str) -> str:
+        return f"{self.prefix}:session:{namespace}:{session_id}"
+
+    async def get(self, namespace: str, session_id: str) -> Optional[Dict[str, Any]]:
+        key = self._key(namespace, session_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.expire(key, self.ttl_seconds)
+            serialized, _ = await pipe.execute()
+        return json.loads(serialized) if serialized is not None else None
+
+    async def set(self, namespace: str, session_id: str, data: Dict[str, Any]):
+        await self._redis.set(self._key(namespace, session_id), _dumps(data), ex=self.ttl_seconds)
+
+    async def update(
+        self, namespace: str, session_id: str, mutate: Mutator
+    ) -> Optional[Dict[str, Any]]:
+        key = self._key(namespace, session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    serialized = await pipe.get(key)
+                    if serialized is None:
+                        await pipe.unwatch()
+                        return None
+                    data = json.loads(serialized)
+                    mutate(data)
+                    pipe.multi()
+                    pipe.set(key, _dumps(data), ex=self.ttl_seconds)
+                    await pipe.execute()
+                    return data
+                except WatchError:
+                    # Another worker changed the session first; retry on the new value
+                    continue
+
+    async def delete(self, namespace: str, session_id: str) -> bool:
+        return bool(await self._redis.delete(self._key(namespace, session_id)))
+
+    async def exists(self, session_id: str) -> bool:
+        keys = [self._key(namespace, session_id) for namespace in NAMESPACES]
+        return bool(await self._redis.exists(*keys))
+
+    async def count(self, namespace: str) -> int:
+        total = 0
+        async for _ in self._redis.scan_iter(match=f"{self.prefix}:session:{namespace}:*", count=500):
+            total += 1
+        return total
+
+
+def create_session_store(backend: str) -> SessionStore:
+    ttl = settings.session_ttl_seconds
+    if backend == "redis":
+        if REDIS_AVAILABLE:
+            return RedisSessionStore(ttl, settings.redis_url)
+        logger.warning("redis package not installed; using the SQLite session store")
+        backend = "sqlite"
+    if backend == "sqlite":
+        try:
+            return SQLiteSessionStore(ttl, settings.session_sqlite_path)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite session store unavailable ({e}); using memory")
+    elif backend != "memory":
+        logger.warning(f"Unknown session backend {backend!r}; using memory")
+    return MemorySessionStore(ttl)
+
+
+session_store = create_session_store(settings.session_backend)
@@ -1,6 +1,6 @@
-import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
 from app.config import get_settings
+from app.services.gemini_client import gemini_client
 import io
 import wave
 import os
@@ -12,10 +12,9 @@ class SpeechService:
     def __init__(self):
         """Initializes separate Gemini models for multimodal and TTS tasks."""
         try:
-            # Configure genai with the key from settings
-            genai.configure(api_key=settings.google_ai_api_key)
-            self.multimodal_model = genai.GenerativeModel(settings.gemini_model)
-            self.tts_model = genai.GenerativeModel(settings.gemini_tts_model)
+            # Models are shared with the rest of the app through gemini_client
+            self.multimodal_model = gemini_client.get_model(settings.gemini_model)
+            self.tts_model = gemini_client.get_model(settings.gemini_tts_model)
             self.is_available = True
         except Exception as e:
             self.multimodal_model = None
@@ -23,7 +22,7 @@ class SpeechService:
             self.is_available = False
             # Fatal error initializing Gemini models
 
-    def text_to_speech(self, text: str, provider: str = "gemini"):
+    async def text_to_speech(self, text: str, provider: str = "gemini"):
         """Converts text to speech using the configured Gemini TTS model."""
         if provider != "gemini" or not self.is_available or not self.tts_model or not text:
             return None, None
@@ -32,8 +31,10 @@ class SpeechService:
             is_arabic = any('\u0600' <= char <= '\u06FF' for char in text)
             voice_name = "Sulafat" if is_arabic else "Kore"
 
-            response = self.tts_model.generate_content(
+            response = await gemini_client.generate(
+                settings.gemini_tts_model,
                 f"Read this: {text}",
+                call="text_to_speech",
                 generation_config={
                    "response_modalities": ["AUDIO"],
                    "speech_config": {
@@ -58,7 +59,7 @@ class SpeechService:
         except Exception as e:
             return None, None
 
-    def speech_to_text(self, audio_bytes: bytes, language_code: str = 'en'):
+    async def speech_to_text(self, audio_bytes: bytes, language_code: str = 'en'):
         """
         Converts audio to text, forcing transcription in the specified language.
         """
@@ -71,7 +72,9 @@ class SpeechService:
             lang_name = "Arabic" if language_code == 'ar' else "English"
             prompt = f"You are a highly accurate audio transcription service. You must transcribe the following audio recording in {lang_name}. Ignore all non-speech sounds like [noise] or [music] and provide only the clean text of the spoken words."
             
-            response = self.multimodal_model.generate_content([prompt, audio_part])
+            response = await gemini_client.generate(
+                settings.gemini_model, [prompt, audio_part], call="speech_to_text"
+            )
             return response.text.strip()
             
         except google_exceptions.ResourceExhausted as e:
@@ -2,9 +2,7 @@ from ultralytics import YOLO
 import numpy as np
 from app.config import get_settings
 from app.services.ocr import OCRService
-from app.utils.image_helpers import calculate_iou
-from app.utils.arabic import compare_boxes
-import functools
+from app.utils.image_helpers import non_max_suppression, reading_order
 from PIL import Image
 
 settings = get_settings()
@@ -20,99 +18,78 @@ class YOLOService:
         Runs both YOLO models, combines results, filters overlapping boxes,
         and sorts them in reading order.
         """
-        # 1. Run both YOLO models
-        arr = np.array(image)
-        r1 = self.boxes_model.predict(source=arr, classes=[0, 1, 2], conf=0.15, iou=0.02, stream=False)[0]
-        r2 = self.dot_line_model.predict(source=arr, classes=[8], conf=0.15, iou=0.1, stream=False)[0]
-
-        # 2. Combine and filter based on OCR (if text already exists)
-        filtered_boxes = []
-        for b in r1.boxes:
-            box_coords = b.xyxy[0].tolist()
-            detected_text, text_conf = self.ocr_service.detect_text_in_region(image, box_coords)
-            if detected_text and text_conf > 50:
-                continue
-            filtered_boxes.append(box_coords + [b.conf[0].item(), r1.names.get(int(b.cls[0]))])
-        
-        for b in r2.boxes:
-            box_coords = b.xyxy[0].tolist()
-            filtered_boxes.append(box_coords + [b.conf[0].item(), r2.names.get(int(b.cls[0]))])
+        boxes, scores, class_names, page_words = self._detect_candidates(image)
 
-        # 3. Non-Maximum Suppression (NMS)
-        def get_sort_key(box_data):
-            confidence = box_data[4]
-            class_name = str(box_data[5]).lower()
-            priority = 1 if 'text' in class_name or 'line' in class_name else 0
-            return (priority, confidence)
-        filtered_boxes.sort(key=get_sort_key, reverse=True)
-        
-        final_boxes = []
-        iou_threshold = 0.4
-        while filtered_boxes:
-            best_box = filtered_boxes.pop(0)
-            final_boxes.append(best_box)
-            filtered_boxes = [b for b in filtered_boxes if calculate_iou(best_box, b) < iou_threshold]
-
-        # 4. Determine language and sort
-        lang_direction = self.ocr_service.detect_language_locally(image) or 'ltr'
+        # Determine language (reusing the page OCR pass when there was one) and sort
+        page_text = " ".join(page_words["text"]) if page_words is not None else None
+        lang_direction = self.ocr_service.detect_language_locally(image, page_text) or 'ltr'
         is_rtl = (lang_direction == 'rtl')
-        
-        fields_data = []
-        for b in final_boxes:
-            x1, y1, x2, y2, _, class_name = b
-            fields_data.append({"box": (int(x1), int(y1), int(x2 - x1), int(y2 - y1)), "class": class_name})
-        
-        fields_data.sort(key=functools.cmp_to_key(lambda item1, item2: compare_boxes(is_rtl, item1, item2)))
-        
-        return fields_data, lang_direction 
+
+        return self._postprocess(boxes, scores, class_names, is_rtl), lang_direction
 
     def detect_fields_with_language(self, image: Image.Image, language_direction: str):
         """
         Runs both YOLO models, combines results, filters overlapping boxes,
         and sorts them using user-specified language direction.
         """
+        boxes, scores, class_names, _ = self._detect_candidates(image)
+        is_rtl = (language_direction == 'rtl')
+        return self._postprocess(boxes, scores, class_names, is_rtl)
+
+    def _detect_candidates(self, image: Image.Image):
+        """
+        Runs both YOLO models and drops boxes that already contain printed text.
+        Returns (N x 4 xyxy array, scores, class names, page words or None).
+        """
         # 1. Run both YOLO models
         arr = np.array(image)
         r1 = self.boxes_model.predict(source=arr, classes=[0, 1, 2], conf=0.15, iou=0.02, stream=False)[0]
         r2 = self.dot_line_model.predict(source=arr, classes=[8], conf=0.15, iou=0.1, stream=False)[0]
 
-        # 2. Combine and filter based on OCR (if text already exists)
-        filtered_boxes = []
-        for b in r1.boxes:
-            box_coords = b.xyxy[0].tolist()
-            detected_text, text_conf = self.ocr_service.detect_text_in_region(image, box_coords)
-            if detected_text and text_conf > 50:
-                continue
-            filtered_boxes.append(box_coords + [b.conf[0].item(), r1.names.get(int(b.cls[0]))])
-        
-        for b in r2.boxes:
-            box_coords = b.xyxy[0].tolist()
-            filtered_boxes.append(box_coords + [b.conf[0].item(), r2.names.get(int(b.cls[0]))])
+        # 2. Combine and filter based on OCR (if text already exists).
+        # One page-level OCR pass; its word boxes are matched against every candidate.
+        boxes, scores, class_names = [], [], []
+        page_words = None
+        if len(r1.boxes):
+            r1_boxes = r1.boxes.xyxy.cpu().numpy()
+            page_words = self.ocr_service.extract_page_words(image)
+            has_text = self.ocr_service.regions_with_text(page_words, r1_boxes, min_conf=50)
+            r1_conf = r1.boxes.conf.cpu().numpy()
+            r1_cls = r1.boxes.cls.cpu().numpy()
+            for i in np.flatnonzero(~has_text):
+                boxes.append(r1_boxes[i].tolist())
+                scores.append(float(r1_conf[i]))
+                class_names.append(r1.names.get(int(r1_cls[i])))
+
+        if len(r2.boxes):
+            boxes.extend(r2.boxes.xyxy.cpu().numpy().tolist())
+            scores.extend(r2.boxes.conf.cpu().numpy().tolist())
+            class_names.extend(r2.names.get(int(c)) for c in r2.boxes.cls.cpu().numpy())
+
+        return np.asarray(boxes, dtype=np.float64).reshape(-1, 4), scores, class_names, page_words
 
+    def _postprocess(self, boxes: np.ndarray, scores: list, class_names: list, is_rtl: bool):
+        """
+        Non-maximum suppression (text/line boxes win over checkboxes, then higher
+        confidence) followed by a reading-order sort.
+        """
         # 3. Non-Maximum Suppression (NMS)
-        def get_sort_key(box_data):
-            confidence = box_data[4]
-            class_name = str(box_data[5]).lower()
-            priority = 1 if 'text' in class_name or 'line' in class_name else 0
-            return (priority, confidence)
-        filtered_boxes.sort(key=get_sort_key, reverse=True)
-        
-        final_boxes = []
-        iou_threshold = 0.4
-        while filtered_boxes:
-            best_box = filtered_boxes.pop(0)
-            final_boxes.append(best_box)
-            filtered_boxes = [b for b in filtered_boxes if calculate_iou(best_box, b) < iou_threshold]
+        priorities = [
+            1 if 'text' in str(name).lower() or 'line' in str(name).lower() else 0
+            for name in class_names
+        ]
+        keep = non_max_suppression(boxes, scores, priorities, iou_threshold=0.4)
+        if len(keep) == 0:
+            return []
 
-        # 4. Sort using user-specified language direction
-        is_rtl = (language_direction == 'rtl')
-                    # Using user-specified language direction
-        
-        fields_data = []
-        for b in final_boxes:
-            x1, y1, x2, y2, _, class_name = b
-            fields_data.append({"box": (int(x1), int(y1), int(x2 - x1), int(y2 - y1)), "class": class_name})
-        
-        fields_data.sort(key=functools.cmp_to_key(lambda item1, item2: compare_boxes(is_rtl, item1, item2)))
-        
-        return fields_data 
\ No newline at end of file
+        # 4. Sort in reading order
+        kept = boxes[keep]
+        xywh = np.stack(
+            [kept[:, 0], kept[:, 1], kept[:, 2] - kept[:, 0], kept[:, 3] - kept[:, 1]], axis=1
+        ).astype(int)
+        order = reading_order(xywh, is_rtl)
+
+        return [
+            {"box": tuple(int(v) for v in xywh[i]), "class": class_names[keep[i]]}
+            for i in order
+        ]
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def calculate_iou(box1, box2):
     """
     Calculates Intersection over Union (IoU) for two boxes.
@@ -19,4 +22,55 @@ def calculate_iou(box1, box2):
     if union_area == 0:
         return 0.0
         
-    return inter_area / union_area 
\ No newline at end of file
+    return inter_area / union_area 
+
+def non_max_suppression(boxes, scores, priorities, iou_threshold):
+    """
+    Greedy NMS over an N x 4 array of [x1, y1, x2, y2] boxes.
+    Boxes are visited by (priority, score) descending; returns the indices
+    of the kept boxes in that order.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    # lexsort uses the last key as the primary one; stable for equal keys
+    order = np.lexsort((-np.asarray(scores, dtype=np.float64), -np.asarray(priorities)))
+
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        union = areas[best] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=(inter > 0) & (union != 0))
+        order = rest[iou < iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def reading_order(boxes, is_rtl):
+    """
+    Indices that sort an N x 4 array of (x, y, w, h) boxes in reading order.
+    Boxes are grouped into lines top to bottom: a box starts a new line when
+    its vertical center is at least a quarter of the two heights below the
+    previous box. Within a line boxes go left-to-right (or right-to-left).
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    y_center = boxes[:, 1] + boxes[:, 3] / 2
+    by_y = np.argsort(y_center, kind="stable")
+    heights = boxes[by_y, 3]
+    gaps = np.diff(y_center[by_y])
+    new_line = np.concatenate(([0], gaps >= (heights[1:] + heights[:-1]) / 4))
+    line_id = np.empty(len(boxes), dtype=np.intp)
+    line_id[by_y] = np.cumsum(new_line)
+
+    x_key = -boxes[:, 0] if is_rtl else boxes[:, 0]
+    return np.lexsort((x_key, line_id))
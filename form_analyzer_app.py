@@ -5,7 +5,9 @@ Comprehensive form analysis and filling application
 """
 
 import streamlit as st
+import asyncio
 import sys
+import threading
 import io
 import base64
 import requests
@@ -58,6 +60,19 @@ def load_services():
         return None, None, None, None
 
 
+@st.cache_resource
+def get_event_loop():
+    """Background event loop shared by all sessions for the async Gemini calls"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
 def analyze_form_with_api(image_data: bytes, language_direction: str = "auto") -> dict:
     """Analyze form using the existing API"""
     try:
@@ -151,8 +166,8 @@ def analyze_form_with_api(image_data: bytes, language_direction: str = "auto") -
         )
 
         # Analyze with Gemini
-        gpt_results = gemini_service.get_form_fields_only(
-            annotated_image, detected_lang
+        gpt_results = run_async(
+            gemini_service.get_form_fields_only(annotated_image, detected_lang)
         )
 
         # Merge results